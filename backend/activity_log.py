@@ -0,0 +1,130 @@
+import os
+import atexit
+import threading
+from datetime import datetime
+
+# --- ACTIVITY WRITE-BEHIND ---
+# Login/logout events are queued in process memory and written by a background
+# thread in one multi-row transaction every ACTIVITY_FLUSH_MS or once
+# ACTIVITY_FLUSH_EVENTS are waiting, so the auth path does no activity write of its
+# own. Timestamps are taken when the event happens, not when it is flushed. When
+# ACTIVITY_BUFFER_MAX events are already waiting (the database is slow or down) an
+# event is written synchronously instead. The buffer is flushed at interpreter exit;
+# a killed process loses at most the events of one interval. Derived updates
+# (after_write, e.g. rollup counters) run once the rows are stored; if they fail,
+# only they are retried, so stored rows are never inserted twice.
+#
+# Configuration (environment):
+#   ACTIVITY_FLUSH_MS       maximum delay before a queued event is written (0 = write synchronously)
+#   ACTIVITY_FLUSH_EVENTS   queued events that trigger an immediate flush
+#   ACTIVITY_BUFFER_MAX     queued events before falling back to synchronous writes
+
+ACTIVITY_FLUSH_MS = int(os.getenv("ACTIVITY_FLUSH_MS", 500))
+ACTIVITY_FLUSH_EVENTS = int(os.getenv("ACTIVITY_FLUSH_EVENTS", 100))
+ACTIVITY_BUFFER_MAX = int(os.getenv("ACTIVITY_BUFFER_MAX", 10000))
+_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'  # same text form as CURRENT_TIMESTAMP (UTC)
+
+
+class ActivityBuffer:
+    """
+    write(rows) stores a list of (user_id, action, timestamp) rows in one transaction;
+    after_write(rows), if given, updates what is derived from stored rows. The flusher
+    thread starts on first use in each process, so buffers created before a gunicorn
+    fork work in every worker.
+    """
+
+    def __init__(self, write, flush_ms=ACTIVITY_FLUSH_MS, flush_events=ACTIVITY_FLUSH_EVENTS,
+                 max_events=ACTIVITY_BUFFER_MAX, after_write=None):
+        self._write = write
+        self._after_write = after_write
+        self._unapplied = []  # Stored rows whose after_write failed (flush lock)
+        self.interval = flush_ms / 1000.0
+        self.flush_events = max(1, flush_events)
+        self.max_events = max_events
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # One writer at a time keeps rows in event order
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        atexit.register(self.close)
+
+    def log(self, user_id, action):
+        row = (user_id, action, datetime.utcnow().strftime(_TIME_FORMAT))
+        if self.interval <= 0 or self._closed:
+            self._write_now([row])
+            return
+        self._ensure_thread()
+        with self._lock:
+            queued = len(self._pending) < self.max_events
+            if queued:
+                self._pending.append(row)
+                due = len(self._pending) >= self.flush_events
+        if not queued:
+            self._write_now([row])
+        elif due:
+            self._wake.set()
+
+    def flush(self):
+        """Writes every queued event now; returns the number written."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+            if rows:
+                try:
+                    self._write(rows)
+                except Exception as e:
+                    with self._lock:
+                        # Retried on the next flush; the oldest events go first if the buffer overflows
+                        self._pending = (rows + self._pending)[-self.max_events:]
+                    print(f"Activity flush error ({len(rows)} events kept for retry): {e}")
+                    rows = []
+            self._apply(rows)
+            return len(rows)
+
+    def _write_now(self, rows):
+        self._write(rows)
+        with self._flush_lock:
+            self._apply(rows)
+
+    def _apply(self, rows):
+        # Stored rows are never written again: a failed after_write is retried on its own
+        rows = self._unapplied + rows
+        if self._after_write is None or not rows:
+            return
+        try:
+            self._after_write(rows)
+            self._unapplied = []
+        except Exception as e:
+            self._unapplied = rows[-self.max_events:]
+            print(f"Activity after-write error ({len(rows)} events kept for retry): {e}")
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                if self._pid != os.getpid():
+                    self._pending = []  # Events queued in the parent are flushed by the parent
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="activity-flusher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        """Stops the flusher and writes what is left (also runs at interpreter exit)."""
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+        self.flush()
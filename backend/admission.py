@@ -0,0 +1,212 @@
+import io
+import os
+import math
+import time
+import uuid
+import sqlite3
+import threading
+
+# --- ADMISSION CONTROL ---
+# Heavy requests (uploads that run the analyzers) are admitted against a budget of
+# cost units shared by every worker process on this host, kept as leases in a small
+# SQLite file. A request whose cost does not fit is refused with 429 and a
+# Retry-After estimated from when the running leases should finish, instead of
+# queueing inside a worker. Cost comes from a header-only look at the upload:
+# megapixels for images, duration for audio, length for text.
+#
+# Light routes (auth, lists, chat, admin) are never admitted here; instead each
+# worker runs at most ADMISSION_HEAVY_PER_WORKER heavy requests at once, which is
+# kept below its request threads (gunicorn.conf.py) so a thread is always free for them.
+#
+# Configuration (environment):
+#   ADMISSION_BUDGET            cost units in flight across all workers (0 = no budget)
+#   ADMISSION_HEAVY_PER_WORKER  concurrent heavy requests per worker process
+#   ADMISSION_SECONDS_PER_UNIT  expected analysis seconds per cost unit (Retry-After estimate)
+#   ADMISSION_LEASE_SECONDS     lifetime of a lease whose worker died without releasing it
+#   ADMISSION_DB_PATH           SQLite file holding the shared leases
+
+ADMISSION_BUDGET = float(os.getenv("ADMISSION_BUDGET", 24))
+ADMISSION_HEAVY_PER_WORKER = int(os.getenv("ADMISSION_HEAVY_PER_WORKER",
+                                           max(1, int(os.getenv("GUNICORN_THREADS", 4)) - 1)))
+ADMISSION_SECONDS_PER_UNIT = float(os.getenv("ADMISSION_SECONDS_PER_UNIT", 1.0))
+ADMISSION_LEASE_SECONDS = float(os.getenv("ADMISSION_LEASE_SECONDS", 2 * int(os.getenv("ANALYSIS_TASK_TIMEOUT", 120))))
+ADMISSION_DB_PATH = os.getenv("ADMISSION_DB_PATH", "admission.db")
+MAX_RETRY_AFTER = 60
+
+# Cost model (units are roughly seconds of analyzer time)
+BASE_COST = 1.0
+COST_PER_MEGAPIXEL = 1.0
+COST_PER_AUDIO_MINUTE = 3.0
+COST_PER_TEXT_100K = 1.0
+AUDIO_BYTES_PER_SECOND = 16000  # 128 kbit/s, for containers libsndfile cannot read
+
+
+class Overloaded(Exception):
+    """The request does not fit the admission budget right now."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# --- COST ESTIMATION ---
+
+def image_megapixels(data):
+    """Pixel count from the image header (PIL parses dimensions without decoding)."""
+    from PIL import Image
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            width, height = img.size
+        return width * height / 1e6
+    except Exception:
+        return len(data) / 1e6  # Unreadable header: about one compressed byte per pixel
+
+
+def audio_seconds(data):
+    """Duration from the audio header; falls back to the byte size at a typical bitrate."""
+    try:
+        import soundfile as sf
+        info = sf.info(io.BytesIO(data))
+        if info.samplerate and info.frames > 0:
+            return info.frames / info.samplerate
+    except Exception:
+        pass
+    return len(data) / AUDIO_BYTES_PER_SECOND
+
+
+def estimate_cost(file_type, data):
+    if file_type == 'image':
+        return BASE_COST + COST_PER_MEGAPIXEL * image_megapixels(data)
+    if file_type == 'audio':
+        return BASE_COST + COST_PER_AUDIO_MINUTE * audio_seconds(data) / 60
+    return BASE_COST + COST_PER_TEXT_100K * len(data) / 1e5
+
+
+# --- SHARED BUDGET ---
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Lease:
+    def __init__(self, controller, lease_id):
+        self._controller = controller
+        self.id = lease_id
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self.id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class AdmissionController:
+    def __init__(self, db_path=ADMISSION_DB_PATH, budget=ADMISSION_BUDGET,
+                 heavy_per_worker=ADMISSION_HEAVY_PER_WORKER,
+                 seconds_per_unit=ADMISSION_SECONDS_PER_UNIT, lease_seconds=ADMISSION_LEASE_SECONDS):
+        self.db_path = db_path
+        self.budget = budget
+        self.heavy_per_worker = max(1, heavy_per_worker)
+        self.seconds_per_unit = seconds_per_unit
+        self.lease_seconds = lease_seconds
+        self._local = 0
+        self._lock = threading.Lock()
+        if budget > 0:
+            conn = self._connect()
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS admission_leases (
+                    id TEXT PRIMARY KEY,
+                    pid INTEGER,
+                    cost REAL,
+                    expected_end REAL,
+                    expires REAL
+                )
+            ''')
+            conn.close()
+
+    def _connect(self):
+        # Autocommit; acquire() opens its own BEGIN IMMEDIATE so the check and the insert are atomic
+        return sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+
+    def acquire(self, cost):
+        """Lease for a heavy request of the given cost; raises Overloaded."""
+        with self._lock:
+            if self._local >= self.heavy_per_worker:
+                raise Overloaded("Server is busy analyzing other uploads, please retry shortly.",
+                                 self._retry_after(cost))
+            self._local += 1
+        try:
+            lease_id = self._acquire_shared(cost) if self.budget > 0 else None
+        except BaseException as e:
+            with self._lock:
+                self._local -= 1
+            if isinstance(e, sqlite3.Error):
+                # "database is locked" past the busy timeout: shed the request, the client retries
+                print(f"Admission ledger error: {e}")
+                raise Overloaded("Server is busy analyzing other uploads, please retry shortly.",
+                                 self._retry_after(cost)) from e
+            raise
+        return Lease(self, lease_id)
+
+    def _acquire_shared(self, cost):
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            # Leases of crashed or killed workers would otherwise hold the budget until they expire
+            conn.execute('DELETE FROM admission_leases WHERE expires < ?', (now,))
+            for (pid,) in conn.execute('SELECT DISTINCT pid FROM admission_leases').fetchall():
+                if not _pid_alive(pid):
+                    conn.execute('DELETE FROM admission_leases WHERE pid = ?', (pid,))
+            in_flight, soonest_end = conn.execute(
+                'SELECT COALESCE(SUM(cost), 0), MIN(expected_end) FROM admission_leases').fetchone()
+            # One request always fits on an idle server, however large
+            if in_flight and in_flight + cost > self.budget:
+                conn.execute('ROLLBACK')
+                wait = (soonest_end - now) if soonest_end else cost * self.seconds_per_unit
+                raise Overloaded("Server is at analysis capacity, please retry shortly.",
+                                 max(1, min(MAX_RETRY_AFTER, math.ceil(wait))))
+            lease_id = uuid.uuid4().hex
+            conn.execute('INSERT INTO admission_leases (id, pid, cost, expected_end, expires) VALUES (?, ?, ?, ?, ?)',
+                         (lease_id, os.getpid(), cost, now + cost * self.seconds_per_unit, now + self.lease_seconds))
+            conn.execute('COMMIT')
+            return lease_id
+        finally:
+            conn.close()
+
+    def _release(self, lease_id):
+        with self._lock:
+            self._local -= 1
+        if lease_id is None:
+            return
+        try:
+            conn = self._connect()
+            conn.execute('DELETE FROM admission_leases WHERE id = ?', (lease_id,))
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"Admission lease release error (expires on its own): {e}")
+
+    def _retry_after(self, cost):
+        return max(1, min(MAX_RETRY_AFTER, math.ceil(cost * self.seconds_per_unit)))
+
+    def in_flight(self):
+        """(this worker's heavy requests, cost units leased across workers)."""
+        total = 0.0
+        if self.budget > 0:
+            conn = self._connect()
+            total = conn.execute('SELECT COALESCE(SUM(cost), 0) FROM admission_leases WHERE expires >= ?',
+                                 (time.time(),)).fetchone()[0]
+            conn.close()
+        return self._local, total
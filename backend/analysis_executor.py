@@ -0,0 +1,345 @@
+import os
+import time
+import queue
+import atexit
+import signal
+import logging
+import threading
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+
+# --- ANALYSIS EXECUTOR ---
+# A small pool of pre-forked worker processes that import and warm the analyzers
+# once, then take work over a pipe. Media bytes travel through a shared-memory
+# segment so large uploads are not pickled; only the compact AnalysisResult comes back.
+# While a task runs the worker also streams stage events (task_id, "event", (stage,
+# payload)) and polls the pipe for ("cancel", task_id) between checks.
+#
+# Configuration (environment):
+#   ANALYSIS_WORKERS            number of worker processes (0 = analyze inline)
+#   ANALYSIS_TASK_TIMEOUT       seconds before a task is abandoned and its worker killed
+#   ANALYSIS_WORKER_MEMORY_MB   address-space limit per worker (0 = unlimited, POSIX only)
+#   ANALYSIS_WORKER_MAX_TASKS   tasks served before a worker is recycled
+#
+# Recycled, timed-out and crashed workers are retired and replaced on a background
+# refill thread, so no request ever waits for a worker to start and warm up.
+
+log = logging.getLogger("app")  # Flask's app.logger
+
+# Workers are forked from the refill thread while request threads create and unlink
+# shared memory, which holds the resource tracker's lock. A child forked at that
+# moment inherits the lock held and deadlocks on its first segment, so forks and
+# segment (un)registration never overlap.
+_fork_lock = threading.Lock()
+
+
+class ExecutorError(Exception):
+    """Analysis could not be completed by the worker pool."""
+
+
+class AnalysisTimeout(ExecutorError):
+    pass
+
+
+class WorkerCrashed(ExecutorError):
+    pass
+
+
+class AnalysisCancelled(ExecutorError):
+    pass
+
+
+# --- WORKER SIDE ---
+
+def _apply_memory_limit(memory_limit_mb):
+    if not memory_limit_mb:
+        return
+    try:
+        import resource
+        limit = int(memory_limit_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError) as e:
+        log.warning("Worker memory limit not applied: %s", e)
+
+
+class _CancelFlag:
+    """Worker-side view of a task's cancel request: drains pending pipe messages."""
+
+    def __init__(self, conn, task_id):
+        self._conn = conn
+        self._task_id = task_id
+        self._set = False
+
+    def is_set(self):
+        while not self._set and self._conn.poll():
+            message = self._conn.recv()
+            if message == ("cancel", self._task_id):
+                self._set = True
+        return self._set
+
+
+def _analyze(file_type, payload, mode, progress, cancel, profile):
+    """analyze_media, under profiling.run when profile is set; the report goes out as a "profile" event."""
+    import analysis_logic
+    if not profile:
+        return analysis_logic.analyze_media(file_type, payload, mode=mode, progress=progress, cancel=cancel)
+    import profiling
+    result, report = profiling.run(analysis_logic.analyze_media, file_type, payload,
+                                   mode=mode, progress=progress, cancel=cancel)
+    if report is not None and progress is not None:
+        progress("profile", report)
+    return result
+
+
+def _worker_main(conn, memory_limit_mb):
+    # Forked from a server process whose own SIGTERM/SIGINT handlers would make the
+    # worker ignore both; restore the defaults so terminate() and Ctrl+C reach it
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    _apply_memory_limit(memory_limit_mb)
+    import analysis_logic
+    analysis_logic.warm_up()
+    conn.send(("ready", os.getpid()))
+
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if task is None:
+            break
+        if task[0] == "cancel":
+            continue  # Arrived after its task had already finished
+
+        task_id, file_type, shm_name, size, mode, profile = task
+        try:
+            # Workers share the parent's resource tracker, and the parent unlinks the segment
+            shm = shared_memory.SharedMemory(name=shm_name)
+            try:
+                payload = bytes(shm.buf[:size])
+            finally:
+                shm.close()
+            result = _analyze(
+                file_type, payload, mode,
+                lambda stage, data: conn.send((task_id, "event", (stage, data))),
+                _CancelFlag(conn, task_id), profile
+            )
+            conn.send((task_id, "ok", result))
+        except analysis_logic.check_registry.EvaluationCancelled:
+            conn.send((task_id, "cancelled", None))
+        except MemoryError:
+            conn.send((task_id, "error", "Worker memory limit exceeded."))
+        except Exception as e:
+            conn.send((task_id, "error", f"{type(e).__name__}: {e}"))
+
+
+# --- PARENT SIDE ---
+
+class _Worker:
+    def __init__(self, ctx, memory_limit_mb, start_timeout):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child_conn, memory_limit_mb), daemon=True
+        )
+        with _fork_lock:
+            self.process.start()
+        child_conn.close()
+        self.tasks_done = 0
+        if not self.conn.poll(start_timeout):
+            self.kill()
+            raise WorkerCrashed("Analysis worker did not finish warm-up in time.")
+        self.conn.recv()  # ("ready", pid)
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.kill()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(timeout=2)
+        self.conn.close()
+
+
+class AnalysisExecutor:
+    """Process pool with warm workers, per-task timeouts and worker recycling."""
+
+    def __init__(self, workers=2, task_timeout=120, memory_limit_mb=0,
+                 max_tasks_per_worker=50, start_timeout=120):
+        method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        self._ctx = multiprocessing.get_context(method)
+        self.size = workers
+        self.task_timeout = task_timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.start_timeout = start_timeout
+        self._idle = queue.Queue()
+        self._retired = queue.Queue()  # (worker, kill) waiting for the refill thread
+        self._lock = threading.Lock()
+        self._task_seq = 0
+        self._closed = False
+        # Start the shared-memory tracker before forking so workers inherit it
+        # rather than each starting (and later "cleaning up") their own.
+        resource_tracker.ensure_running()
+        for _ in range(workers):
+            self._idle.put(self._spawn())
+        self._refill_thread = threading.Thread(target=self._refill, name="analysis-refill", daemon=True)
+        self._refill_thread.start()
+
+    def _spawn(self):
+        return _Worker(self._ctx, self.memory_limit_mb, self.start_timeout)
+
+    def _replace(self, worker, kill=False):
+        """Hands worker to the refill thread to be stopped (or killed) and replaced."""
+        self._retired.put((worker, kill))
+
+    def _refill(self):
+        while True:
+            worker, kill = self._retired.get()
+            if worker is None:
+                return
+            if kill:
+                worker.kill()
+            else:
+                worker.stop()
+            delay = 1
+            while not self._closed:
+                try:
+                    replacement = self._spawn()
+                except ExecutorError as e:
+                    log.warning("Failed to replace analysis worker, retrying in %ss: %s", delay, e)
+                    time.sleep(delay)
+                    delay = min(delay * 2, 60)
+                    continue
+                if self._closed:
+                    replacement.stop()
+                else:
+                    self._idle.put(replacement)
+                break
+
+    def _next_task_id(self):
+        with self._lock:
+            self._task_seq += 1
+            return self._task_seq
+
+    def submit(self, file_type, payload, mode=None, on_event=None, cancel=None, profile=False):
+        """
+        Runs one analysis in a worker and blocks until its AnalysisResult is ready.
+        on_event(stage, payload) receives the worker's progress events; setting the
+        cancel Event stops the worker before its next check (AnalysisCancelled).
+        With profile, the worker's profiling report arrives as a "profile" event.
+        """
+        if self._closed:
+            raise ExecutorError("Analysis executor is shut down.")
+        try:
+            worker = self._idle.get(timeout=self.task_timeout)
+        except queue.Empty:
+            raise AnalysisTimeout("All analysis workers are busy.")
+
+        task_id = self._next_task_id()
+        with _fork_lock:
+            shm = shared_memory.SharedMemory(create=True, size=max(1, len(payload)))
+        try:
+            shm.buf[:len(payload)] = payload
+            try:
+                worker.conn.send((task_id, file_type, shm.name, len(payload), mode, profile))
+                deadline = time.monotonic() + self.task_timeout
+                cancel_sent = False
+                while True:
+                    if cancel is not None and not cancel_sent and cancel.is_set():
+                        worker.conn.send(("cancel", task_id))
+                        cancel_sent = True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._replace(worker, kill=True)
+                        raise AnalysisTimeout(f"Analysis exceeded {self.task_timeout}s and was aborted.")
+                    # Wake up periodically to forward a cancel request
+                    wait = min(remaining, 0.1) if cancel is not None and not cancel_sent else remaining
+                    if not worker.conn.poll(wait):
+                        continue
+                    _, status, result = worker.conn.recv()
+                    if status != "event":
+                        break
+                    if on_event is not None:
+                        try:
+                            on_event(*result)
+                        except Exception as e:
+                            log.warning("Analysis progress listener failed: %s", e)
+            except (EOFError, BrokenPipeError, OSError):
+                self._replace(worker, kill=True)
+                raise WorkerCrashed("Analysis worker exited unexpectedly.")
+        finally:
+            shm.close()
+            with _fork_lock:
+                shm.unlink()
+
+        worker.tasks_done += 1
+        if worker.tasks_done >= self.max_tasks_per_worker:
+            # Recycle to return memory fragmentation/creep to the OS
+            self._replace(worker)
+        else:
+            self._idle.put(worker)
+
+        if status == "cancelled":
+            raise AnalysisCancelled("Analysis was cancelled.")
+        if status != "ok":
+            raise ExecutorError(f"Analysis failed in worker: {result}")
+        return result
+
+    def shutdown(self):
+        self._closed = True
+        # Lets the refill thread stop the workers already retired, then exit
+        self._retired.put((None, False))
+        self._refill_thread.join(timeout=10)
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+
+# --- MODULE-LEVEL POOL ---
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def get_executor():
+    """Returns the shared pool, creating it on first use (None when disabled)."""
+    global _executor
+    workers = _env_int("ANALYSIS_WORKERS", 0)
+    if workers <= 0:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = AnalysisExecutor(
+                workers=workers,
+                task_timeout=_env_int("ANALYSIS_TASK_TIMEOUT", 120),
+                memory_limit_mb=_env_int("ANALYSIS_WORKER_MEMORY_MB", 0),
+                max_tasks_per_worker=_env_int("ANALYSIS_WORKER_MAX_TASKS", 50),
+            )
+            atexit.register(_executor.shutdown)
+    return _executor
+
+
+def run_analysis(file_type, payload, mode=None, on_event=None, cancel=None, profile=False):
+    """Analyzes payload in the worker pool, or inline when no pool is configured."""
+    executor = get_executor()
+    if executor is None:
+        import analysis_logic
+        try:
+            return _analyze(file_type, payload, mode, on_event, cancel, profile)
+        except analysis_logic.check_registry.EvaluationCancelled:
+            raise AnalysisCancelled("Analysis was cancelled.")
+    return executor.submit(file_type, payload, mode=mode, on_event=on_event, cancel=cancel, profile=profile)
@@ -2,19 +2,45 @@ import os
 import sqlite3
 import json
 import base64
-import io
+import queue
 import secrets
+import threading
 from datetime import datetime
 from flask import Flask, request, jsonify, send_from_directory, send_file, make_response
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
-from werkzeug.security import generate_password_hash, check_password_hash
-import analysis_logic
 
-# Load environment variables
+# Load environment variables first: the local modules below read their
+# configuration (backend/.env) at import time
 load_dotenv()
 
+import analysis_logic
+import analysis_executor
+import media_index
+import audio_fingerprint
+import check_stats
+import rollups
+import session_store
+import storage
+import activity_log
+import admission
+import auth_security
+import chat_kb
+import http_cache
+import profiling
+
+# With gunicorn --preload (see gunicorn.conf.py) this runs once in the master, so the
+# heavy analysis libraries are shared copy-on-write by every worker it forks.
+if os.getenv("PRELOAD_ANALYZERS", "0") == "1":
+    analysis_logic.preload()
+
 app = Flask(__name__)
+# Reverse proxies in front of the app (Render: 1). Only that many X-Forwarded-For
+# hops are trusted; with none, a client-supplied header is ignored.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", 0))
+if TRUSTED_PROXY_HOPS > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
 # Secret key for signing cookies (though we use our own session token mechanism, Flask needs this)
 app.secret_key = os.getenv("SECRET_KEY", "dev-secret-key-change-in-prod")
 # Strict CORS for production (GitHub Pages) + Dev
@@ -25,68 +51,142 @@ CORS(app, supports_credentials=True, origins=[
 ], allow_headers=["Content-Type", "Authorization"],
    expose_headers=["Content-Type", "Authorization"])
 
-# Database setup
+# Database setup: users, sessions, analyses and activity live in the configured
+# storage backend (STORAGE_BACKEND, see storage.py). The local SQLite file always
+# holds the derived analytics and lookup indexes.
 DB_PATH = 'database.db'
+store = storage.get_storage(DB_PATH)
 
-def get_db_connection():
+def get_analytics_connection():
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
 def init_db():
+    store.init_schema(session_ttl_days=session_store.SESSION_TTL_DAYS)
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
-    # Users Table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE,
-            password TEXT,
-            email TEXT,
-            first_name TEXT,
-            last_name TEXT,
-            profile_image_url TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    # Analysis Results Table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS analysis_results (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            file_name TEXT,
-            file_url TEXT,
-            file_type TEXT,
-            sentiment_label TEXT,
-            sentiment_score INTEGER,
-            authenticity_label TEXT,
-            authenticity_score INTEGER,
-            details TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    # User Activity Table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS user_activity (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            action TEXT, -- 'login', 'logout'
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    # Sessions Table (New for Persistence)
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS sessions (
-            token TEXT PRIMARY KEY,
-            user_id INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(user_id) REFERENCES users(id)
-        )
-    ''')
+    # Per-check outcomes for analytics (backfill old rows with: python check_stats.py)
+    check_stats.init_table(c)
+    # Dashboard counters, maintained on write (populated from history on first run)
+    rollups.init_tables(c, history=store.history_counts)
     conn.commit()
     conn.close()
 
 init_db()
+session_store.start_sweeper(store)
+
+# Near-duplicate image lookup (pHash BK-tree, persisted in image_hashes)
+image_index = media_index.ImageHashIndex(DB_PATH)
+NEAR_DUPLICATE_RADIUS = int(os.getenv("NEAR_DUPLICATE_RADIUS", 10))
+# Near-duplicates at or below this distance reuse the prior verdict instead of re-analyzing
+NEAR_DUPLICATE_REUSE_DISTANCE = int(os.getenv("NEAR_DUPLICATE_REUSE_DISTANCE", 4))
+# Re-used voice clips (landmark fingerprints, per-user inverted index in audio_landmarks)
+audio_index = audio_fingerprint.AudioFingerprintIndex(DB_PATH)
+
+# --- LOCAL INDEX REBUILD ---
+# forensic_checks, image_hashes and the audio landmarks are kept in the local SQLite
+# file with either storage backend. On MySQL that file starts empty after a redeploy
+# (Render's disk is ephemeral), so the first process to serve a request on a new file
+# refills it from the stored analyses on a background thread: check rows from the
+# stored checks, image hashes and audio fingerprints from the stored media. Lookups
+# miss older uploads until it finishes. To run it again, delete the local_rebuild row.
+
+def claim_local_rebuild(conn):
+    """True for the one caller that gets to rebuild this database file."""
+    conn.execute('CREATE TABLE IF NOT EXISTS local_rebuild (id INTEGER PRIMARY KEY CHECK (id = 1), finished_at TIMESTAMP)')
+    claimed = conn.execute('INSERT OR IGNORE INTO local_rebuild (id) VALUES (1)').rowcount == 1
+    conn.commit()
+    return claimed
+
+def stored_media_bytes(file_url):
+    try:
+        return base64.b64decode(file_url.split(",", 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+def rebuild_local_indexes(conn, store, batch_size=100):
+    """
+    Fills the local derived tables from store: missing check rows, and the image and
+    audio indexes when they are empty. Returns (analyses, images, clips) written.
+    """
+    checks = check_stats.backfill(conn, store)
+    written = {}
+    for file_type, table in (('image', 'image_hashes'), ('audio', 'audio_fingerprint_clips')):
+        written[file_type] = 0
+        if conn.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone():
+            continue
+        last_id = 0
+        while True:
+            rows = store.media_after(last_id, batch_size, file_type)
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            for row in rows:
+                data = stored_media_bytes(row['file_url'])
+                if not data:
+                    continue
+                if file_type == 'image':
+                    hashes = media_index.compute_image_hashes(data)
+                    if hashes:
+                        media_index.ImageHashIndex.insert(conn, row['id'], hashes, row['user_id'])
+                        written[file_type] += 1
+                else:
+                    landmarks = analysis_logic.audio_fingerprint_of(data)
+                    if landmarks:
+                        audio_fingerprint.AudioFingerprintIndex.insert(conn, row['id'], landmarks, row['user_id'])
+                        written[file_type] += 1
+            conn.commit()
+    conn.execute('UPDATE local_rebuild SET finished_at = CURRENT_TIMESTAMP')
+    conn.commit()
+    return checks, written['image'], written['audio']
+
+def run_local_rebuild():
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        checks, images, clips = rebuild_local_indexes(conn, store)
+        print(f"Local rebuild: {checks} analyses' checks, {images} image hashes, {clips} audio fingerprints.")
+    except Exception as e:
+        print(f"Local rebuild error: {e}")
+    finally:
+        conn.close()
+
+_local_rebuild_pid = None
+_image_index_current = False
+
+@app.before_request
+def start_local_rebuild():
+    # Per process and after any fork (gunicorn --preload imports the app in the master)
+    global _local_rebuild_pid
+    if _local_rebuild_pid == os.getpid():
+        return
+    _local_rebuild_pid = os.getpid()
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        claimed = claim_local_rebuild(conn)
+    finally:
+        conn.close()
+    if claimed:
+        threading.Thread(target=run_local_rebuild, name="local-rebuild", daemon=True).start()
+
+def refresh_image_index():
+    """
+    Reloads this process's BK-tree once after the rebuild: it inserts ids below the
+    ones a process may already have loaded, which catching up by id would skip.
+    """
+    global _image_index_current
+    if _image_index_current:
+        return
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        row = conn.execute('SELECT finished_at FROM local_rebuild').fetchone()
+    except sqlite3.OperationalError:
+        row = None  # No request has claimed the rebuild yet
+    finally:
+        conn.close()
+    if row and row[0]:
+        image_index.reload()
+        _image_index_current = True
 
 # Helper to get current user from session cookie
 def get_current_user_helper():
@@ -100,20 +200,43 @@ def get_current_user_helper():
     if not token:
         return None
     
-    conn = get_db_connection()
     try:
-        session = conn.execute('SELECT user_id FROM sessions WHERE token = ?', (token,)).fetchone()
-        if not session:
+        user_id = session_store.lookup(store, token)
+        if user_id is None:
             return None
             
-        user = conn.execute('SELECT * FROM users WHERE id = ?', (session['user_id'],)).fetchone()
-        return user
+        return store.get_user(user_id)
     except Exception as e:
         print(f"Error checking session: {e}")
         return None
+
+def client_ip():
+    # The peer address, or the client address reported by our own proxies (ProxyFix above)
+    return request.remote_addr
+
+def rate_limited(retry_after, message="Too many attempts. Please wait and try again."):
+    if not retry_after:
+        return None
+    resp = jsonify({"message": message})
+    resp.headers['Retry-After'] = str(retry_after)
+    return resp, 429
+
+def record_activity_rollups(rows):
+    """Bumps the rollup counters of stored (user_id, action, timestamp) rows."""
+    conn = get_analytics_connection()
+    try:
+        for _, action, timestamp in rows:
+            rollups.record_activity(conn, action, day=timestamp[:10])
+        conn.commit()
     finally:
         conn.close()
 
+# Login/logout events are written behind the request (see activity_log.py)
+activity = activity_log.ActivityBuffer(store.log_activities, after_write=record_activity_rollups)
+
+def log_activity(user_id, action):
+    activity.log(user_id, action)
+
 # --- AUTH ROUTES ---
 
 @app.route('/api/register', methods=['POST'])
@@ -129,20 +252,26 @@ def register():
     
     if not username or not password:
         return jsonify({"message": "Username and password required"}), 400
+
+    ip = client_ip()
+    limited = rate_limited(auth_security.ip_attempts.retry_after(ip))
+    if limited: return limited
+    auth_security.ip_attempts.hit(ip)
+
+    try:
+        hashed_pw = auth_security.hash_password(password)
+    except auth_security.HashingBusy as e:
+        return rate_limited(1, str(e))
     
-    hashed_pw = generate_password_hash(password)
-    
-    conn = get_db_connection()
     try:
-        conn.execute('''
-            INSERT INTO users (username, password, email, first_name, last_name, profile_image_url)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (username, hashed_pw, email, first_name, last_name, f"https://api.dicebear.com/7.x/avataaars/svg?seed={username}"))
-        conn.commit()
-    except sqlite3.IntegrityError:
+        store.create_user(username, hashed_pw, email, first_name, last_name,
+                          f"https://api.dicebear.com/7.x/avataaars/svg?seed={username}")
+    except storage.DuplicateUser:
         return jsonify({"message": "Username already exists"}), 400
-    finally:
-        conn.close()
+    conn = get_analytics_connection()
+    rollups.record_user(conn)
+    conn.commit()
+    conn.close()
         
     return jsonify({"message": "User registered successfully"}), 201
 
@@ -154,11 +283,33 @@ def login():
         
         username = data.get('username')
         password = data.get('password')
+
+        # Refuse before paying for the KDF
+        ip = client_ip()
+        limited = rate_limited(max(auth_security.ip_attempts.retry_after(ip),
+                                   auth_security.user_failures.retry_after(username)))
+        if limited: return limited
+        auth_security.ip_attempts.hit(ip)
         
-        conn = get_db_connection()
-        user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-        
-        if user and check_password_hash(user['password'], password):
+        # Not holding a connection while the KDF runs
+        user = store.get_user_by_username(username)
+
+        try:
+            verified = bool(user and password) and auth_security.verify_password(user['password'], password)
+        except auth_security.HashingBusy as e:
+            return rate_limited(1, str(e))
+
+        if verified:
+            auth_security.user_failures.reset(username)
+            rehashed = None
+            if auth_security.needs_rehash(user['password']):
+                try:
+                    rehashed = auth_security.hash_password(password)
+                except auth_security.HashingBusy:
+                    pass  # Upgrade on a later login
+
+            if rehashed:
+                store.set_password(user['id'], rehashed)
             user_data = {
                 "id": user['id'],
                 "username": user['username'],
@@ -168,16 +319,11 @@ def login():
                 "profileImageUrl": user['profile_image_url']
             }
             
-            # Generate Session Token
-            token = secrets.token_hex(32)
-            
-            # Store Session in DB
-            conn.execute('INSERT INTO sessions (token, user_id) VALUES (?, ?)', (token, user['id']))
+            # Generate Session Token and store it with its expiry
+            token = session_store.create(store, user['id'])
             
             # Log Activity
-            conn.execute('INSERT INTO user_activity (user_id, action) VALUES (?, ?)', (user['id'], 'login'))
-            conn.commit()
-            conn.close()
+            log_activity(user['id'], 'login')
 
             # Return token in JSON body so the frontend can store it in localStorage.
             # This is required for cross-origin (GitHub Pages -> Render) because SameSite=Lax
@@ -185,10 +331,10 @@ def login():
             user_data["sessionToken"] = token
             resp = make_response(jsonify(user_data))
             # Also set as SameSite=None;Secure cookie (works when both on HTTPS same-origin)
-            resp.set_cookie('session_token', token, httponly=True, samesite='None', secure=True, max_age=30*24*60*60) # 30 days
+            resp.set_cookie('session_token', token, httponly=True, samesite='None', secure=True, max_age=session_store.TTL_SECONDS)
             return resp
         
-        conn.close()
+        auth_security.user_failures.hit(username)
         return jsonify({"message": "Invalid credentials"}), 401
     except Exception as e:
         print(f"BACKEND ERROR IN LOGIN: {e}")
@@ -219,17 +365,12 @@ def logout():
             token = auth_header[len('Bearer '):].strip()
         else:
             token = request.cookies.get('session_token')
-        conn = get_db_connection()
-        
         if token:
             # Check user for logging
-            session = conn.execute('SELECT user_id FROM sessions WHERE token = ?', (token,)).fetchone()
-            if session:
-                conn.execute('INSERT INTO user_activity (user_id, action) VALUES (?, ?)', (session['user_id'], 'logout'))
-                conn.execute('DELETE FROM sessions WHERE token = ?', (token,))
-                conn.commit()
-        
-        conn.close()
+            session_user = store.session_user(token)
+            if session_user is not None:
+                log_activity(session_user, 'logout')
+                session_store.revoke(store, token)
         
         resp = make_response(jsonify({"message": "Logged out"}))
         resp.set_cookie('session_token', '', expires=0)
@@ -238,6 +379,19 @@ def logout():
         print(f"BACKEND ERROR IN LOGOUT: {e}")
         return jsonify({"message": "Logout failed"}), 500
 
+@app.route('/api/logout/all', methods=['POST'])
+def logout_all():
+    # Ends every session of the current user (all devices)
+    user = get_current_user_helper()
+    if not user: return jsonify({"message": "Unauthorized"}), 401
+
+    revoked = session_store.revoke_all(store, user['id'])
+    log_activity(user['id'], 'logout')
+
+    resp = make_response(jsonify({"message": "Logged out everywhere", "sessionsRevoked": revoked}))
+    resp.set_cookie('session_token', '', expires=0)
+    return resp, 200
+
 # --- ANALYSIS ROUTES ---
 
 @app.route('/api/analysis', methods=['GET'])
@@ -245,26 +399,22 @@ def list_analyses():
     user = get_current_user_helper()
     if not user: return jsonify([]), 401
     
-    conn = get_db_connection()
-    analyses = conn.execute('SELECT * FROM analysis_results WHERE user_id = ? ORDER BY created_at DESC', (user['id'],)).fetchall()
-    conn.close()
+    analyses = store.list_analyses(user['id'])
     
-    results = []
-    for row in analyses:
-        results.append({
-            "id": row['id'],
-            "userId": row['user_id'],
-            "fileName": row['file_name'],
-            "fileUrl": row['file_url'],
-            "fileType": row['file_type'],
-            "sentimentLabel": row['sentiment_label'],
-            "sentimentScore": row['sentiment_score'],
-            "authenticityLabel": row['authenticity_label'],
-            "authenticityScore": row['authenticity_score'],
-            "details": json.loads(row['details']) if row['details'] else {},
-            "createdAt": row['created_at']
-        })
-    return jsonify(results)
+    body = '[' + ','.join(analysis_json(row) for row in analyses) + ']'
+    return app.response_class(body, mimetype='application/json')
+
+def decode_upload(data):
+    """(file_name, file_type, file_data, decoded_bytes) from an upload body; ValueError if unusable."""
+    if not data or not data.get('fileData'):
+        raise ValueError("No file data")
+    file_data = data.get('fileData') # Base64
+    try:
+        header, encoded = file_data.split(",", 1)
+        decoded_bytes = base64.b64decode(encoded)
+    except Exception:
+        raise ValueError("Invalid file data")
+    return data.get('fileName'), data.get('fileType'), file_data, decoded_bytes
 
 @app.route('/api/analysis/upload', methods=['POST'])
 def upload_analysis():
@@ -272,213 +422,606 @@ def upload_analysis():
     if not user: return jsonify({"message": "Unauthorized"}), 401
 
     data = request.json
-    file_name = data.get('fileName')
-    file_type = data.get('fileType')
-    file_data = data.get('fileData') # Base64
-    
-    if not file_data:
-        return jsonify({"message": "No file data"}), 400
+    try:
+        upload = decode_upload(data)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
+    profile = profiling.should_profile(request.headers)
     try:
-        header, encoded = file_data.split(",", 1)
-        decoded_bytes = base64.b64decode(encoded)
-    except Exception:
-        return jsonify({"message": "Invalid file data"}), 400
-
-    # NATIVE LOGIC BASED ON FILE TYPE
-    res = {}
-    if file_type == 'text':
-        text_content = decoded_bytes.decode('utf-8', errors='ignore')
-        res = analysis_logic.analyze_text_native(text_content)
-    elif file_type == 'image':
-        res = analysis_logic.analyze_image_native(decoded_bytes)
-    elif file_type == 'audio':
-        res = analysis_logic.analyze_audio_native(decoded_bytes)
+        lease = admit_upload(upload)
+    except admission.Overloaded as e:
+        return rate_limited(e.retry_after, str(e))
+
+    # "full" runs every check (certificate grade), "fast" stops once the verdict is decided
+    try:
+        with lease:
+            new_id = store_analysis(user, *upload, mode=data.get('mode'), profile=profile)
+    except analysis_executor.ExecutorError as e:
+        print(f"BACKEND ERROR IN ANALYSIS WORKER: {e}")
+        return jsonify({"message": str(e)}), 503
+    return get_analysis_by_id(new_id)
+
+# Heavy uploads are admitted against a cost budget shared by all workers (see admission.py)
+admission_control = admission.AdmissionController()
+
+def admit_upload(upload):
+    """Admission lease for an upload's analysis; raises admission.Overloaded."""
+    file_name, file_type, file_data, decoded_bytes = upload
+    return admission_control.acquire(admission.estimate_cost(file_type, decoded_bytes))
+
+def store_analysis(user, file_name, file_type, file_data, decoded_bytes, mode=None, on_event=None, cancel=None,
+                   profile=False):
+    """
+    Analyzes an upload (or reuses a near-duplicate's verdict), stores the result and
+    updates the lookup indexes. Returns the new analysis id; raises ExecutorError.
+    With profile, the analyzers run under the profiler (see profiling.py).
+    """
+    reports = []
+    def forward(stage, payload):
+        if stage == "profile":
+            reports.append(payload)
+        elif on_event is not None:
+            on_event(stage, payload)
+
+    # Perceptual hash lookup: recompressed/resized re-uploads match this user's previous analyses
+    hashes = media_index.compute_image_hashes(decoded_bytes) if file_type == 'image' else None
+    near_duplicates = find_near_duplicates(hashes, user['id']) if hashes else []
+    reusable, res = next(((n, r) for n in near_duplicates for r in [reusable_result(n)] if r), (None, None))
+
+    if reusable:
+        res.details['near_duplicate_of'] = reusable
+        res.reasoning = f"Near-duplicate of analysis #{reusable['id']} (distance {reusable['distance']}); prior verdict reused. " + (res.reasoning or "")
     else:
-        # Default/Video mock
-        res = {
-            "sentiment_label": "Neutral", "sentiment_score": 50,
-            "authenticity_label": "Likely Organic", "authenticity_score": 90,
-            "reasoning": "Standard video check passed.", "details": {}
-        }
+        # NATIVE LOGIC BASED ON FILE TYPE (in the worker pool when one is configured)
+        res = analysis_executor.run_analysis(file_type, decoded_bytes, mode=mode, cancel=cancel, profile=profile,
+                                             on_event=forward if profile else on_event)
+    if near_duplicates:
+        res.details['near_duplicates'] = near_duplicates
+
+    fingerprint = res.fingerprint
+    if fingerprint:
+        audio_matches = find_audio_matches(fingerprint, user['id'])
+        if audio_matches:
+            res.details['audio_matches'] = audio_matches
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO analysis_results (
-            user_id, file_name, file_url, file_type, 
-            sentiment_label, sentiment_score, 
-            authenticity_label, authenticity_score, 
-            details
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        user['id'], file_name, file_data, file_type,
-        res.get('sentiment_label'), res.get('sentiment_score'),
-        res.get('authenticity_label'), res.get('authenticity_score'),
-        json.dumps({
-            "reasoning": res.get('reasoning'),
-            **res.get('details', {})
-        })
-    ))
+    new_id = store.insert_analysis({
+        "user_id": user['id'], "file_name": file_name, "file_url": file_data, "file_type": file_type,
+        "sentiment_label": res.sentiment_label, "sentiment_score": res.sentiment_score,
+        "authenticity_label": res.label, "authenticity_score": res.score,
+        "details": json.dumps({"reasoning": res.reasoning, **res.details}, separators=(',', ':')),
+        "schema_version": analysis_logic.RESULT_SCHEMA_VERSION,
+        "checks": analysis_logic.pack_checks(res.checks)
+    })
+    conn = get_analytics_connection()
+    check_stats.record(conn, new_id, file_type, res.checks)
+    rollups.record_analysis(conn, file_type, res.label)
     conn.commit()
-    new_id = cursor.lastrowid
     conn.close()
-    
-    return get_analysis_by_id(new_id)
 
-def get_analysis_by_id(id):
-    conn = get_db_connection()
-    row = conn.execute('SELECT * FROM analysis_results WHERE id = ?', (id,)).fetchone()
-    conn.close()
-    if not row: return jsonify({"message": "Not found"}), 404
-    return jsonify({
+    if hashes:
+        image_index.add(new_id, hashes, user['id'])
+    if fingerprint:
+        audio_index.add(new_id, fingerprint, user['id'])
+    last_analyses.put(user['id'], last_analysis_summary(file_name, res.label, res.score))
+    if reports:
+        profile_store.save(reports[0], analysisId=new_id, userId=user['id'], fileName=file_name,
+                           fileType=file_type, bytes=len(decoded_bytes), mode=mode)
+    return new_id
+
+# In-flight streamed analyses of this process: job_id -> {"userId", "cancel"}
+analysis_jobs = {}
+STREAM_KEEPALIVE_SECONDS = 15
+
+def sse(event, data):
+    payload = data if isinstance(data, str) else json.dumps(data, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+@app.route('/api/analysis/stream', methods=['POST'])
+def stream_analysis():
+    """
+    Same body as /api/analysis/upload, answered as Server-Sent Events:
+    job, decoded, check (one per ForensicCheck as it completes), verdict, regions,
+    then result (the stored analysis) or error / cancelled. Closing the stream, or
+    POST /api/analysis/jobs/<jobId>/cancel, stops the remaining checks.
+    """
+    user = get_current_user_helper()
+    if not user: return jsonify({"message": "Unauthorized"}), 401
+
+    data = request.json
+    try:
+        upload = decode_upload(data)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    profile = profiling.should_profile(request.headers)
+    try:
+        lease = admit_upload(upload)
+    except admission.Overloaded as e:
+        return rate_limited(e.retry_after, str(e))
+
+    job_id = secrets.token_hex(8)
+    events = queue.Queue()
+    cancel = threading.Event()
+
+    def work():
+        try:
+            new_id = store_analysis(user, *upload, mode=data.get('mode'),
+                                    on_event=lambda stage, payload: events.put((stage, payload)),
+                                    cancel=cancel, profile=profile)
+            events.put(("result", new_id))
+        except analysis_executor.AnalysisCancelled:
+            events.put(("cancelled", {"jobId": job_id}))
+        except Exception as e:
+            print(f"BACKEND ERROR IN STREAMED ANALYSIS: {e}")
+            events.put(("error", {"message": str(e)}))
+        finally:
+            lease.release()
+            events.put(None)
+            analysis_jobs.pop(job_id, None)
+
+    # From here the lease belongs to work(); until it runs, any failure must give it back
+    try:
+        analysis_jobs[job_id] = {"userId": user['id'], "cancel": cancel}
+        threading.Thread(target=work, name=f"analysis-{job_id}", daemon=True).start()
+    except BaseException:
+        analysis_jobs.pop(job_id, None)
+        lease.release()
+        raise
+
+    def generate():
+        try:
+            yield sse("job", {"jobId": job_id})
+            while True:
+                try:
+                    item = events.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if item is None:
+                    break
+                stage, payload = item
+                if stage == "result":
+                    yield sse("result", analysis_json_by_id(payload))
+                else:
+                    yield sse(stage, payload)
+        finally:
+            # Client disconnected (or stream finished): stop any remaining checks
+            cancel.set()
+
+    return app.response_class(generate(), mimetype='text/event-stream',
+                              headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/analysis/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_analysis_job(job_id):
+    user = get_current_user_helper()
+    if not user: return jsonify({"message": "Unauthorized"}), 401
+
+    job = analysis_jobs.get(job_id)
+    if not job or job['userId'] != user['id']:
+        return jsonify({"message": "Not found"}), 404
+    job['cancel'].set()
+    return jsonify({"message": "Cancelling", "jobId": job_id}), 202
+
+def prior_verdicts(ids, user_id):
+    """Maps analysis id -> stored verdict summary for the ids user_id owns; deleted ids are omitted."""
+    if not ids:
+        return {}
+    rows = [row for row in store.analysis_summaries(ids) if row['user_id'] == user_id]
+    return {
+        row['id']: {
+            "id": row['id'],
+            "fileName": row['file_name'],
+            "authenticityLabel": row['authenticity_label'],
+            "authenticityScore": row['authenticity_score'],
+            "createdAt": row['created_at'],
+            "url": f"/api/analysis/{row['id']}"
+        }
+        for row in rows
+    }
+
+def find_near_duplicates(hashes, user_id, exclude=None):
+    """Resolves BK-tree neighbours among user_id's analyses to prior verdicts, nearest first."""
+    refresh_image_index()
+    neighbours = image_index.neighbours(hashes, user_id, radius=NEAR_DUPLICATE_RADIUS, exclude=exclude)
+    verdicts = prior_verdicts([n['analysis_id'] for n in neighbours], user_id)
+    return [
+        {
+            **verdicts[n['analysis_id']],
+            "distance": max(n['phash_distance'], n['dhash_distance']),
+            "phashDistance": n['phash_distance'],
+            "dhashDistance": n['dhash_distance']
+        }
+        for n in neighbours if n['analysis_id'] in verdicts
+    ]
+
+def find_audio_matches(fingerprint, user_id):
+    """user_id's previously analyzed clips sharing time-aligned landmarks, with their verdicts and offset."""
+    matches = audio_index.match(fingerprint, user_id)
+    verdicts = prior_verdicts([m['analysis_id'] for m in matches], user_id)
+    return [
+        {
+            **verdicts[m['analysis_id']],
+            "matchScore": m['score'],
+            "coverage": m['coverage'],
+            "offsetSeconds": m['offset_seconds']
+        }
+        for m in matches if m['analysis_id'] in verdicts
+    ]
+
+def stored_checks(row):
+    """ForensicCheck list for a stored row, whichever schema version wrote it."""
+    if row['schema_version']:
+        return analysis_logic.unpack_checks(row['checks'])
+    details = json.loads(row['details']) if row['details'] else {}
+    return [analysis_logic.ForensicCheck.from_dict(c) for c in details.get('checks', [])]
+
+def stored_details(row):
+    """Parsed details dict with checks merged back in (certificate / reuse paths)."""
+    details = json.loads(row['details']) if row['details'] else {}
+    if row['schema_version']:
+        details['checks'] = [c.to_dict() for c in analysis_logic.unpack_checks(row['checks'])]
+    return details
+
+def analysis_json(row):
+    """
+    Serializes an analysis row straight to a JSON body. The stored details text is
+    spliced in verbatim rather than parsed and re-dumped; only the (small) packed
+    check list is encoded.
+    """
+    head = json.dumps({
         "id": row['id'], "userId": row['user_id'], "fileName": row['file_name'],
         "fileUrl": row['file_url'], "fileType": row['file_type'],
         "sentimentLabel": row['sentiment_label'], "sentimentScore": row['sentiment_score'],
         "authenticityLabel": row['authenticity_label'], "authenticityScore": row['authenticity_score'],
-        "details": json.loads(row['details']) if row['details'] else {}, "createdAt": row['created_at']
+        "createdAt": row['created_at']
     })
+    details = (row['details'] or '{}').strip()
+    if row['schema_version']:
+        checks = json.dumps([c.to_dict() for c in analysis_logic.unpack_checks(row['checks'])])
+        separator = ',' if details != '{}' else ''
+        details = f'{details[:-1]}{separator}"checks":{checks}}}'
+    return f'{head[:-1]},"details":{details}}}'
+
+def prior_result(id):
+    """Rebuilds an AnalysisResult from a stored analysis (None if it was deleted)."""
+    row = store.get_analysis(id)
+    if row is None:
+        return None
+    conn = get_analytics_connection()
+    metrics = dict(conn.execute('SELECT name, metric FROM forensic_checks WHERE analysis_id = ?', (id,)).fetchall())
+    conn.close()
+    checks = stored_checks(row)
+    for c in checks:
+        c.metric = metrics.get(c.name)
+    details = json.loads(row['details']) if row['details'] else {}
+    for key in ('checks', 'near_duplicates', 'near_duplicate_of', 'audio_matches'):
+        details.pop(key, None)
+    return analysis_logic.AnalysisResult(
+        row['authenticity_label'], row['authenticity_score'], details.pop('reasoning', ''),
+        checks, details,
+        sentiment_label=row['sentiment_label'], sentiment_score=row['sentiment_score']
+    )
+
+def reusable_result(near_duplicate):
+    """
+    The stored result of a near-duplicate if its verdict can stand for the new upload:
+    close enough, not an error, and produced by the current engine and threshold profile.
+    """
+    if near_duplicate['distance'] > NEAR_DUPLICATE_REUSE_DISTANCE or near_duplicate['authenticityLabel'] == 'Error':
+        return None
+    res = prior_result(near_duplicate['id'])
+    if res is None or any(res.details.get(k) != v for k, v in analysis_logic.result_provenance().items()):
+        return None
+    return res
+
+def analysis_json_by_id(id):
+    row = store.get_analysis(id)
+    return analysis_json(row) if row else None
+
+def get_analysis_by_id(id):
+    body = analysis_json_by_id(id)
+    if body is None: return jsonify({"message": "Not found"}), 404
+    return app.response_class(body, mimetype='application/json')
+
+# Rendered analysis JSON and certificate PDFs, per worker (see http_cache.py)
+response_cache = http_cache.BodyCache()
+
+def stored_response(kind, id, render, mimetype):
+    """
+    Conditional, compressed response for a stored analysis rendered by render(id)
+    (bytes, or None if missing). Existence is checked on every hit with a cheap
+    indexed lookup, so this worker never serves a cached body of an analysis
+    another worker has deleted. Returns None when the analysis does not exist.
+    """
+    if store.analysis_header(id) is None:
+        response_cache.invalidate(kind, id)
+        return None
+    tag = http_cache.etag(kind, id, analysis_logic.ENGINE_VERSION)
+    headers = {'Cache-Control': http_cache.IMMUTABLE, 'Vary': 'Accept-Encoding'}
+
+    matched = http_cache.matched_tag(request.if_none_match, tag)
+    if matched:
+        return app.response_class(status=304, headers={**headers, 'ETag': f'"{matched}"'})
+
+    body = response_cache.get((kind, id, 'identity'))
+    if body is None:
+        body = render(id)
+        if body is None:
+            return None
+        response_cache.put((kind, id, 'identity'), body)
+    if http_cache.accepts_gzip(request.accept_encodings) and len(body) >= http_cache.MIN_GZIP_BYTES:
+        compressed = response_cache.get((kind, id, 'gzip'))
+        if compressed is None:
+            compressed = http_cache.compress(body)
+            response_cache.put((kind, id, 'gzip'), compressed)
+        body, tag = compressed, http_cache.gzip_tag(tag)
+        headers['Content-Encoding'] = 'gzip'
+    return app.response_class(body, mimetype=mimetype, headers={**headers, 'ETag': f'"{tag}"'})
+
+def render_analysis(id):
+    body = analysis_json_by_id(id)
+    return body.encode('utf-8') if body is not None else None
 
 @app.route('/api/analysis/<int:id>', methods=['GET'])
 def get_analysis_route(id):
     # Optional: Verify user owns this analysis
-    return get_analysis_by_id(id)
+    resp = stored_response('a', id, render_analysis, 'application/json')
+    if resp is None: return jsonify({"message": "Not found"}), 404
+    return resp
 
 @app.route('/api/analysis/<int:id>', methods=['DELETE'])
 def delete_analysis(id):
     user = get_current_user_helper()
     if not user: return jsonify({"message": "Unauthorized"}), 401
 
-    conn = get_db_connection()
     # Ensure user owns the record
-    record = conn.execute('SELECT user_id FROM analysis_results WHERE id = ?', (id,)).fetchone()
+    record = store.analysis_header(id)
     if record and record['user_id'] == user['id']:
-        conn.execute('DELETE FROM analysis_results WHERE id = ?', (id,))
+        store.delete_analysis(id)
+        response_cache.invalidate('a', id)
+        response_cache.invalidate('c', id)
+        conn = get_analytics_connection()
+        check_stats.remove(conn, id)
+        rollups.record_analysis(conn, record['file_type'], record['authenticity_label'], delta=-1)
         conn.commit()
         conn.close()
+        image_index.remove(id)
+        audio_index.remove(id)
+        last_analyses.invalidate(user['id'])
         return '', 204
     
-    conn.close()
     return jsonify({"message": "Not allowed"}), 403
 
+@app.route('/api/analysis/<int:id>/neighbours', methods=['GET'])
+def get_analysis_neighbours(id):
+    user = get_current_user_helper()
+    if not user: return jsonify({"message": "Unauthorized"}), 401
+
+    record = store.analysis_header(id)
+    if not record or record['user_id'] != user['id']:
+        return jsonify({"message": "Not found"}), 404
+    hashes = image_index.get(id)
+    if not hashes:
+        return jsonify({"message": "No perceptual hash stored for this analysis"}), 404
+    return jsonify({"id": id, "neighbours": find_near_duplicates(hashes, user['id'], exclude=id)})
+
+@app.route('/api/analysis/neighbours', methods=['POST'])
+def query_neighbours():
+    """Looks up the caller's previously analyzed near-duplicates of an upload without analyzing it."""
+    user = get_current_user_helper()
+    if not user: return jsonify({"message": "Unauthorized"}), 401
+
+    data = request.json or {}
+    try:
+        header, encoded = data.get('fileData', '').split(",", 1)
+        hashes = media_index.compute_image_hashes(base64.b64decode(encoded))
+    except Exception:
+        hashes = None
+    if not hashes:
+        return jsonify({"message": "Invalid image data"}), 400
+    return jsonify({"neighbours": find_near_duplicates(hashes, user['id'])})
+
 @app.route('/api/analysis/certificate/<int:id>', methods=['GET'])
 def download_certificate(id):
-    conn = get_db_connection()
-    row = conn.execute('SELECT * FROM analysis_results WHERE id = ?', (id,)).fetchone()
-    conn.close()
-    if not row: return "Not Found", 404
+    # The PDF is rendered once per worker and then served from the response cache
+    response = stored_response('c', id, render_certificate, 'application/pdf')
+    if response is None: return "Not Found", 404
+    # Hint to the browser to show the filename if it decides to save
+    response.headers["Content-Disposition"] = f"inline; filename=certificate_{id}.pdf"
+    return response
+
+def render_certificate(id):
+    row = store.get_analysis(id)
+    if not row: return None
     
     data = dict(row)
+    data['details'] = stored_details(row)
     logo_path = os.path.join(os.path.dirname(__file__), 'logo.png')
     image_data = data.get('file_url') if data.get('file_type') == 'image' else None
     
-    pdf_bytes = analysis_logic.generate_certificate(data, logo_path=logo_path, image_data=image_data)
-    
-    response = send_file(
-        io.BytesIO(pdf_bytes),
-        mimetype='application/pdf',
-        as_attachment=False
-    )
-    # Hint to the browser to show the filename if it decides to save
-    response.headers["Content-Disposition"] = f"inline; filename=certificate_{id}.pdf"
-    return response
+    return analysis_logic.generate_certificate(data, logo_path=logo_path, image_data=image_data)
+
+def load_last_analysis(user_id):
+    row = store.last_analysis(user_id)
+    return last_analysis_summary(row['file_name'], row['authenticity_label'], row['authenticity_score']) if row else None
+
+def last_analysis_summary(file_name, label, score):
+    return {"fileName": file_name, "label": label, "score": score}
+
+# Chat knowledge base (indexed once) and per-user latest-analysis cache
+knowledge_base = chat_kb.KnowledgeBase.load()
+last_analyses = chat_kb.LastAnalysisCache(load_last_analysis, ttl=int(os.getenv("CHAT_HISTORY_CACHE_SECONDS", 300)))
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
-    user = get_current_user_helper()
     data = request.json
     if not data: return jsonify({"reply": "System Error: No signal received."})
-    msg = data.get('message', '').lower()
-    
-    # Forensic Knowledge Base
-    responses = {
-        "ela": "Error Level Analysis (ELA) identifies areas within an image that are at different compression levels. In AI-generated images, this often reveals inconsistencies in pixel density.",
-        "metadata": "Metadata forensics involves scrutinizing EXIF data, XMP tags, and ICC profiles for signatures left by generative AI models or editing software.",
-        "deepfake": "Deepfake detection looks for frequency anomalies in audio-visual streams, such as unnatural blinking, inconsistent lighting, or phase shifts in vocal patterns.",
-        "spectral": "Spectral analysis in audio identifies 'checkerboard artifacts'—unnatural frequency gaps introduced by GANs during the synthesis process."
-    }
+    msg = data.get('message', '')
+
+    entry = knowledge_base.match(msg)
+    if entry is None:
+        return jsonify({"reply": knowledge_base.fallback})
 
     # Contextual Logic: Check if user asks about their results
-    if "result" in msg or "previous" in msg or "last" in msg or "history" in msg:
+    if entry.get('intent') == 'history':
+        user = get_current_user_helper()
         if not user:
             return jsonify({"reply": "Please log in to the forensic terminal to access your analysis history."})
         
-        conn = get_db_connection()
-        last_analysis = conn.execute(
-            'SELECT * FROM analysis_results WHERE user_id = ? ORDER BY created_at DESC LIMIT 1', 
-            (user['id'],)
-        ).fetchone()
-        conn.close()
-        
+        last_analysis = last_analyses.get(user['id'])
         if last_analysis:
-            label = last_analysis['authenticity_label']
-            score = last_analysis['authenticity_score']
-            file_name = last_analysis['file_name']
             return jsonify({
-                "reply": f"SYSTEM LOG: Your most recent analysis for '{file_name}' returned a classification of '{label}' with {score}% confidence. You can view the full diagnostic at the laboratory terminal."
+                "reply": f"SYSTEM LOG: Your most recent analysis for '{last_analysis['fileName']}' returned a classification of '{last_analysis['label']}' with {last_analysis['score']}% confidence. You can view the full diagnostic at the laboratory terminal."
             })
         else:
             return jsonify({"reply": "No clinical history found. Please upload a specimen for analysis first."})
 
-    # Advanced Keyword Matching
-    for key, val in responses.items():
-        if key in msg:
-            return jsonify({"reply": val})
+    return jsonify({"reply": entry['reply']})
 
-    if "how" in msg or "process" in msg:
-        return jsonify({"reply": "Diagnostic Workflow: We utilize a multi-layered verification stack (ELA, Spectral, and Metadata) to detect generative artifacts."})
-    
-    if "hello" in msg or "hi" in msg:
-        return jsonify({"reply": "Forensic Terminal Active. State your inquiry regarding digital integrity or specimen analysis."})
+ADMIN_PAGE_SIZE = 50
+ADMIN_MAX_PAGE_SIZE = 500
 
-    return jsonify({"reply": "Inquiry not recognized. I am optimized for forensic diagnostic questions. Try asking about 'ELA', 'Metadata Analysis', or 'Your recent results'."})
+def page_args():
+    """(limit, cursor) from ?limit=&cursor=; the cursor is the last id of the previous page."""
+    limit = request.args.get('limit', ADMIN_PAGE_SIZE, type=int)
+    return max(1, min(limit, ADMIN_MAX_PAGE_SIZE)), request.args.get('cursor', type=int)
+
+def activity_page(limit, cursor=None):
+    # Newest first by id
+    rows = store.activity_before(cursor, limit + 1)
+    results = [{
+        "id": row['id'],
+        "userId": row['user_id'],
+        "username": row['username'],
+        "fullName": f"{row['first_name']} {row['last_name']}".strip(),
+        "action": row['action'],
+        "timestamp": row['timestamp']
+    } for row in rows[:limit]]
+    next_cursor = results[-1]['id'] if len(rows) > limit else None
+    return results, next_cursor
+
+def users_page(limit, cursor=None):
+    rows = store.users_after(cursor, limit + 1)
+    results = [{
+        "id": row['id'],
+        "username": row['username'],
+        "fullName": f"{row['first_name']} {row['last_name']}".strip(),
+        "createdAt": row['created_at']
+    } for row in rows[:limit]]
+    next_cursor = results[-1]['id'] if len(rows) > limit else None
+    return results, next_cursor
 
 @app.route('/api/admin/summary', methods=['GET'])
 def get_admin_summary():
+    # Counters come from the rollup table; activity and users are first pages only
+    # (continue with /api/admin/activity and /api/admin/users using the cursors).
     try:
-        conn = get_db_connection()
-        
-        # Fetch Activity
-        activity = conn.execute('''
-            SELECT a.*, u.username, u.first_name, u.last_name 
-            FROM user_activity a
-            JOIN users u ON a.user_id = u.id
-            ORDER BY a.timestamp DESC
-        ''').fetchall()
-        
-        # Fetch All Users
-        all_users = conn.execute('SELECT id, username, first_name, last_name, created_at FROM users').fetchall()
-        
+        limit, _ = page_args()
+        activity.flush()  # Include this worker's queued events
+        conn = get_analytics_connection()
+        stats = rollups.summary(conn, last_activity=store.last_activity_time())
         conn.close()
-        
-        activity_results = []
-        for row in activity:
-            activity_results.append({
-                "id": row['id'],
-                "userId": row['user_id'],
-                "username": row['username'],
-                "fullName": f"{row['first_name']} {row['last_name']}".strip(),
-                "action": row['action'],
-                "timestamp": row['timestamp']
-            })
-            
-        user_results = []
-        for row in all_users:
-            user_results.append({
-                "id": row['id'],
-                "username": row['username'],
-                "fullName": f"{row['first_name']} {row['last_name']}".strip(),
-                "createdAt": row['created_at']
-            })
-            
+        activity_results, activity_cursor = activity_page(limit)
+        user_results, users_cursor = users_page(limit)
         return jsonify({
+            "stats": stats,
             "activities": activity_results,
-            "users": user_results
+            "activitiesCursor": activity_cursor,
+            "users": user_results,
+            "usersCursor": users_cursor
         })
     except Exception as e:
         print(f"BACKEND ERROR IN ADMIN SUMMARY: {e}")
         return jsonify({"message": "Failed to fetch summary", "error": str(e)}), 500
 
+@app.route('/api/admin/activity', methods=['GET'])
+def get_admin_activity():
+    limit, cursor = page_args()
+    activity.flush()
+    results, next_cursor = activity_page(limit, cursor)
+    return jsonify({"activities": results, "nextCursor": next_cursor})
+
+@app.route('/api/admin/users', methods=['GET'])
+def get_admin_users():
+    limit, cursor = page_args()
+    results, next_cursor = users_page(limit, cursor)
+    return jsonify({"users": results, "nextCursor": next_cursor})
+
+@app.route('/api/admin/checks', methods=['GET'])
+def get_admin_check_stats():
+    # e.g. /api/admin/checks?fileType=audio&since=2026-10-12
+    try:
+        conn = get_analytics_connection()
+        rates = check_stats.failure_rates(
+            conn,
+            file_type=request.args.get('fileType'),
+            since=request.args.get('since'),
+            until=request.args.get('until')
+        )
+        conn.close()
+        return jsonify({"checks": rates})
+    except Exception as e:
+        print(f"BACKEND ERROR IN CHECK STATS: {e}")
+        return jsonify({"message": "Failed to fetch check stats", "error": str(e)}), 500
+
+@app.route('/api/admin/checks/distribution', methods=['GET'])
+def get_admin_check_distribution():
+    name = request.args.get('name')
+    if not name:
+        return jsonify({"message": "Check name is required"}), 400
+    try:
+        conn = get_analytics_connection()
+        distribution = check_stats.metric_distribution(
+            conn, name,
+            file_type=request.args.get('fileType'),
+            since=request.args.get('since'),
+            until=request.args.get('until'),
+            buckets=request.args.get('buckets', 10, type=int)
+        )
+        conn.close()
+        return jsonify(distribution)
+    except Exception as e:
+        print(f"BACKEND ERROR IN CHECK DISTRIBUTION: {e}")
+        return jsonify({"message": "Failed to fetch check distribution", "error": str(e)}), 500
+
+# Analysis profiles (see profiling.py); these routes need the X-Profile-Token header
+profile_store = profiling.ProfileStore()
+
+def profile_access_denied():
+    if not profiling.token_valid(request.headers.get(profiling.PROFILE_HEADER)):
+        return jsonify({"message": "Profiling access requires a valid X-Profile-Token"}), 403
+    return None
+
+@app.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    denied = profile_access_denied()
+    if denied: return denied
+    limit = request.args.get('limit', ADMIN_PAGE_SIZE, type=int)
+    return jsonify({"profiles": profile_store.list(max(1, min(limit, ADMIN_MAX_PAGE_SIZE)))})
+
+@app.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    denied = profile_access_denied()
+    if denied: return denied
+    try:
+        summary = profile_store.load(profile_id)
+    except ValueError:
+        summary = None
+    if summary is None: return jsonify({"message": "Not found"}), 404
+    return jsonify(summary)
+
+@app.route('/api/admin/profiles/<profile_id>/pstats', methods=['GET'])
+def download_profile_stats(profile_id):
+    denied = profile_access_denied()
+    if denied: return denied
+    try:
+        path = os.path.abspath(profile_store.path(profile_id, "pstats"))
+    except ValueError:
+        return jsonify({"message": "Not found"}), 404
+    if not os.path.exists(path): return jsonify({"message": "Not found"}), 404
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f"{profile_id}.pstats")
+
 if __name__ == '__main__':
     # Exclude site-packages and cv2 to prevent infinite reload loops
     # Using exclude_patterns directly requires werkzeug, for Flask run we pass via **options
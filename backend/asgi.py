@@ -0,0 +1,176 @@
+import io
+import os
+import sys
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# --- ASGI FRONT ---
+# Async serving mode for the same API:
+#
+#   cd backend && uvicorn asgi:application --host 0.0.0.0 --port $PORT --workers 2
+#
+# The event loop accepts connections, reads request bodies and writes responses;
+# the Flask routes run on two thread pools so nothing blocking ever runs on the
+# loop. Light routes (auth, history, chat, certificates, admin) share one pool and
+# are served concurrently. Uploads get their own small pool whose threads only wait
+# on the analysis process pool (analysis_executor), so a burst of multi-second
+# analyses can never occupy the threads that polling requests need. Responses are
+# streamed chunk by chunk, so /api/analysis/stream still delivers its events live;
+# a client that disconnects stops its stream (and, through it, the analysis).
+#
+# Configuration (environment):
+#   ASGI_LIGHT_THREADS   threads serving light routes
+#   ASGI_HEAVY_THREADS   threads serving upload routes (default ADMISSION_HEAVY_PER_WORKER + 1,
+#                        the spare one answers refused uploads without waiting)
+#   ANALYSIS_WORKERS     defaults to 2 here when neither the environment nor .env sets it:
+#                        analyzers must not hold this process's GIL
+
+from dotenv import load_dotenv
+
+# Before the local modules, which read backend/.env settings at import time; the
+# default below only fills in what .env leaves unset
+load_dotenv()
+os.environ.setdefault("ANALYSIS_WORKERS", "2")
+
+import admission
+import analysis_executor
+import app as backend
+
+ASGI_LIGHT_THREADS = int(os.getenv("ASGI_LIGHT_THREADS", 16))
+ASGI_HEAVY_THREADS = int(os.getenv("ASGI_HEAVY_THREADS", admission.ADMISSION_HEAVY_PER_WORKER + 1))
+
+# Routes that decode media and run (or wait for) the analyzers
+HEAVY_ROUTES = {
+    ("POST", "/api/analysis/upload"),
+    ("POST", "/api/analysis/stream"),
+    ("POST", "/api/analysis/neighbours"),
+}
+
+
+def wsgi_environ(scope, body):
+    """WSGI environ for an ASGI http scope (PEP 3333 strings are latin-1)."""
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    host, port = scope.get("server") or ("localhost", 80)
+    environ["SERVER_NAME"], environ["SERVER_PORT"] = host, str(port or 80)
+    if scope.get("client"):
+        environ["REMOTE_ADDR"], environ["REMOTE_PORT"] = scope["client"][0], str(scope["client"][1])
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else f"HTTP_{name}"
+        value = value.decode("latin-1")
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class AsyncFront:
+    """ASGI application serving a WSGI app from thread pools split by route weight."""
+
+    def __init__(self, wsgi_app, light_threads=ASGI_LIGHT_THREADS, heavy_threads=ASGI_HEAVY_THREADS):
+        self.wsgi_app = wsgi_app
+        self.light = ThreadPoolExecutor(max(1, light_threads), thread_name_prefix="asgi-light")
+        self.heavy = ThreadPoolExecutor(max(1, heavy_threads), thread_name_prefix="asgi-heavy")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # Fork the analysis workers now, before the pools have started any threads
+                analysis_executor.get_executor()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.light.shutdown(wait=False)
+                self.heavy.shutdown(wait=False)
+                # uvicorn ends by re-raising the stop signal, so atexit handlers never run
+                backend.activity.close()
+                executor = analysis_executor.get_executor()
+                if executor is not None:
+                    executor.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def http(self, scope, receive, send):
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+
+        loop = asyncio.get_running_loop()
+        disconnected = threading.Event()
+
+        async def watch_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        def send_from_thread(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        pool = self.heavy if (scope["method"], scope["path"]) in HEAVY_ROUTES else self.light
+        watcher = loop.create_task(watch_disconnect())
+        try:
+            await loop.run_in_executor(pool, self.serve, wsgi_environ(scope, b"".join(chunks)),
+                                       send_from_thread, disconnected)
+        finally:
+            watcher.cancel()
+
+    def serve(self, environ, send, disconnected):
+        """Runs the WSGI app in a pool thread, sending its response through the loop."""
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get("sent"):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response["start"] = {
+                "type": "http.response.start",
+                "status": int(status.split(" ", 1)[0]),
+                "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers],
+            }
+            return lambda data: body(data)
+
+        def body(data):
+            if not response.get("sent"):
+                send(response["start"])
+                response["sent"] = True
+            if data:
+                send({"type": "http.response.body", "body": data, "more_body": True})
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            for data in result:
+                if disconnected.is_set():
+                    return  # Closing the iterable runs the route's cleanup (e.g. cancels a stream)
+                body(data)
+            body(b"")
+            send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+
+
+application = AsyncFront(backend.app)
@@ -0,0 +1,183 @@
+import sqlite3
+from itertools import combinations
+
+import numpy as np
+
+# --- LANDMARK FINGERPRINTS ---
+# Constellation-style fingerprint: local spectral peaks from the analyzer's STFT
+# are combined into (f1, f2, f3, dt2, dt3) landmark hashes: an anchor peak and each
+# pair of peaks in its target zone, anchored at time t1. Three peaks give a 36-bit
+# hash, so posting lists stay short with hundreds of thousands of clips (a 22-bit
+# peak pair collides constantly in speech bands). Frequencies and times
+# are quantized in Hz/seconds rather than bins/frames, so re-encodes at a different
+# sample rate still produce the same hashes, and trims only shift t1.
+
+HOP_LENGTH = 512           # librosa.stft default, as used by the audio analyzer
+N_FFT = 2048
+FREQ_STEP_HZ = 20.0        # 250 bands below MAX_FREQ_HZ -> 8 bits
+MIN_FREQ_HZ = 100.0
+MAX_FREQ_HZ = 5000.0       # codecs keep this band; high bands are the first to go
+TIME_STEP_S = 512 / 22050  # ~23 ms per time unit
+PEAKS_PER_SECOND = 10
+PEAK_NEIGHBOURHOOD_HZ = 400.0
+PEAK_NEIGHBOURHOOD_S = 0.25
+FAN_OUT = 5
+MAX_DT = 63                # 6 bits per target
+MAX_HASHES_PER_CLIP = 3000  # ~30 s of speech at 10 hashes per anchor
+MIN_MATCH_SCORE = 6        # aligned hashes needed to call a match (chance alignments of 36-bit hashes are rare)
+
+
+def _find_peaks(S, sr):
+    from scipy.ndimage import maximum_filter
+
+    freqs = np.arange(S.shape[0]) * sr / N_FFT
+    band = (freqs >= MIN_FREQ_HZ) & (freqs < MAX_FREQ_HZ)
+    S_db = 20 * np.log10(S[band] + 1e-10)
+    # Neighbourhood sized in Hz/seconds so peaks don't depend on the sample rate
+    size = (max(3, int(PEAK_NEIGHBOURHOOD_HZ * N_FFT / sr)), max(3, int(PEAK_NEIGHBOURHOOD_S * sr / HOP_LENGTH)))
+    local_max = (S_db == maximum_filter(S_db, size=size)) & (S_db > np.median(S_db) + 10)
+
+    f_idx, t_idx = np.nonzero(local_max)
+    duration = S.shape[1] * HOP_LENGTH / sr
+    keep = int(max(1, duration * PEAKS_PER_SECOND))
+    if len(f_idx) > keep:
+        strongest = np.argsort(S_db[f_idx, t_idx])[-keep:]
+        f_idx, t_idx = f_idx[strongest], t_idx[strongest]
+
+    f_bands = (freqs[band][f_idx] / FREQ_STEP_HZ).astype(np.int64)
+    t_units = (t_idx * HOP_LENGTH / sr / TIME_STEP_S).astype(np.int64)
+    order = np.lexsort((f_bands, t_units))
+    return f_bands[order], t_units[order]
+
+
+def fingerprint_from_stft(S, sr):
+    """Returns a list of (hash, t_units) landmarks from a magnitude STFT (librosa defaults)."""
+    f_bands, t_units = _find_peaks(S, sr)
+    landmarks = []
+    for i in range(len(f_bands)):
+        targets = []
+        for j in range(i + 1, len(f_bands)):
+            dt = t_units[j] - t_units[i]
+            if dt > MAX_DT:
+                break
+            if dt == 0:
+                continue
+            targets.append((int(f_bands[j]), int(dt)))
+            if len(targets) == FAN_OUT:
+                break
+        for (f2, dt2), (f3, dt3) in combinations(targets, 2):
+            h = (int(f_bands[i]) << 28) | (f2 << 20) | (f3 << 12) | (dt2 << 6) | dt3
+            landmarks.append((h, int(t_units[i])))
+        if len(landmarks) >= MAX_HASHES_PER_CLIP:
+            break
+    return landmarks
+
+
+# --- INVERTED INDEX ---
+
+class AudioFingerprintIndex:
+    """
+    Inverted index (user_id, hash) -> (analysis_id, t) in SQLite. The postings table
+    is a WITHOUT ROWID table clustered on (user_id, hash): a lookup seeks straight to
+    the uploader's own postings for each query hash, users never match each other's
+    clips, and a clip's postings can be purged with a scan of its owner's range only.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._init_tables()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path)
+
+    def _init_tables(self):
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS audio_landmarks (
+                user_id INTEGER,
+                hash INTEGER,
+                analysis_id INTEGER,
+                t INTEGER,
+                PRIMARY KEY (user_id, hash, analysis_id, t)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS audio_fingerprint_clips (
+                analysis_id INTEGER PRIMARY KEY,
+                user_id INTEGER,
+                hash_count INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def insert(conn, analysis_id, landmarks, user_id):
+        """Persists landmarks on an open connection (bulk loaders); the caller commits."""
+        conn.executemany(
+            'INSERT OR IGNORE INTO audio_landmarks (user_id, hash, analysis_id, t) VALUES (?, ?, ?, ?)',
+            [(user_id, h, analysis_id, t) for h, t in landmarks]
+        )
+        conn.execute(
+            'INSERT OR REPLACE INTO audio_fingerprint_clips (analysis_id, user_id, hash_count) VALUES (?, ?, ?)',
+            (analysis_id, user_id, len(landmarks))
+        )
+
+    def add(self, analysis_id, landmarks, user_id):
+        if not landmarks:
+            return
+        conn = self._connect()
+        self.insert(conn, analysis_id, landmarks, user_id)
+        conn.commit()
+        conn.close()
+
+    def remove(self, analysis_id):
+        conn = self._connect()
+        row = conn.execute('SELECT user_id FROM audio_fingerprint_clips WHERE analysis_id = ?', (analysis_id,)).fetchone()
+        if row:
+            conn.execute('DELETE FROM audio_landmarks WHERE user_id IS ? AND analysis_id = ?', (row[0], analysis_id))
+            conn.execute('DELETE FROM audio_fingerprint_clips WHERE analysis_id = ?', (analysis_id,))
+        conn.commit()
+        conn.close()
+
+    def match(self, landmarks, user_id, limit=5, min_score=MIN_MATCH_SCORE):
+        """
+        Returns [{"analysis_id", "score", "offset_seconds", "coverage"}] for user_id's stored
+        clips sharing time-aligned landmarks. offset_seconds is where the query starts in the
+        stored clip (negative if the query has extra audio in front).
+        """
+        if not landmarks:
+            return []
+        conn = self._connect()
+        # Votes per (clip, time offset) are counted by SQLite, not row by row in Python
+        conn.execute('CREATE TEMP TABLE query_landmarks (hash INTEGER, t INTEGER)')
+        conn.executemany('INSERT INTO query_landmarks (hash, t) VALUES (?, ?)', landmarks)
+        votes = {
+            (analysis_id, offset): count
+            for analysis_id, offset, count in conn.execute('''
+                SELECT p.analysis_id, p.t - q.t AS offset, COUNT(*)
+                FROM query_landmarks q JOIN audio_landmarks p ON p.user_id = ? AND p.hash = q.hash
+                GROUP BY p.analysis_id, offset
+            ''', (user_id,))
+        }
+        conn.close()
+
+        best = {}
+        for (analysis_id, offset), score in votes.items():
+            # Merge neighbouring offsets: quantization can split an alignment across two units
+            score += votes.get((analysis_id, offset + 1), 0)
+            if score >= min_score and score > best.get(analysis_id, (0, 0))[0]:
+                best[analysis_id] = (score, offset)
+
+        results = [
+            {
+                "analysis_id": analysis_id,
+                "score": score,
+                "offset_seconds": round(offset * TIME_STEP_S, 2),
+                "coverage": round(min(1.0, score / len(landmarks)), 3),
+            }
+            for analysis_id, (score, offset) in best.items()
+        ]
+        results.sort(key=lambda r: -r["score"])
+        return results[:limit]
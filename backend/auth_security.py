@@ -0,0 +1,118 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# --- PASSWORD HASHING ---
+# The KDF (scrypt / pbkdf2) is deliberately expensive. Hashes run on a small
+# bounded thread pool (hashlib releases the GIL while hashing), so a login burst
+# queues behind a fixed amount of CPU instead of occupying every request thread.
+#
+# Configuration (environment):
+#   PASSWORD_HASH_METHOD      werkzeug method string, e.g. "scrypt" or "pbkdf2:sha256:600000"
+#   PASSWORD_HASH_WORKERS     concurrent hash computations per process
+#   PASSWORD_HASH_QUEUE       additional hashes allowed to wait for a worker
+#   LOGIN_WINDOW_SECONDS      window of the attempt limiter
+#   LOGIN_MAX_ATTEMPTS_PER_IP login/register attempts per client IP per window
+#   LOGIN_MAX_FAILURES_PER_USER failed logins per username per window
+
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", 16))
+HASH_WAIT_SECONDS = 5
+
+
+class HashingBusy(Exception):
+    """Too many password hashes are already queued."""
+
+
+_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE)
+_method_prefix = None
+
+
+def _run(func, *args):
+    if not _slots.acquire(timeout=HASH_WAIT_SECONDS):
+        raise HashingBusy("Authentication is busy, please retry shortly.")
+    try:
+        future = _pool.submit(func, *args)
+    except RuntimeError:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future.result()
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def verify_password(stored_hash, password):
+    return _run(check_password_hash, stored_hash, password)
+
+
+def needs_rehash(stored_hash):
+    """True if stored_hash was made with a different method or cost than configured."""
+    global _method_prefix
+    if _method_prefix is None:
+        # werkzeug fills in default costs, so derive the full prefix ("scrypt:32768:8:1") once
+        _method_prefix = hash_password("").split("$", 1)[0]
+    return stored_hash.split("$", 1)[0] != _method_prefix
+
+
+# --- ATTEMPT LIMITER ---
+
+LOGIN_WINDOW_SECONDS = int(os.getenv("LOGIN_WINDOW_SECONDS", 300))
+LOGIN_MAX_ATTEMPTS_PER_IP = int(os.getenv("LOGIN_MAX_ATTEMPTS_PER_IP", 30))
+LOGIN_MAX_FAILURES_PER_USER = int(os.getenv("LOGIN_MAX_FAILURES_PER_USER", 8))
+
+
+class AttemptLimiter:
+    """
+    Sliding-window counters per key, kept in process memory. Each gunicorn worker
+    limits independently, so the effective cap is per worker.
+    """
+
+    def __init__(self, limit, window, max_keys=10000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._hits = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, hits, now):
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+
+    def retry_after(self, key):
+        """Seconds until key may try again (0 if allowed now)."""
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if not hits:
+                return 0
+            self._prune(hits, now)
+            if len(hits) < self.limit:
+                return 0
+            return max(1, int(hits[0] + self.window - now) + 1)
+
+    def hit(self, key):
+        now = time.monotonic()
+        with self._lock:
+            if key not in self._hits and len(self._hits) >= self.max_keys:
+                # Drop keys whose windows have fully expired
+                for stale in [k for k, v in self._hits.items() if not v or v[-1] <= now - self.window]:
+                    del self._hits[stale]
+            hits = self._hits.setdefault(key, deque())
+            self._prune(hits, now)
+            hits.append(now)
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
+
+
+ip_attempts = AttemptLimiter(LOGIN_MAX_ATTEMPTS_PER_IP, LOGIN_WINDOW_SECONDS)
+user_failures = AttemptLimiter(LOGIN_MAX_FAILURES_PER_USER, LOGIN_WINDOW_SECONDS)
@@ -0,0 +1,367 @@
+import os
+import sys
+import json
+import time
+import base64
+import sqlite3
+import argparse
+import multiprocessing
+
+from dotenv import load_dotenv
+
+import analysis_logic
+import check_stats
+import media_index
+import rollups
+from audio_fingerprint import AudioFingerprintIndex
+
+# --- OFFLINE BATCH SCANNER ---
+# Runs the analyzers over a directory tree without Flask: file types are detected
+# from magic bytes, files are analyzed on a process pool (each worker reads its own
+# files, so no media crosses a pipe), and results go to a JSONL file or straight
+# into the app's SQLite schema in bulk transactions (STORAGE_BACKEND=sqlite only).
+#
+#   python batch_scan.py ARCHIVE_DIR --output results.jsonl
+#   python batch_scan.py ARCHIVE_DIR --db database.db --user-id 1 [--no-media]
+#
+# Completed files are appended to a checkpoint (default <output>.checkpoint) once
+# their results are flushed, so an interrupted scan resumes where it stopped.
+# Failed files are not checkpointed and are retried on the next run. A crash between
+# a flush and its checkpoint write can't replay rows either: on resume, paths the
+# sink already holds are skipped too.
+
+# (offset, magic, file_type, mime)
+_MAGIC = [
+    (0, b"\xff\xd8\xff", "image", "image/jpeg"),
+    (0, b"\x89PNG\r\n\x1a\n", "image", "image/png"),
+    (0, b"GIF87a", "image", "image/gif"),
+    (0, b"GIF89a", "image", "image/gif"),
+    (0, b"BM", "image", "image/bmp"),
+    (0, b"II*\x00", "image", "image/tiff"),
+    (0, b"MM\x00*", "image", "image/tiff"),
+    (8, b"WEBP", "image", "image/webp"),
+    (8, b"WAVE", "audio", "audio/wav"),
+    (0, b"fLaC", "audio", "audio/flac"),
+    (0, b"OggS", "audio", "audio/ogg"),
+    (0, b"ID3", "audio", "audio/mpeg"),
+    (8, b"M4A ", "audio", "audio/mp4"),
+]
+TEXT_EXTENSIONS = {".txt", ".md", ".text"}
+MAX_FILE_BYTES = 200 * 1024 * 1024
+# Same recycling policy as the app's analysis executor (bounds leaks in native libraries)
+MAX_TASKS_PER_WORKER = int(os.getenv("ANALYSIS_WORKER_MAX_TASKS", 50))
+
+
+def detect_type(path):
+    """(file_type, mime) from the first bytes of path, or (None, None) if unsupported."""
+    with open(path, "rb") as f:
+        head = f.read(512)
+    for offset, magic, file_type, mime in _MAGIC:
+        if head[offset:offset + len(magic)] == magic:
+            return file_type, mime
+    if len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:  # MPEG audio frame sync
+        return "audio", "audio/mpeg"
+    if os.path.splitext(path)[1].lower() in TEXT_EXTENSIONS and b"\x00" not in head:
+        try:
+            head.decode("utf-8")
+        except UnicodeDecodeError as e:
+            if e.start < len(head) - 4:  # not just a multi-byte character cut at the boundary
+                return None, None
+        return "text", "text/plain"
+    return None, None
+
+
+def walk(root):
+    """Relative paths of regular files under root, in a stable order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            yield os.path.relpath(os.path.join(dirpath, name), root)
+
+
+# --- WORKER SIDE ---
+
+_worker_root = None
+_worker_mode = None
+
+
+def _init_worker(root, mode):
+    global _worker_root, _worker_mode
+    _worker_root, _worker_mode = root, mode
+    analysis_logic.preload()
+
+
+def _scan_one(rel_path):
+    """Analyzes one file -> (rel_path, record or None, error or None); never raises."""
+    path = os.path.join(_worker_root, rel_path)
+    try:
+        file_type, mime = detect_type(path)
+        if file_type is None:
+            return rel_path, None, None
+        if os.path.getsize(path) > MAX_FILE_BYTES:
+            return rel_path, None, "file too large"
+        with open(path, "rb") as f:
+            data = f.read()
+        res = analysis_logic.analyze_media(file_type, data, mode=_worker_mode)
+        if res.label == "Error":
+            return rel_path, None, res.reasoning
+        hashes = media_index.compute_image_hashes(data) if file_type == "image" else None
+        res.fingerprint = list(res.fingerprint) if res.fingerprint else None
+        return rel_path, {"fileType": file_type, "mime": mime, "size": len(data),
+                          "result": res, "hashes": hashes}, None
+    except Exception as e:
+        return rel_path, None, f"{type(e).__name__}: {e}"
+
+
+# --- SINKS ---
+
+class JsonlSink:
+    """Buffers lines until flush, so the file only ever grows by whole batches."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lines = []
+
+    def completed(self, root):
+        """Paths already in the file; drops a line cut short by a crash mid-write."""
+        paths, valid = set(), 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    paths.add(json.loads(line)["path"])
+                except (ValueError, KeyError):
+                    pass
+                valid += len(line)
+        self._file.truncate(valid)
+        return paths
+
+    def add(self, root, rel_path, record):
+        res = record["result"]
+        self._lines.append(json.dumps({
+            "path": rel_path, "fileType": record["fileType"], "size": record["size"],
+            "authenticityLabel": res.label, "authenticityScore": res.score,
+            "sentimentLabel": res.sentiment_label, "sentimentScore": res.sentiment_score,
+            "details": {"reasoning": res.reasoning, **res.details,
+                        "checks": [c.to_dict() for c in res.checks]},
+        }, default=str) + "\n")
+
+    def flush(self):
+        self._file.write("".join(self._lines))
+        self._lines.clear()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class SqliteSink:
+    """
+    Writes rows exactly as the upload endpoint does (analysis_results plus
+    forensic_checks, rollups and the near-duplicate indexes), one transaction per
+    flush instead of one per file. Each file's path is recorded in batch_scan_files
+    in the same transaction, so a resumed scan never inserts a file twice.
+    """
+
+    def __init__(self, db_path, user_id, store_media=True):
+        self.conn = sqlite3.connect(db_path)
+        self.user_id = user_id
+        self.store_media = store_media
+        media_index.ImageHashIndex(db_path)  # Creates the index tables if missing
+        AudioFingerprintIndex(db_path)
+        check_stats.init_table(self.conn)
+        rollups.init_tables(self.conn)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS batch_scan_files (
+                root TEXT,
+                path TEXT,
+                analysis_id INTEGER,
+                PRIMARY KEY (root, path)
+            )
+        ''')
+        self.conn.commit()
+
+    def completed(self, root):
+        rows = self.conn.execute('SELECT path FROM batch_scan_files WHERE root = ?', (os.path.abspath(root),))
+        return {path for path, in rows}
+
+    def add(self, root, rel_path, record):
+        res = record["result"]
+        if self.store_media:
+            with open(os.path.join(root, rel_path), "rb") as f:
+                encoded = base64.b64encode(f.read()).decode("ascii")
+            file_url = f"data:{record['mime']};base64,{encoded}"
+        else:
+            file_url = None  # Report and certificate render without the specimen
+        cursor = self.conn.execute('''
+            INSERT INTO analysis_results (
+                user_id, file_name, file_url, file_type,
+                sentiment_label, sentiment_score,
+                authenticity_label, authenticity_score,
+                details, schema_version, checks
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            self.user_id, os.path.basename(rel_path), file_url, record["fileType"],
+            res.sentiment_label, res.sentiment_score,
+            res.label, res.score,
+            json.dumps({"reasoning": res.reasoning, **res.details}, separators=(',', ':'), default=str),
+            analysis_logic.RESULT_SCHEMA_VERSION,
+            analysis_logic.pack_checks(res.checks)
+        ))
+        new_id = cursor.lastrowid
+        self.conn.execute('INSERT INTO batch_scan_files (root, path, analysis_id) VALUES (?, ?, ?)',
+                          (os.path.abspath(root), rel_path, new_id))
+        check_stats.record(self.conn, new_id, record["fileType"], res.checks)
+        rollups.record_analysis(self.conn, record["fileType"], res.label)
+        if record["hashes"]:
+            media_index.ImageHashIndex.insert(self.conn, new_id, record["hashes"], self.user_id)
+        if res.fingerprint:
+            AudioFingerprintIndex.insert(self.conn, new_id, res.fingerprint, self.user_id)
+
+    def flush(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()  # Anything not flushed (interrupted batch) is rolled back
+
+
+# --- CHECKPOINT AND PROGRESS ---
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+class Progress:
+    """Single updating line on a terminal, a line every few seconds otherwise."""
+
+    def __init__(self, total, stream=sys.stderr, interval=5.0):
+        self.total = total
+        self.stream = stream
+        self.interactive = stream.isatty()
+        self.interval = 0.2 if self.interactive else interval
+        self.start = time.monotonic()
+        self._last = 0.0
+        self.done = self.errors = self.skipped = 0
+
+    def update(self, rel_path, final=False):
+        now = time.monotonic()
+        if not final and now - self._last < self.interval:
+            return
+        self._last = now
+        processed = self.done + self.errors + self.skipped
+        rate = processed / max(now - self.start, 1e-6)
+        eta = (self.total - processed) / rate if rate else 0
+        line = (f"[{processed}/{self.total}] {processed / max(self.total, 1):.1%}  {rate:.1f} files/s  "
+                f"ETA {int(eta) // 60}m{int(eta) % 60:02d}s  ok {self.done}  errors {self.errors}  "
+                f"skipped {self.skipped}  {rel_path[-40:]}")
+        if self.interactive:
+            self.stream.write("\r\033[K" + line + ("\n" if final else ""))
+        else:
+            self.stream.write(line + "\n")
+        self.stream.flush()
+
+
+def scan(root, sink, checkpoint_path, workers, mode=None, batch_size=50, errors=None):
+    done = load_checkpoint(checkpoint_path) | sink.completed(root)
+    pending = [p for p in walk(root) if p not in done]
+    progress = Progress(len(pending))
+    checkpoint = open(checkpoint_path, "a", encoding="utf-8")
+    batch = []
+
+    def flush():
+        sink.flush()
+        checkpoint.write("".join(p + "\n" for p in batch))
+        checkpoint.flush()
+        os.fsync(checkpoint.fileno())
+        batch.clear()
+
+    pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(root, mode),
+                                maxtasksperchild=MAX_TASKS_PER_WORKER or None)
+    try:
+        for rel_path, record, error in pool.imap_unordered(_scan_one, pending, chunksize=4):
+            if error:
+                progress.errors += 1
+                if errors is not None:
+                    errors.write(json.dumps({"path": rel_path, "error": error}) + "\n")
+            elif record is None:
+                progress.skipped += 1
+                batch.append(rel_path)  # Unsupported type: nothing to retry
+            else:
+                sink.add(root, rel_path, record)
+                progress.done += 1
+                batch.append(rel_path)
+            if len(batch) >= batch_size:
+                flush()
+            progress.update(rel_path)
+        flush()
+    finally:
+        pool.terminate()
+        pool.join()
+        checkpoint.close()
+        sink.close()
+    progress.update("done", final=True)
+    return progress
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze every supported file under a directory.")
+    parser.add_argument("root", help="directory to scan (recursively)")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--output", help="append results as JSON lines to this file")
+    target.add_argument("--db", help="insert results into this SQLite database (app schema)")
+    parser.add_argument("--user-id", type=int, help="owner of inserted analyses (required with --db)")
+    parser.add_argument("--no-media", action="store_true",
+                        help="with --db, store no media (no embedded data URL, no server path)")
+    parser.add_argument("--checkpoint", help="resume file (default: <output or db>.checkpoint)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--mode", choices=["full", "fast"], help="check evaluation mode (default: CHECK_EVAL_MODE)")
+    parser.add_argument("--batch-size", type=int, default=50, help="results per transaction / checkpoint write")
+    parser.add_argument("--errors", help="write failed files as JSON lines to this file")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.root):
+        parser.error(f"not a directory: {args.root}")
+    if args.db:
+        if args.user_id is None:
+            parser.error("--user-id is required with --db")
+        load_dotenv()
+        backend = (os.getenv("STORAGE_BACKEND") or "sqlite").lower()
+        if backend != "sqlite":
+            # Rows, analytics and indexes go in one local transaction; with another
+            # backend the analyses would land where the app never reads them
+            parser.error(f"--db writes the local SQLite schema, but STORAGE_BACKEND is {backend}; "
+                         "scan with --output instead")
+        conn = sqlite3.connect(args.db)
+        try:
+            has_schema = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'analysis_results'").fetchone()
+            has_user = has_schema and conn.execute('SELECT 1 FROM users WHERE id = ?', (args.user_id,)).fetchone()
+        finally:
+            conn.close()
+        if not has_schema:
+            parser.error(f"{args.db} has no analysis_results table; start the app once to create the schema")
+        if not has_user:
+            parser.error(f"no user with id {args.user_id}")
+        sink = SqliteSink(args.db, args.user_id, store_media=not args.no_media)
+    else:
+        sink = JsonlSink(args.output)
+
+    checkpoint = args.checkpoint or f"{args.output or args.db}.checkpoint"
+    errors = open(args.errors, "a", encoding="utf-8") if args.errors else None
+    try:
+        progress = scan(args.root, sink, checkpoint, max(1, args.workers), args.mode,
+                        max(1, args.batch_size), errors)
+    finally:
+        if errors:
+            errors.close()
+    return 1 if progress.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Serving-mode benchmark: runs the same mixed load (loadtest.py) against gunicorn sync
+workers, gunicorn threaded workers and the ASGI front (asgi.py under uvicorn), each
+started fresh in a temporary directory with identical settings, and compares
+latency on the light routes while uploads are being analyzed.
+
+Usage: python bench_serving.py [--workers N] [--users N] [--duration S] [--modes sync,gthread,asgi]
+"""
+import os
+import sys
+import time
+import signal
+import argparse
+import tempfile
+import subprocess
+import http.client
+
+import loadtest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODES = {
+    "sync": ["gunicorn", "-c", os.path.join(HERE, "gunicorn.conf.py"), "--pythonpath", HERE,
+             "-w", "{workers}", "-b", "127.0.0.1:{port}", "app:app"],
+    "gthread": ["gunicorn", "-c", os.path.join(HERE, "gunicorn.conf.py"), "--pythonpath", HERE,
+                "-w", "{workers}", "-b", "127.0.0.1:{port}", "app:app"],
+    "asgi": ["uvicorn", "--app-dir", HERE, "--workers", "{workers}", "--port", "{port}",
+             "--log-level", "warning", "asgi:application"],
+}
+MODE_ENV = {"sync": {"GUNICORN_THREADS": "1"}, "gthread": {"GUNICORN_THREADS": "4"}, "asgi": {}}
+MIX = "auth_user=50,list=10,analysis=10,upload_image=10,upload_audio=5,upload_text=5"
+LIGHT_ROUTES = ["auth_user", "list", "analysis"]
+
+
+def wait_ready(port, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", "/api/auth/user")
+            conn.getresponse().read()
+            conn.close()
+            return True
+        except OSError:
+            time.sleep(0.5)
+    return False
+
+
+def run_mode(mode, args, port, corpus):
+    """{route: [(latency_ms, status)]} from one fresh server, or None if it did not start."""
+    workdir = tempfile.mkdtemp(prefix=f"bench-{mode}-")
+    # Reuse off: corpus images repeat, and every upload should run the analyzers
+    env = dict(os.environ, ANALYSIS_WORKERS=str(args.analysis_workers), LOGIN_MAX_ATTEMPTS_PER_IP="1000000",
+               TRUSTED_PROXY_HOPS="1", NEAR_DUPLICATE_REUSE_DISTANCE="-1", **MODE_ENV[mode])
+    cmd = [part.format(workers=args.workers, port=port) for part in MODES[mode]]
+    log = open(os.path.join(workdir, "server.log"), "w")
+    server = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT,
+                              start_new_session=True)
+    try:
+        if not wait_ready(port):
+            print(f"{mode}: server did not start, see {log.name}")
+            return None
+        print(f"Running {mode}: {' '.join(cmd)}", file=sys.stderr)
+        samples = loadtest.run(lambda: loadtest.HttpClient(f"http://127.0.0.1:{port}"), corpus, args.mix,
+                               args.users, args.duration, args.warmup)
+        loadtest.print_report(loadtest.summarize(samples, args.duration), args.duration)
+        return samples
+    finally:
+        # The session holds the server and its analysis worker processes
+        os.killpg(server.pid, signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(server.pid, signal.SIGKILL)
+        log.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", default="sync,gthread,asgi", help="comma-separated subset of sync,gthread,asgi")
+    parser.add_argument("--workers", type=int, default=1, help="server worker processes (gunicorn default: 1)")
+    parser.add_argument("--analysis-workers", type=int, default=2, help="ANALYSIS_WORKERS for every mode")
+    parser.add_argument("--users", type=int, default=12)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=10)
+    parser.add_argument("--corpus-size", type=int, default=8)
+    parser.add_argument("--mix", type=loadtest.parse_mix, default=loadtest.parse_mix(MIX))
+    parser.add_argument("--port", type=int, default=8790)
+    args = parser.parse_args()
+    modes = [m.strip() for m in args.modes.split(",")]
+    for mode in modes:
+        if mode not in MODES:
+            parser.error(f"unknown mode {mode!r}")
+
+    corpus = loadtest.build_corpus(args.corpus_size)
+    results = {mode: run_mode(mode, args, args.port + i, corpus) for i, mode in enumerate(modes)}
+
+    print(f"\nLight routes ({', '.join(LIGHT_ROUTES)}) under uploads, {args.workers} worker(s), {args.users} users")
+    print(f"{'Mode':<9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'req/s':>8} {'uploads/s':>10} {'429s':>6}")
+    print("-" * 75)
+    for mode, samples in results.items():
+        if samples is None:
+            print(f"{mode:<9} {'unavailable':>9}")
+            continue
+        light = sorted(ms for route in LIGHT_ROUTES for ms, status in samples.get(route, []) if status != 429)
+        uploads = [status for route, rows in samples.items() if route.startswith("upload_") for _, status in rows]
+        served = sum(1 for status in uploads if status == 200)
+        q = lambda p: loadtest.percentile(light, p) or 0.0
+        print(f"{mode:<9} {q(50):>9.1f} {q(95):>9.1f} {q(99):>9.1f} {(light[-1] if light else 0):>9.1f} "
+              f"{len(light) / args.duration:>8.2f} {served / args.duration:>10.2f} {uploads.count(429):>6}")
+
+
+if __name__ == "__main__":
+    main()
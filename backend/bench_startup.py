@@ -0,0 +1,56 @@
+"""
+Startup-time benchmark: reports the import cost of each heavy dependency and of
+the backend modules themselves, each measured in a fresh interpreter.
+
+Usage: python bench_startup.py [--repeat N]
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+TARGETS = [
+    ("numpy", "import numpy"),
+    ("PIL", "import PIL.Image"),
+    ("scipy.stats", "import scipy.stats"),
+    ("librosa", "import librosa.core, librosa.feature, librosa.effects"),
+    ("cv2", "import cv2"),
+    ("textblob", "import textblob"),
+    ("reportlab", "import reportlab.pdfgen.canvas, reportlab.lib.pagesizes"),
+    ("flask", "import flask"),
+    ("analysis_logic (lazy)", "import analysis_logic"),
+    ("analysis_logic + preload()", "import analysis_logic; analysis_logic.preload()"),
+]
+
+SNIPPET = "import time; t = time.perf_counter(); {stmt}; print(time.perf_counter() - t)"
+
+
+def measure(stmt, repeat):
+    here = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", SNIPPET.format(stmt=stmt)],
+            cwd=here, capture_output=True, text=True
+        )
+        if out.returncode != 0:
+            return None
+        samples.append(float(out.stdout.strip().splitlines()[-1]) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per target (median reported)")
+    args = parser.parse_args()
+
+    print(f"{'Import':<30} {'median ms':>10}")
+    print("-" * 41)
+    for label, stmt in TARGETS:
+        ms = measure(stmt, args.repeat)
+        print(f"{label:<30} {'unavailable' if ms is None else f'{ms:10.1f}':>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,470 @@
+import os
+import csv
+import json
+import math
+import argparse
+from bisect import bisect_left
+from datetime import datetime
+from collections import Counter
+from itertools import chain
+
+import analysis_logic
+import check_registry
+import check_stats
+import reverdict
+
+# --- THRESHOLD CALIBRATION ---
+# Fits the registered check thresholds to labelled samples and writes them as a
+# versioned profile (vN.json) that the analyzers load at startup (THRESHOLD_PROFILE,
+# see check_registry.load_threshold_profile). Samples are stored check metrics:
+# the analytics tables (forensic_check_metrics) labelled by analysis id, and/or
+# batch_scan.py JSONL over a labelled corpus, labelled by the first directory of each
+# path (organic/..., synthetic/...) unless --labels maps the path. Samples are
+# streamed; per threshold only one quantile sketch per class is kept, so memory
+# depends on the metric range, not on the corpus size.
+#
+#   python calibration.py fit --scan corpus.jsonl --out-dir threshold_profiles [--max-fpr 0.05]
+#   python calibration.py fit --db database.db --labels labels.csv --out-dir threshold_profiles
+#   python calibration.py evaluate --scan corpus.jsonl --profile threshold_profiles/v1.json --profile v2.json
+#
+# fit builds the ROC curve of every calibratable threshold and picks the point with
+# the best Youden index (TPR - FPR), or the best TPR at FPR <= --max-fpr. evaluate
+# re-judges every sample under the registered thresholds and each profile in one
+# pass and compares verdicts and per-check hit rates.
+
+POSITIVE, NEGATIVE = "synthetic", "organic"
+LABEL_ALIASES = {
+    "synthetic": POSITIVE, "fake": POSITIVE, "ai": POSITIVE, "generated": POSITIVE,
+    "organic": NEGATIVE, "real": NEGATIVE, "authentic": NEGATIVE, "human": NEGATIVE,
+}
+
+# check id -> {threshold: (metric, side, applies)}. The check fails when the metric is
+# "below" / "above" the threshold; applies(metrics, thresholds), if given, limits the
+# curve to samples where the threshold actually decides (e.g. long enough audio).
+# Two-sided checks are fitted one side at a time.
+RULES = {
+    "image.ela": {"min_std": ("ela_std", "below", None)},
+    "image.sensor_noise": {"min_std": ("luminance_std", "below", None)},
+    "image.color_correlation": {
+        "max_correlation": ("avg_correlation", "above", None),
+        "min_correlation": ("avg_correlation", "below", None),
+    },
+    "image.spectral_peaks": {"max_prominence_db": ("peak_prominence_db", "above", lambda m, t: m.get("tile"))},
+    "audio.spectral_flatness": {"min_flatness": ("mean_flatness", "below", None)},
+    "audio.breath_gaps": {
+        "min_mean_gap": ("mean_gap", "below",
+                         lambda m, t: (m.get("duration") or 0) > t["min_duration"] and m.get("gap_count")),
+    },
+    "text.burstiness": {
+        "min_std": ("sentence_length_std", "below", lambda m, t: (m.get("sentence_count") or 0) > t["min_sentences"]),
+    },
+    "text.entropy": {
+        "min_entropy": ("entropy", "below", None),
+        "max_entropy": ("entropy", "above", None),
+    },
+    "text.punctuation": {
+        "min_ratio": ("punctuation_ratio", "below", lambda m, t: (m.get("length") or 0) > t["min_length"]),
+    },
+}
+
+
+def normalize_label(value):
+    return LABEL_ALIASES.get(str(value).strip().lower())
+
+
+# --- QUANTILE SKETCH ---
+
+class QuantileSketch:
+    """
+    Mergeable log-bucketed sketch (DDSketch): each value is counted in a bucket whose
+    representative is within `accuracy` relative error of it, so size grows with the
+    log of the value range instead of the number of values. When max_buckets is
+    exceeded the buckets nearest zero are collapsed (their values lose precision first).
+    """
+    MIN_VALUE = 1e-12  # Smaller magnitudes count as zero
+
+    def __init__(self, accuracy=0.01, max_buckets=2048):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.positive = Counter()  # bucket key -> count
+        self.negative = Counter()
+        self.zero = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _key(self, magnitude):
+        return math.ceil(math.log(magnitude) / self._log_gamma)
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value, count=1):
+        if value > self.MIN_VALUE:
+            self.positive[self._key(value)] += count
+        elif value < -self.MIN_VALUE:
+            self.negative[self._key(-value)] += count
+        else:
+            self.zero += count
+        self.count += count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self.positive) + len(self.negative) > self.max_buckets:
+            self._collapse()
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError("Sketches with different accuracy cannot be merged")
+        self.positive.update(other.positive)
+        self.negative.update(other.negative)
+        self.zero += other.zero
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        while len(self.positive) + len(self.negative) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self):
+        store = self.positive if len(self.positive) >= len(self.negative) else self.negative
+        lowest, second = sorted(store)[:2]
+        store[second] += store.pop(lowest)
+
+    def items(self):
+        """(representative value, count) pairs in ascending value order."""
+        items = [(-self._value(k), self.negative[k]) for k in sorted(self.negative, reverse=True)]
+        if self.zero:
+            items.append((0.0, self.zero))
+        items += [(self._value(k), self.positive[k]) for k in sorted(self.positive)]
+        return items
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for value, n in self.items():
+            seen += n
+            if seen > rank:
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def count_below(self, threshold):
+        """Number of values whose bucket lies below threshold."""
+        return sum(n for value, n in self.items() if value < threshold)
+
+
+# --- SAMPLES ---
+
+def read_labels(path):
+    """key,label rows (analysis id or corpus path); rows with unknown labels (e.g. a header) are skipped."""
+    labels = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) >= 2 and normalize_label(row[1]):
+                labels[row[0].strip()] = normalize_label(row[1])
+    return labels
+
+
+def db_samples(conn, labels, file_type=None):
+    """(file_type, label, [(name, status, metrics)]) for each labelled stored analysis."""
+    for analysis_id, row_type, stored in check_stats.iter_stored_checks(conn, file_type):
+        label = labels.get(str(analysis_id))
+        if label:
+            yield row_type, label, stored
+
+
+def scan_samples(path, labels=None, file_type=None):
+    """Same tuples from batch_scan.py JSONL; label from --labels or the path's first directory."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if file_type and row["fileType"] != file_type:
+                continue
+            rel_path = row["path"].replace("\\", "/")
+            label = (labels or {}).get(rel_path) or normalize_label(rel_path.split("/", 1)[0])
+            if label:
+                checks = row.get("details", {}).get("checks", [])
+                yield row["fileType"], label, [(c["name"], c["status"], c.get("metrics") or {}) for c in checks]
+
+
+# --- ROC FITTING ---
+
+class Calibrator:
+    """Streams samples into one sketch per (check id, threshold, label)."""
+
+    def __init__(self, accuracy=0.01):
+        self.accuracy = accuracy
+        self.sketches = {}  # (check_id, threshold) -> {label: QuantileSketch}
+        self.samples = Counter()  # (file_type, label) -> count
+
+    def add(self, file_type, label, stored):
+        self.samples[(file_type, label)] += 1
+        for name, _, metrics in stored:
+            spec = check_registry.find_check(file_type, name)
+            if spec is None or spec.id not in RULES:
+                continue
+            registered = check_registry.thresholds_for(spec)
+            for threshold, (metric, _, applies) in RULES[spec.id].items():
+                value = metrics.get(metric)
+                if value is None or value != value or (applies and not applies(metrics, registered)):
+                    continue
+                sketches = self.sketches.setdefault((spec.id, threshold), {
+                    POSITIVE: QuantileSketch(self.accuracy), NEGATIVE: QuantileSketch(self.accuracy)})
+                sketches[label].add(value)
+
+
+def _fail_rate(sketch, threshold, side):
+    below = sketch.count_below(threshold) / sketch.count
+    return below if side == "below" else 1 - below
+
+
+def roc_curve(positive, negative, side):
+    """
+    [(threshold, tpr, fpr)] for "fail when the metric is below/above threshold", with
+    one candidate threshold between each pair of neighbouring bucket values.
+    """
+    values = sorted({v for v, _ in positive.items()} | {v for v, _ in negative.items()})
+    cuts = [(a + b) / 2 for a, b in zip(values, values[1:])]
+
+    def below_counts(sketch):
+        items = sketch.items()
+        bounds = [v for v, _ in items]
+        cumulative = list(chain([0], _accumulate(n for _, n in items)))
+        return [cumulative[bisect_left(bounds, cut)] for cut in cuts]
+
+    pos_below, neg_below = below_counts(positive), below_counts(negative)
+    points = []
+    for cut, p, n in zip(cuts, pos_below, neg_below):
+        tpr, fpr = p / positive.count, n / negative.count
+        points.append((cut, tpr, fpr) if side == "below" else (cut, 1 - tpr, 1 - fpr))
+    return points
+
+
+def _accumulate(counts):
+    total = 0
+    for n in counts:
+        total += n
+        yield total
+
+
+def auc(points):
+    """Area under the ROC curve through points plus its (0,0) and (1,1) ends."""
+    curve = sorted([(0.0, 0.0), (1.0, 1.0)] + [(fpr, tpr) for _, tpr, fpr in points])
+    return sum((x1 - x0) * (y0 + y1) / 2 for (x0, y0), (x1, y1) in zip(curve, curve[1:]))
+
+
+def score(tpr, fpr, max_fpr=None):
+    """Objective for one ROC point: Youden index, or (TPR, -FPR) within the FPR limit (None outside it)."""
+    if max_fpr is None:
+        return tpr - fpr
+    return (tpr, -fpr) if fpr <= max_fpr else None
+
+
+def choose(points, max_fpr=None):
+    """Best-scoring (threshold, tpr, fpr) point; None if no point qualifies."""
+    scored = [(score(tpr, fpr, max_fpr), (t, tpr, fpr)) for t, tpr, fpr in points]
+    scored = [item for item in scored if item[0] is not None]
+    return max(scored, key=lambda item: item[0])[1] if scored else None
+
+
+def fit(calibrator, max_fpr=None, min_samples=20):
+    """Returns (thresholds, report): fitted {check_id: {threshold: value}} and per-threshold ROC details."""
+    thresholds, report = {}, {}
+    for (check_id, threshold), sketches in sorted(calibrator.sketches.items()):
+        metric, side, _ = RULES[check_id][threshold]
+        media_type, key = check_id.split(".", 1)
+        previous = check_registry.get_check(media_type, key).thresholds[threshold]
+        pos, neg = sketches[POSITIVE], sketches[NEGATIVE]
+        entry = report[f"{check_id}.{threshold}"] = {
+            "metric": metric, "side": side, "synthetic": pos.count, "organic": neg.count, "previous": previous,
+            "syntheticMedian": pos.quantile(0.5), "organicMedian": neg.quantile(0.5),
+        }
+        if pos.count < min_samples or neg.count < min_samples:
+            entry["skipped"] = f"fewer than {min_samples} samples in a class"
+            continue
+        previous_tpr, previous_fpr = _fail_rate(pos, previous, side), _fail_rate(neg, previous, side)
+        entry.update(previousTpr=round(previous_tpr, 4), previousFpr=round(previous_fpr, 4))
+        points = roc_curve(pos, neg, side)
+        best = choose(points, max_fpr)
+        entry["auc"] = round(auc(points), 4)
+        if best is None:
+            entry["skipped"] = "no threshold meets the FPR limit"
+            continue
+        current = score(previous_tpr, previous_fpr, max_fpr)
+        if current is not None and score(best[1], best[2], max_fpr) <= current:
+            entry["skipped"] = "registered threshold is as good"
+            continue
+        value = float(f"{best[0]:.6g}")
+        entry.update(threshold=value, tpr=round(best[1], 4), fpr=round(best[2], 4))
+        thresholds.setdefault(check_id, {})[threshold] = value
+
+    # Two-sided checks: an inverted band would fail everything
+    for check_id, values in thresholds.items():
+        for name in [n for n in values if n.startswith("min_")]:
+            upper = "max_" + name[4:]
+            if upper in values and values[name] >= values[upper]:
+                for n in (name, upper):
+                    report[f"{check_id}.{n}"]["skipped"] = "fitted band is empty"
+                    del values[n]
+    return {k: v for k, v in thresholds.items() if v}, report
+
+
+def next_version(out_dir):
+    versions = [check_registry._profile_version(n) for n in os.listdir(out_dir)] if os.path.isdir(out_dir) else []
+    return max([v for v in versions if v is not None], default=0) + 1
+
+
+def write_profile(out_dir, thresholds, report, samples, objective):
+    os.makedirs(out_dir, exist_ok=True)
+    version = next_version(out_dir)
+    path = os.path.join(out_dir, f"v{version}.json")
+    profile = {
+        "version": version,
+        "createdAt": datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+        "objective": objective,
+        "samples": {f"{file_type}:{label}": n for (file_type, label), n in sorted(samples.items())},
+        "thresholds": thresholds,
+        "roc": report,
+    }
+    with open(path, "x", encoding="utf-8") as f:  # Never overwrite a released version
+        json.dump(profile, f, indent=2)
+    return path
+
+
+# --- PROFILE EVALUATION ---
+
+def evaluate(samples, profiles):
+    """
+    Re-judges each sample under every profile ({name: overrides}) in one pass.
+    Returns {name: {"verdicts": Counter((label, verdict)), "checks": Counter((file_type, check, label, failed))}}.
+    """
+    results = {name: {"verdicts": Counter(), "checks": Counter()} for name in profiles}
+    for file_type, label, stored in samples:
+        for name, overrides in profiles.items():
+            _, checks = reverdict.rejudge(file_type, stored, overrides)
+            results[name]["verdicts"][(label, analysis_logic.calculate_verdict(checks)[0])] += 1
+            for check in checks:
+                results[name]["checks"][(file_type, check.name, label, check.status == "FAIL")] += 1
+    return results
+
+
+def summarize(result):
+    verdicts, checks = result["verdicts"], result["checks"]
+    totals = Counter()
+    for (label, _), n in verdicts.items():
+        totals[label] += n
+
+    def rate(label, verdict):
+        return round(verdicts[(label, verdict)] / totals[label], 4) if totals[label] else None
+
+    per_check = {}
+    for (file_type, name, label, failed), n in checks.items():
+        entry = per_check.setdefault((file_type, name), Counter())
+        entry[label] += n
+        entry[label + "_failed"] += n if failed else 0
+    return {
+        "synthetic": totals[POSITIVE], "organic": totals[NEGATIVE],
+        "detectionRate": rate(POSITIVE, "Likely Synthetic"),
+        "falseAlarmRate": rate(NEGATIVE, "Likely Synthetic"),
+        "syntheticInconclusive": rate(POSITIVE, "Inconclusive"),
+        "organicInconclusive": rate(NEGATIVE, "Inconclusive"),
+        "checks": [
+            {
+                "fileType": file_type, "name": name,
+                "tpr": round(c[POSITIVE + "_failed"] / c[POSITIVE], 4) if c[POSITIVE] else None,
+                "fpr": round(c[NEGATIVE + "_failed"] / c[NEGATIVE], 4) if c[NEGATIVE] else None,
+            }
+            for (file_type, name), c in sorted(per_check.items())
+        ],
+    }
+
+
+# --- CLI ---
+
+def _samples(args, parser):
+    labels = read_labels(args.labels) if args.labels else {}
+    sources = [scan_samples(path, labels, args.file_type) for path in args.scan]
+    if args.db:
+        if not labels:
+            parser.error("--db needs --labels (analysis id,label)")
+        try:
+            conn = check_stats.open_analytics(args.db)
+        except ValueError as e:
+            parser.error(str(e))
+        sources.append(db_samples(conn, labels, args.file_type))
+    if not sources:
+        parser.error("give --scan and/or --db")
+    return chain(*sources)
+
+
+def _fmt(value, digits=4):
+    return "-" if value is None else f"{value:.{digits}g}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit and compare check threshold profiles on labelled samples.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    fit_cmd = commands.add_parser("fit", help="fit thresholds and write the next profile version")
+    eval_cmd = commands.add_parser("evaluate", help="compare profiles against the registered thresholds")
+    for cmd in (fit_cmd, eval_cmd):
+        cmd.add_argument("--scan", action="append", default=[], help="batch_scan.py JSONL of a labelled corpus")
+        cmd.add_argument("--db", help="local analytics database (SQLite) with stored check metrics")
+        cmd.add_argument("--labels", help="CSV of analysis id (or corpus path),label")
+        cmd.add_argument("--file-type")
+        cmd.add_argument("--json", help="also write the report to this file")
+    fit_cmd.add_argument("--out-dir", default="threshold_profiles")
+    fit_cmd.add_argument("--max-fpr", type=float, help="best TPR with at most this FPR (default: best Youden index)")
+    fit_cmd.add_argument("--min-samples", type=int, default=20, help="per class, below which a threshold is kept")
+    fit_cmd.add_argument("--accuracy", type=float, default=0.01, help="relative accuracy of the quantile sketches")
+    eval_cmd.add_argument("--profile", action="append", default=[], help="profile file (repeatable)")
+    args = parser.parse_args(argv)
+
+    if args.command == "fit":
+        calibrator = Calibrator(args.accuracy)
+        for file_type, label, stored in _samples(args, fit_cmd):
+            calibrator.add(file_type, label, stored)
+        thresholds, report = fit(calibrator, args.max_fpr, args.min_samples)
+        objective = f"max_fpr={args.max_fpr}" if args.max_fpr is not None else "youden"
+        print(f"{'Threshold':<38} {'side':<6} {'syn':>6} {'org':>6} {'AUC':>6} "
+              f"{'old':>9} {'TPR':>6} {'FPR':>6} {'new':>9} {'TPR':>6} {'FPR':>6}")
+        print("-" * 110)
+        for name, r in report.items():
+            print(f"{name:<38} {r['side']:<6} {r['synthetic']:>6} {r['organic']:>6} {_fmt(r.get('auc'), 3):>6} "
+                  f"{_fmt(r['previous']):>9} {_fmt(r.get('previousTpr'), 3):>6} {_fmt(r.get('previousFpr'), 3):>6} "
+                  f"{_fmt(r.get('threshold')):>9} {_fmt(r.get('tpr'), 3):>6} {_fmt(r.get('fpr'), 3):>6}"
+                  + (f"  ({r['skipped']})" if "skipped" in r else ""))
+        if not thresholds:
+            print("\nNothing fitted; no profile written.")
+            return
+        path = write_profile(args.out_dir, thresholds, report, calibrator.samples, objective)
+        print(f"\nWrote {path}")
+        output = report
+    else:
+        profiles = {"registered": {}}
+        for path in args.profile:
+            with open(check_registry.resolve_profile_path(path), encoding="utf-8") as f:
+                profile = json.load(f)
+            profiles[f"v{profile.get('version')} ({os.path.basename(path)})"] = profile.get("thresholds", {})
+        output = {name: summarize(result) for name, result in evaluate(_samples(args, eval_cmd), profiles).items()}
+        print(f"{'Profile':<28} {'syn':>6} {'org':>6} {'detect':>7} {'false+':>7} {'syn inc':>8} {'org inc':>8}")
+        print("-" * 76)
+        for name, s in output.items():
+            print(f"{name:<28} {s['synthetic']:>6} {s['organic']:>6} {_fmt(s['detectionRate'], 3):>7} "
+                  f"{_fmt(s['falseAlarmRate'], 3):>7} {_fmt(s['syntheticInconclusive'], 3):>8} "
+                  f"{_fmt(s['organicInconclusive'], 3):>8}")
+        for name, s in output.items():
+            print(f"\n{name}: per-check fail rate on synthetic (TPR) / organic (FPR)")
+            for c in s["checks"]:
+                print(f"  {c['fileType'] + ': ' + c['name']:<40} {_fmt(c['tpr'], 3):>6} {_fmt(c['fpr'], 3):>6}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import os
+import re
+import json
+import math
+import time
+import threading
+
+# --- CHAT KNOWLEDGE BASE ---
+# Entries (knowledge_base.json, or CHAT_KB_PATH) list keyword phrases and a reply.
+# Phrases are indexed once into an inverted index of unigrams and bigrams weighted
+# by IDF, so ranking a message is a few dict lookups rather than substring scans.
+
+KB_PATH = os.getenv("CHAT_KB_PATH", os.path.join(os.path.dirname(__file__), "knowledge_base.json"))
+BIGRAM_WEIGHT = 2.0
+MIN_SCORE = 0.5
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# Too common to count alone; still part of bigrams ("the verdict")
+_STOPWORDS = {"a", "an", "the", "is", "are", "was", "of", "to", "in", "on", "for", "and", "or",
+              "it", "this", "that", "what", "does", "do", "i", "me", "can", "you", "be"}
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def terms(tokens):
+    """Unigrams (minus stopwords) plus bigrams ("error level")."""
+    return [t for t in tokens if t not in _STOPWORDS] + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class KnowledgeBase:
+    def __init__(self, entries, fallback):
+        self.entries = entries
+        self.fallback = fallback
+        self._index = {}  # term -> {entry_idx: weight}
+        postings = {}
+        for i, entry in enumerate(entries):
+            for phrase in entry.get("keywords", []):
+                for term in terms(tokenize(phrase)):
+                    postings.setdefault(term, set()).add(i)
+        n = len(entries)
+        for term, docs in postings.items():
+            idf = math.log(1 + n / len(docs))
+            weight = idf * (BIGRAM_WEIGHT if " " in term else 1.0)
+            self._index[term] = {i: weight * entries[i].get("boost", 1.0) for i in docs}
+
+    @classmethod
+    def load(cls, path=KB_PATH):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["entries"], data.get("fallback", ""))
+
+    def rank(self, message, limit=3):
+        """Returns [(score, entry)] best first; each query term counts once."""
+        scores = {}
+        for term in set(terms(tokenize(message))):
+            for i, weight in self._index.get(term, {}).items():
+                scores[i] = scores.get(i, 0.0) + weight
+        best = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]
+        return [(score, self.entries[i]) for i, score in best if score >= MIN_SCORE]
+
+    def match(self, message):
+        ranked = self.rank(message, limit=1)
+        return ranked[0][1] if ranked else None
+
+
+# --- LAST-ANALYSIS CACHE ---
+
+class LastAnalysisCache:
+    """
+    Most recent analysis summary per user, kept in process memory. Uploads and
+    deletes in this process update it directly; entries expire after ttl so
+    changes made through other workers are picked up.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, loader, ttl=300, max_users=10000):
+        self._loader = loader  # user_id -> summary dict or None
+        self.ttl = ttl
+        self.max_users = max_users
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        summary = self._loader(user_id)
+        self.put(user_id, summary)
+        return summary
+
+    def put(self, user_id, summary):
+        with self._lock:
+            if len(self._entries) >= self.max_users and user_id not in self._entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[user_id] = (time.monotonic() + self.ttl, summary)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
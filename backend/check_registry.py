@@ -0,0 +1,272 @@
+import os
+import json
+
+# --- CHECK REGISTRY ---
+# Forensic checks register themselves per media type together with a relative
+# cost estimate and the named inputs they consume. Inputs (decoded pixels,
+# STFT, TextBlob, ...) are produced lazily by registered providers, so a check
+# that is never reached never pays for its inputs.
+#
+# A check is split in two: the measure step computes numeric metrics from its
+# inputs, and the judge step turns metrics + thresholds into (failed, message).
+# Keeping them apart lets stored metrics be re-judged under new thresholds
+# without decoding any media (see reverdict.py).
+
+EVAL_MODES = ("full", "fast")
+
+
+class EvaluationCancelled(Exception):
+    """Raised between checks/stages once the caller's cancel flag is set."""
+
+
+def raise_if_cancelled(cancel):
+    """cancel is anything with is_set() (threading.Event, worker flag) or None."""
+    if cancel is not None and cancel.is_set():
+        raise EvaluationCancelled()
+
+_CHECKS = {}  # media_type -> list of CheckSpec (registration order)
+_INPUTS = {}  # media_type -> {name: InputSpec}
+
+
+class CheckSpec:
+    def __init__(self, media_type, key, name, description, cost, inputs, func,
+                 thresholds=None, metric=None):
+        self.media_type = media_type
+        self.key = key
+        self.name = name
+        self.description = description
+        self.cost = cost
+        self.inputs = tuple(inputs)
+        self.func = func  # measure: ctx -> {metric: value}
+        self.judge = None  # (metrics, thresholds) -> (failed, message)
+        self.thresholds = dict(thresholds or {})
+        self.metric = metric  # primary metric reported in analytics
+
+    @property
+    def id(self):
+        return f"{self.media_type}.{self.key}"
+
+
+class InputSpec:
+    def __init__(self, name, cost, requires, func):
+        self.name = name
+        self.cost = cost
+        self.requires = tuple(requires)
+        self.func = func
+
+
+def register_input(media_type, name, cost=0, requires=()):
+    """Registers a lazily computed input provider: func(ctx) -> value."""
+    def decorator(func):
+        _INPUTS.setdefault(media_type, {})[name] = InputSpec(name, cost, requires, func)
+        return func
+    return decorator
+
+
+def register_check(media_type, key, name, description, cost, inputs=(), thresholds=None, metric=None):
+    """Registers a check's measure step: func(ctx) -> {metric_name: value}."""
+    def decorator(func):
+        checks = _CHECKS.setdefault(media_type, [])
+        checks[:] = [c for c in checks if c.key != key]
+        checks.append(CheckSpec(media_type, key, name, description, cost, inputs, func, thresholds, metric))
+        return func
+    return decorator
+
+
+def register_judge(media_type, key):
+    """Registers a check's judge step: func(metrics, thresholds) -> (failed, message)."""
+    def decorator(func):
+        get_check(media_type, key).judge = func
+        return func
+    return decorator
+
+
+def get_check(media_type, key):
+    return next(spec for spec in _CHECKS.get(media_type, []) if spec.key == key)
+
+
+def find_check(media_type, name):
+    """Looks a check up by its display name (as stored with results); None if unknown."""
+    return next((spec for spec in _CHECKS.get(media_type, []) if spec.name == name), None)
+
+
+def thresholds_for(spec, overrides=None):
+    """Registered thresholds for spec, updated with overrides[spec.id] if given."""
+    thresholds = dict(spec.thresholds)
+    if overrides and spec.id in overrides:
+        thresholds.update(overrides[spec.id])
+    return thresholds
+
+
+def judge_check(spec, metrics, overrides=None):
+    return spec.judge(metrics, thresholds_for(spec, overrides))
+
+
+class CheckContext:
+    """Per-media bag of inputs. Values are computed on first access and memoized."""
+
+    def __init__(self, media_type, **seed):
+        self.media_type = media_type
+        self._values = dict(seed)
+
+    def has(self, name):
+        return name in self._values
+
+    def __getitem__(self, name):
+        if name not in self._values:
+            spec = _INPUTS[self.media_type][name]
+            self._values[name] = spec.func(self)
+        return self._values[name]
+
+
+# --- OPERATOR CONFIGURATION ---
+
+def _env_set(name):
+    raw = os.getenv(name, "")
+    return {item.strip() for item in raw.split(",") if item.strip()}
+
+
+def load_config():
+    """
+    Reads per-deployment check selection from the environment:
+    DISABLED_CHECKS / ENABLED_CHECKS take comma-separated check ids
+    (e.g. "image.ela,audio.breath_gaps"); CHECK_EVAL_MODE is "full" or "fast".
+    """
+    mode = os.getenv("CHECK_EVAL_MODE", "full").strip().lower()
+    return {
+        "disabled": _env_set("DISABLED_CHECKS"),
+        "enabled": _env_set("ENABLED_CHECKS"),
+        "mode": mode if mode in EVAL_MODES else "full",
+    }
+
+
+CONFIG = load_config()
+
+
+def _profile_version(name):
+    """Version number of a profile file name like "v12.json", or None."""
+    stem, ext = os.path.splitext(name)
+    return int(stem[1:]) if ext == ".json" and stem[:1] == "v" and stem[1:].isdigit() else None
+
+
+def resolve_profile_path(path):
+    """A profile file as given, or the highest vN.json when path is a directory."""
+    if not os.path.isdir(path):
+        return path
+    versions = [(v, name) for name in os.listdir(path) for v in [_profile_version(name)] if v is not None]
+    return os.path.join(path, max(versions)[1]) if versions else None
+
+
+def load_threshold_profile(path=None):
+    """
+    Reads the calibrated threshold profile named by THRESHOLD_PROFILE (a vN.json file
+    written by calibration.py, or a directory of them: the newest is used).
+    Returns {"version", "path", "thresholds": {check_id: {threshold: value}}} or None
+    for the registered defaults. Unknown checks and thresholds are dropped with a
+    warning, so a profile from another build never breaks startup.
+    Call after the checks are registered.
+    """
+    path = path if path is not None else os.getenv("THRESHOLD_PROFILE", "").strip()
+    if not path:
+        return None
+    try:
+        resolved = resolve_profile_path(path)
+        if resolved is None:
+            print(f"No threshold profiles in {path}; using registered thresholds.")
+            return None
+        with open(resolved, encoding="utf-8") as f:
+            profile = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Threshold profile {path} not loaded ({e}); using registered thresholds.")
+        return None
+
+    specs = {spec.id: spec for spec in all_checks()}
+    thresholds = {}
+    for check_id, values in (profile.get("thresholds") or {}).items():
+        spec = specs.get(check_id)
+        known = {k: v for k, v in values.items() if spec is not None and k in spec.thresholds}
+        if len(known) != len(values):
+            print(f"Threshold profile: ignoring unknown thresholds for {check_id}: "
+                  f"{', '.join(sorted(set(values) - set(known)))}")
+        if known:
+            thresholds[check_id] = known
+    print(f"Threshold profile v{profile.get('version')} loaded from {resolved}.")
+    return {"version": profile.get("version"), "path": resolved, "thresholds": thresholds}
+
+
+def is_enabled(spec, config=None):
+    config = config or CONFIG
+    if spec.id in config["disabled"]:
+        return False
+    if config["enabled"] and spec.id not in config["enabled"]:
+        return False
+    return True
+
+
+def enabled_checks(media_type, config=None):
+    return [spec for spec in _CHECKS.get(media_type, []) if is_enabled(spec, config)]
+
+
+def all_checks(media_type=None):
+    if media_type is not None:
+        return list(_CHECKS.get(media_type, []))
+    return [spec for specs in _CHECKS.values() for spec in specs]
+
+
+# --- EVALUATION ENGINE ---
+
+def _input_cost(ctx, name, seen):
+    if name in seen or ctx.has(name):
+        return 0
+    seen.add(name)
+    spec = _INPUTS.get(ctx.media_type, {}).get(name)
+    if spec is None:
+        return 0
+    return spec.cost + sum(_input_cost(ctx, dep, seen) for dep in spec.requires)
+
+
+def pending_cost(spec, ctx):
+    """Check cost plus the cost of any inputs that have not been computed yet."""
+    seen = set()
+    return spec.cost + sum(_input_cost(ctx, name, seen) for name in spec.inputs)
+
+
+def run_checks(ctx, mode=None, is_decided=None, config=None, thresholds=None,
+               on_result=None, cancel=None):
+    """
+    Runs the enabled checks for ctx.media_type, cheapest (remaining) cost first.
+
+    In "fast" mode evaluation stops as soon as is_decided(failed_count, remaining, decisive)
+    returns True, where decisive is set once a failed check reported a truthy
+    metrics["decisive"]; "full" mode always runs everything (use it for certificates).
+    thresholds optionally overrides registered thresholds per check id.
+    on_result(spec, failed, details, metrics) is called as each check completes,
+    and EvaluationCancelled is raised before the next check once cancel is set.
+    Returns (outcomes, skipped) where outcomes is a list of (spec, failed, details, metrics)
+    in registration order and skipped lists the specs that were never run.
+    """
+    config = config or CONFIG
+    mode = mode if mode in EVAL_MODES else config["mode"]
+    pending = enabled_checks(ctx.media_type, config)
+    order = {spec.key: i for i, spec in enumerate(pending)}
+    outcomes = []
+    failed_count = 0
+    decisive = False
+
+    while pending:
+        raise_if_cancelled(cancel)
+        spec = min(pending, key=lambda s: pending_cost(s, ctx))
+        pending.remove(spec)
+        metrics = spec.func(ctx)
+        failed, details = judge_check(spec, metrics, thresholds)
+        outcomes.append((spec, failed, details, metrics))
+        if on_result is not None:
+            on_result(spec, failed, details, metrics)
+        if failed:
+            failed_count += 1
+            decisive = decisive or bool(metrics.get("decisive"))
+        if mode == "fast" and is_decided and pending and is_decided(failed_count, len(pending), decisive):
+            break
+
+    outcomes.sort(key=lambda o: order[o[0].key])
+    return outcomes, pending
@@ -0,0 +1,264 @@
+import os
+import re
+import json
+import sqlite3
+
+# --- FORENSIC CHECK ANALYTICS ---
+# One row per check outcome, written to the local SQLite file right after the
+# analysis_results row is stored, so questions like "which audio check failed most
+# this week" are an indexed GROUP BY instead of decoding every stored result in
+# Python. The two writes are separate transactions (the analyses may live on MySQL);
+# backfill() fills in rows missing after a crash between them. Every numeric
+# measurement a check made is kept in forensic_check_metrics so thresholds can be
+# re-applied offline (reverdict.py).
+
+# Primary measurements embedded in legacy check messages (backfill only)
+_LEGACY_METRIC_PATTERNS = [
+    re.compile(r"Calculated: (-?[\d.]+)"),
+    re.compile(r"Avg Correlation: (-?[\d.]+|nan)"),
+    re.compile(r"Entropy: (-?[\d.]+)"),
+    re.compile(r"Spectral flatness near zero \((-?[\d.]+)\)"),
+    re.compile(r"Cutoff ~(\d+)Hz"),
+    re.compile(r"cutoff detected at (\d+)Hz"),
+]
+
+
+def init_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS forensic_checks (
+            analysis_id INTEGER,
+            file_type TEXT,
+            name TEXT,
+            status TEXT,
+            metric REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (analysis_id, name)
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_forensic_checks_type_time ON forensic_checks (file_type, created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_forensic_checks_name_status ON forensic_checks (name, status, created_at)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS forensic_check_metrics (
+            analysis_id INTEGER,
+            name TEXT,
+            metric_key TEXT,
+            value REAL,
+            PRIMARY KEY (analysis_id, name, metric_key)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _metric(value):
+    if value is None:
+        return None
+    value = float(value)
+    return value if value == value else None  # NaN -> NULL
+
+
+def record(conn, analysis_id, file_type, checks, created_at=None):
+    """Inserts one row per ForensicCheck (plus its metrics); the caller commits."""
+    conn.executemany(
+        'INSERT OR REPLACE INTO forensic_checks (analysis_id, file_type, name, status, metric, created_at) '
+        'VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))',
+        [(analysis_id, file_type, c.name, c.status, _metric(c.metric), created_at) for c in checks]
+    )
+    conn.executemany(
+        'INSERT OR REPLACE INTO forensic_check_metrics (analysis_id, name, metric_key, value) VALUES (?, ?, ?, ?)',
+        [(analysis_id, c.name, key, _metric(value)) for c in checks for key, value in c.metrics.items()]
+    )
+
+
+def remove(conn, analysis_id):
+    conn.execute('DELETE FROM forensic_checks WHERE analysis_id = ?', (analysis_id,))
+    conn.execute('DELETE FROM forensic_check_metrics WHERE analysis_id = ?', (analysis_id,))
+
+
+def iter_stored_checks(conn, file_type=None, since=None, until=None):
+    """
+    Yields (analysis_id, file_type, [(name, status, {metric_key: value})]) per stored
+    analysis, in id order, straight from the analytics tables.
+    """
+    where, params = _filters(file_type, None, since, until)
+    rows = conn.execute(f'''
+        SELECT f.analysis_id, f.file_type, f.name, f.status, m.metric_key, m.value
+        FROM (SELECT * FROM forensic_checks{where}) f
+        LEFT JOIN forensic_check_metrics m ON m.analysis_id = f.analysis_id AND m.name = f.name
+        ORDER BY f.analysis_id, f.name
+    ''', params)
+    current, current_type, checks = None, None, {}
+    for analysis_id, row_type, name, status, key, value in rows:
+        if analysis_id != current:
+            if current is not None:
+                yield current, current_type, [(n, s, m) for n, (s, m) in checks.items()]
+            current, current_type, checks = analysis_id, row_type, {}
+        status_metrics = checks.setdefault(name, (status, {}))
+        if key is not None:
+            status_metrics[1][key] = value
+    if current is not None:
+        yield current, current_type, [(n, s, m) for n, (s, m) in checks.items()]
+
+
+def metric_from_message(message):
+    if not isinstance(message, str):
+        return None
+    for pattern in _LEGACY_METRIC_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return _metric(match.group(1))
+    return None
+
+
+def backfill(conn, store, batch_size=500):
+    """
+    Writes forensic_checks rows for analyses in store (storage.Storage, either
+    backend) that have none yet in the local analytics database conn. Rows saved
+    before metrics were captured get the primary metric parsed from the check
+    message where one was printed. Returns the number of analyses processed.
+    """
+    import analysis_logic
+    import check_registry
+
+    processed = 0
+    last_id = 0
+    while True:
+        rows = store.analyses_after(last_id, batch_size)
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        ids = [row['id'] for row in rows]
+        recorded = {analysis_id for analysis_id, in conn.execute(
+            f"SELECT DISTINCT analysis_id FROM forensic_checks WHERE analysis_id IN ({','.join('?' * len(ids))})",
+            ids
+        )}
+        for row in rows:
+            analysis_id, file_type = row['id'], row['file_type']
+            if analysis_id in recorded:
+                continue
+            try:
+                if row['schema_version']:
+                    checks = analysis_logic.unpack_checks(row['checks'])
+                else:
+                    checks = [analysis_logic.ForensicCheck.from_dict(c)
+                              for c in json.loads(row['details'] or '{}').get('checks', [])]
+            except (ValueError, TypeError) as e:
+                print(f"Backfill skipped analysis {analysis_id}: {e}")
+                continue
+            for c in checks:
+                spec = check_registry.find_check(file_type, c.name)
+                key = spec.metric if spec else None
+                if key and key not in c.metrics:
+                    value = metric_from_message(c.details)
+                    if value is not None:
+                        c.metrics[key] = value
+                c.metric = c.metrics.get(key) if key else None
+            record(conn, analysis_id, file_type, checks, row['created_at'])
+            processed += 1
+        conn.commit()
+    return processed
+
+
+# --- AGGREGATES ---
+
+def _filters(file_type=None, name=None, since=None, until=None):
+    clauses, params = [], []
+    if file_type:
+        clauses.append('file_type = ?')
+        params.append(file_type)
+    if name:
+        clauses.append('name = ?')
+        params.append(name)
+    if since:
+        clauses.append('created_at >= ?')
+        params.append(since)
+    if until:
+        clauses.append('created_at < ?')
+        params.append(until)
+    return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+
+def failure_rates(conn, file_type=None, since=None, until=None):
+    """Per (file_type, check): totals, failure rate and metric summary, most failing first."""
+    where, params = _filters(file_type, None, since, until)
+    rows = conn.execute(f'''
+        SELECT file_type, name,
+               COUNT(*) AS total,
+               SUM(status = 'FAIL') AS failed,
+               AVG(metric) AS avg_metric, MIN(metric) AS min_metric, MAX(metric) AS max_metric
+        FROM forensic_checks{where}
+        GROUP BY file_type, name
+        ORDER BY CAST(SUM(status = 'FAIL') AS REAL) / COUNT(*) DESC, total DESC
+    ''', params).fetchall()
+    return [
+        {
+            "fileType": r[0],
+            "name": r[1],
+            "total": r[2],
+            "failed": r[3],
+            "failureRate": round(r[3] / r[2], 4) if r[2] else 0,
+            "avgMetric": r[4],
+            "minMetric": r[5],
+            "maxMetric": r[6],
+        }
+        for r in rows
+    ]
+
+
+def metric_distribution(conn, name, file_type=None, since=None, until=None, buckets=10):
+    """Equal-width histogram (split by status) and quartiles of one check's metric."""
+    where, params = _filters(file_type, name, since, until)
+    where += (' AND ' if where else ' WHERE ') + 'metric IS NOT NULL'
+    count, low, high = conn.execute(
+        f'SELECT COUNT(*), MIN(metric), MAX(metric) FROM forensic_checks{where}', params
+    ).fetchone()
+    if not count:
+        return {"name": name, "count": 0, "histogram": [], "quantiles": {}}
+
+    buckets = max(1, min(int(buckets), 100))
+    width = (high - low) / buckets or 1.0
+    rows = conn.execute(f'''
+        SELECT MIN(CAST((metric - ?) / ? AS INTEGER), ?) AS bucket,
+               COUNT(*), SUM(status = 'FAIL')
+        FROM forensic_checks{where}
+        GROUP BY bucket ORDER BY bucket
+    ''', [low, width, buckets - 1] + params).fetchall()
+    histogram = [
+        {"from": low + b * width, "to": low + (b + 1) * width, "count": n, "failed": failed}
+        for b, n, failed in rows
+    ]
+
+    quantiles = {}
+    for label, q in (("p25", 0.25), ("p50", 0.5), ("p75", 0.75)):
+        quantiles[label] = conn.execute(
+            f'SELECT metric FROM forensic_checks{where} ORDER BY metric LIMIT 1 OFFSET ?',
+            params + [int(q * (count - 1))]
+        ).fetchone()[0]
+    return {"name": name, "count": count, "min": low, "max": high, "histogram": histogram, "quantiles": quantiles}
+
+
+def open_analytics(db_path):
+    """
+    Connection to the local analytics database. These tables live in the SQLite file
+    whichever STORAGE_BACKEND holds the analyses; a path without them is refused
+    instead of silently creating an empty database.
+    """
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'forensic_checks'").fetchone():
+            return conn
+        conn.close()
+    raise ValueError(f"{db_path} has no forensic_checks table; start the app once to create it")
+
+
+if __name__ == '__main__':
+    import sys
+    from dotenv import load_dotenv
+    import storage
+
+    load_dotenv()
+    db_path = sys.argv[1] if len(sys.argv) > 1 else 'database.db'
+    # Analyses come from the configured backend; check rows go to the local file
+    store = storage.get_storage(db_path)
+    conn = sqlite3.connect(db_path)
+    init_table(conn)
+    print(f"Backfilled {backfill(conn, store)} analyses into forensic_checks.")
+    conn.close()
@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+# The app creates its databases in the working directory when first imported, and is
+# imported once per session: every test touching it shares this scratch directory.
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("app")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    os.environ["ADMISSION_DB_PATH"] = str(workdir / "admission.db")
+    os.environ["ANALYSIS_WORKERS"] = "0"  # Analyses run inline on the request's thread
+    import app
+    yield app
+    app.activity.close()
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def login(server):
+    """Creates a user with a live session; returns (user_id, Authorization headers)."""
+    def login(username):
+        user_id = server.store.create_user(username, "h")
+        token = server.session_store.create(server.store, user_id)
+        return user_id, {"Authorization": f"Bearer {token}"}
+    return login
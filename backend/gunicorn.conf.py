@@ -0,0 +1,26 @@
+import os
+
+from dotenv import load_dotenv
+
+# backend/.env, for the settings below and for the analysis pool started in post_fork
+# (before the app module, which loads it too, is imported)
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
+
+# Loaded automatically by `gunicorn app:app` from this directory.
+# PRELOAD_ANALYZERS=1 imports the app (and, via analysis_logic.preload, librosa/cv2/
+# TextBlob/reportlab) once in the master before forking, so workers boot instantly
+# and share those pages copy-on-write. Leave it off to keep per-worker lazy loading.
+preload_app = os.getenv("PRELOAD_ANALYZERS", "0") == "1"
+
+# Request threads per worker (gthread). Heavy uploads may use all but one of them
+# (ADMISSION_HEAVY_PER_WORKER, see admission.py), so auth and other light routes
+# always find a free thread.
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+
+
+def post_fork(server, worker):
+    # Start the analysis process pool (ANALYSIS_WORKERS) while this worker is still
+    # single-threaded. Created lazily from a request thread, the fork can copy a lock
+    # another thread holds mid-import and the pool never finishes warming up.
+    import analysis_executor
+    analysis_executor.get_executor()
@@ -0,0 +1,83 @@
+import os
+import gzip
+import threading
+from collections import OrderedDict
+
+# --- HTTP CACHING ---
+# Stored analyses never change after they are written, so their JSON and PDF
+# representations are cacheable by id: strong ETags ("a12-1" = analysis 12 as
+# rendered by engine version 1) let clients revalidate with If-None-Match. Both
+# renderings are byte-for-byte reproducible in any worker (the certificate takes its
+# dates from the stored row and is drawn on an invariant canvas). Rendered bodies
+# (plus their gzip encodings) are kept in a per-process LRU bounded by
+# RESPONSE_CACHE_MB. Deleting an analysis invalidates its entries.
+#
+# Configuration (environment):
+#   RESPONSE_CACHE_MB   rendered bodies kept per worker (0 = off)
+
+RESPONSE_CACHE_MB = float(os.getenv("RESPONSE_CACHE_MB", 64))
+IMMUTABLE = "private, max-age=31536000, immutable"
+MIN_GZIP_BYTES = 1024
+GZIP_LEVEL = 6
+
+
+def etag(kind, id, version):
+    """Opaque tag (unquoted) of a stored representation; kind is "a" (JSON) or "c" (certificate)."""
+    return f"{kind}{id}-{version}"
+
+
+def gzip_tag(tag):
+    # Strong validators differ per content-coding
+    return f"{tag}-gzip"
+
+
+def matched_tag(if_none_match, tag):
+    """The variant of tag (plain or gzip) named by If-None-Match (werkzeug ETags), or None."""
+    for variant in (tag, gzip_tag(tag)):
+        if if_none_match.contains_weak(variant):
+            return variant
+    return None
+
+
+def accepts_gzip(accept_encodings):
+    return accept_encodings["gzip"] > 0
+
+
+def compress(body):
+    # mtime=0 keeps the encoding byte-identical across workers, as a strong ETag requires
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class BodyCache:
+    """LRU of rendered bodies keyed by (kind, id, encoding), bounded by total bytes."""
+
+    def __init__(self, max_bytes=int(RESPONSE_CACHE_MB * 1024 * 1024)):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes // 4:
+            return  # One huge upload would flush everything else
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def invalidate(self, kind, id):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == kind and k[1] == id]:
+                self._size -= len(self._entries.pop(key))
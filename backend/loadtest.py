@@ -0,0 +1,364 @@
+"""
+Load test: drives the app with a weighted request mix from concurrent virtual users
+and reports latency percentiles, throughput and error rates per route.
+
+Usage:
+  python loadtest.py --users 8 --duration 60                # in-process, through the WSGI app
+  python loadtest.py --url http://127.0.0.1:8000 --users 32 # against a running server (gunicorn)
+  python loadtest.py --mix auth_user=60,upload_image=10 --json run.json
+
+In-process runs use a fresh temporary database directory unless --workdir is given,
+so the real database.db is never touched. Each virtual user registers its own account,
+logs in, then loops over the mix until --duration runs out. Uploads draw from a
+synthetic corpus built before the run (noise-textured JPEGs of several sizes, tone +
+noise WAVs, generated text); corpus items repeat once exhausted, which exercises
+the near-duplicate reuse path the way real re-uploads do.
+
+Every user sends its own X-Forwarded-For address, so the per-IP login limiter counts
+users separately where the app trusts one proxy hop (TRUSTED_PROXY_HOPS=1, set for
+in-process runs). Against a server, raise LOGIN_MAX_ATTEMPTS_PER_IP there for mixes
+with frequent re-logins, or the login route reports 429s. 429s from admission control
+on uploads are reported in their own column rather than as errors.
+"""
+import io
+import os
+import sys
+import json
+import time
+import base64
+import random
+import argparse
+import tempfile
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+import numpy as np
+
+DEFAULT_MIX = {
+    "auth_user": 40,      # GET /api/auth/user (frontend polling)
+    "list": 15,           # GET /api/analysis
+    "analysis": 10,       # GET /api/analysis/<id>
+    "login": 5,           # POST /api/login
+    "upload_image": 8,    # POST /api/analysis/upload
+    "upload_audio": 4,
+    "upload_text": 4,
+    "certificate": 4,     # GET /api/analysis/certificate/<id>
+}
+IMAGE_SIZES = [(640, 480), (1280, 960), (2048, 1536)]
+AUDIO_SECONDS = [3, 8, 15]
+WORDS = ("the analysis of media shows that signals from real sensors carry noise while generated "
+         "content tends to be smooth and uniform across every region we measured today").split()
+
+
+# --- SYNTHETIC CORPUS ---
+
+def synth_image(rng, width, height):
+    from PIL import Image
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([np.sin(x / rng.uniform(20, 80)) * 60, np.cos(y / rng.uniform(20, 80)) * 60,
+                     np.sin((x + y) / rng.uniform(30, 90)) * 60], axis=-1) + 128
+    pixels = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, "JPEG", quality=int(rng.integers(70, 95)))
+    return "image/jpeg", buf.getvalue()
+
+
+def synth_audio(rng, seconds, sr=22050):
+    import soundfile as sf
+    t = np.arange(int(sr * seconds)) / sr
+    tone = sum(rng.uniform(0.05, 0.2) * np.sin(2 * np.pi * rng.uniform(100, 900) * t) for _ in range(3))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(0.2, 2) * t)
+    signal = (tone * envelope + rng.normal(0, 0.01, t.shape)).astype(np.float32)
+    buf = io.BytesIO()
+    sf.write(buf, signal, sr, format="WAV")
+    return "audio/wav", buf.getvalue()
+
+
+def synth_text(rng, sentences=12):
+    lines = []
+    for _ in range(sentences):
+        words = rng.choice(WORDS, size=int(rng.integers(4, 25)))
+        lines.append(" ".join(words).capitalize() + ".")
+    return "text/plain", " ".join(lines).encode("utf-8")
+
+
+def build_corpus(size, seed=0):
+    """{file_type: [upload body]} with size items per type."""
+    rng = np.random.default_rng(seed)
+    corpus = {"image": [], "audio": [], "text": []}
+    for i in range(size):
+        for file_type, (mime, data) in (
+            ("image", synth_image(rng, *IMAGE_SIZES[i % len(IMAGE_SIZES)])),
+            ("audio", synth_audio(rng, AUDIO_SECONDS[i % len(AUDIO_SECONDS)])),
+            ("text", synth_text(rng)),
+        ):
+            corpus[file_type].append({
+                "fileName": f"loadtest_{file_type}_{i}",
+                "fileType": file_type,
+                "fileData": f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}",
+            })
+    return corpus
+
+
+# --- CLIENTS ---
+
+class WsgiClient:
+    """Calls the Flask app in this process (no sockets, no server)."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        resp = self.client.open(path, method=method, json=body, headers=headers or {})
+        data = resp.get_data()
+        resp.close()
+        return resp.status_code, data
+
+
+class HttpClient:
+    """One persistent HTTP/1.1 connection per virtual user."""
+
+    def __init__(self, url, timeout=300):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or (443 if parts.scheme == "https" else 80)
+        self.https = parts.scheme == "https"
+        self.timeout = timeout
+        self.conn = None
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        self.conn = cls(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        for attempt in (0, 1):
+            if self.conn is None:
+                self._connect()
+            try:
+                self.conn.request(method, path, body=payload, headers=headers)
+                resp = self.conn.getresponse()
+                return resp.status, resp.read()
+            except (http.client.HTTPException, ConnectionError, OSError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+
+# --- VIRTUAL USERS ---
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}  # route -> [(latency_ms, status)]
+        self._lock = threading.Lock()
+        self.start = self.stop = None  # Measured window (monotonic); samples finishing outside it are dropped
+
+    def add(self, route, latency_ms, status):
+        now = time.monotonic()
+        if self.start is None or not self.start <= now <= self.stop:
+            return
+        with self._lock:
+            self.samples.setdefault(route, []).append((latency_ms, status))
+
+
+class VirtualUser:
+    def __init__(self, index, client, corpus, mix, recorder, run_id, think):
+        self.index = index
+        self.client = client
+        self.corpus = corpus
+        self.routes, self.weights = zip(*mix.items())
+        self.recorder = recorder
+        self.username = f"loadtest-{run_id}-{index}"
+        self.password = f"pw-{run_id}-{index}"
+        self.think = think
+        self.address = f"10.{77 + index // 65536}.{index // 256 % 256}.{index % 256}"
+        self.token = None
+        self.analysis_ids = []
+        self.rng = random.Random(index)
+        self.uploads = 0
+
+    def call(self, route, method, path, body=None, auth=True):
+        # Each user is its own client for the per-IP login limiter (with TRUSTED_PROXY_HOPS=1)
+        headers = {"X-Forwarded-For": self.address}
+        if auth and self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        start = time.perf_counter()
+        try:
+            status, data = self.client.request(method, path, body, headers)
+        except Exception as e:
+            self.recorder.add(route, (time.perf_counter() - start) * 1000, f"exception:{type(e).__name__}")
+            return None, None
+        self.recorder.add(route, (time.perf_counter() - start) * 1000, status)
+        return status, data
+
+    def login(self):
+        status, data = self.call("login", "POST", "/api/login",
+                                 {"username": self.username, "password": self.password}, auth=False)
+        if status == 200:
+            self.token = json.loads(data)["sessionToken"]
+
+    def setup(self):
+        self.call("register", "POST", "/api/register", {"username": self.username, "password": self.password},
+                  auth=False)
+        self.login()
+
+    def upload(self, file_type):
+        items = self.corpus[file_type]
+        # Users start at different corpus offsets so concurrent uploads differ
+        item = items[(self.index * 7 + self.uploads) % len(items)]
+        self.uploads += 1
+        status, data = self.call(f"upload_{file_type}", "POST", "/api/analysis/upload", item)
+        if status == 200:
+            self.analysis_ids.append(json.loads(data)["id"])
+
+    def step(self):
+        route = self.rng.choices(self.routes, self.weights)[0]
+        if route == "login":
+            self.login()
+        elif route == "auth_user":
+            self.call(route, "GET", "/api/auth/user")
+        elif route == "list":
+            self.call(route, "GET", "/api/analysis")
+        elif route.startswith("upload_"):
+            self.upload(route[len("upload_"):])
+        elif route in ("analysis", "certificate"):
+            if not self.analysis_ids:
+                return self.upload("image")
+            analysis_id = self.rng.choice(self.analysis_ids)
+            path = f"/api/analysis/{analysis_id}" if route == "analysis" else f"/api/analysis/certificate/{analysis_id}"
+            self.call(route, "GET", path)
+
+    def run(self, deadline):
+        self.setup()
+        while time.monotonic() < deadline:
+            self.step()
+            if self.think:
+                time.sleep(self.rng.expovariate(1 / self.think))
+
+
+# --- REPORT ---
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(np.ceil(q / 100 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, seconds):
+    rows = []
+    for route in sorted(samples):
+        statuses = [status for _, status in samples[route]]
+        # Percentiles cover requests that were served; refusals return in a few ms
+        latencies = sorted(ms for ms, status in samples[route] if status != 429)
+        errors = sum(1 for s in statuses if not isinstance(s, int) or s >= 500)
+        rows.append({
+            "route": route,
+            "count": len(statuses),
+            "rps": len(statuses) / seconds,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1] if latencies else None,
+            "errorRate": errors / len(statuses),
+            "rejected": sum(1 for s in statuses if s == 429),
+            "clientErrors": sum(1 for s in statuses if isinstance(s, int) and 400 <= s < 500 and s != 429),
+        })
+    return rows
+
+
+def print_report(rows, seconds):
+    print(f"\n{'Route':<14} {'count':>7} {'req/s':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'max ms':>9} {'err %':>6} {'429':>5} {'4xx':>5}")
+    print("-" * 90)
+    ms = lambda v: f"{v:>9.1f}" if v is not None else f"{'-':>9}"
+    for r in rows:
+        print(f"{r['route']:<14} {r['count']:>7} {r['rps']:>7.2f} {ms(r['p50'])} {ms(r['p95'])} {ms(r['p99'])} "
+              f"{ms(r['max'])} {r['errorRate'] * 100:>6.1f} {r['rejected']:>5} {r['clientErrors']:>5}")
+    total = sum(r["count"] for r in rows)
+    print("-" * 90)
+    print(f"{'total':<14} {total:>7} {total / seconds:>7.2f}   over {seconds:.1f}s")
+
+
+def parse_mix(text):
+    mix = dict(DEFAULT_MIX)
+    if text:
+        mix = {}
+        for part in text.split(","):
+            route, _, weight = part.partition("=")
+            if route.strip() not in DEFAULT_MIX:
+                raise argparse.ArgumentTypeError(f"unknown route {route!r} (one of {', '.join(DEFAULT_MIX)})")
+            mix[route.strip()] = float(weight or 1)
+    return {route: weight for route, weight in mix.items() if weight > 0}
+
+
+def run(make_client, corpus, mix, users, duration, warmup=0.0, think=0.0):
+    """Runs the virtual users to completion; returns {route: [(latency_ms, status)]} for the measured window."""
+    recorder = Recorder()
+    run_id = f"{int(time.time())}{random.randint(0, 999):03d}"
+    vusers = [VirtualUser(i, make_client(), corpus, mix, recorder, run_id, think) for i in range(users)]
+    start = time.monotonic()
+    deadline = start + warmup + duration
+    threads = [threading.Thread(target=u.run, args=(deadline,), daemon=True) for u in vusers]
+    for t in threads:
+        t.start()
+    recorder.start, recorder.stop = start + warmup, deadline
+    for t in threads:
+        t.join()
+    return recorder.samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("--url", help="base URL of a running server (default: in-process WSGI app)")
+    parser.add_argument("--users", type=int, default=8, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds run before measuring starts")
+    parser.add_argument("--mix", type=parse_mix, default=dict(DEFAULT_MIX),
+                        help="route=weight list, e.g. auth_user=50,upload_image=10")
+    parser.add_argument("--think", type=float, default=0.0, help="mean pause between a user's requests (s)")
+    parser.add_argument("--corpus-size", type=int, default=12, help="synthetic items per media type")
+    parser.add_argument("--workdir", help="in-process mode: directory for database.db (default: a temp dir)")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+    if not args.mix:
+        parser.error("--mix selects no routes")
+
+    print(f"Building synthetic corpus ({args.corpus_size} per type)...", file=sys.stderr)
+    corpus = build_corpus(args.corpus_size)
+
+    if args.url:
+        make_client = lambda: HttpClient(args.url.rstrip("/"))
+        target = args.url
+    else:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        os.chdir(args.workdir or tempfile.mkdtemp(prefix="loadtest-"))
+        # Re-logins in the mix would otherwise measure the limiter instead of the KDF
+        os.environ.setdefault("LOGIN_MAX_ATTEMPTS_PER_IP", "1000000")
+        os.environ.setdefault("TRUSTED_PROXY_HOPS", "1")
+        import app as backend
+        make_client = lambda: WsgiClient(backend.app)
+        target = f"in-process WSGI ({os.getcwd()})"
+
+    print(f"Running {args.users} users against {target}: {args.warmup:.0f}s warm-up, {args.duration:.0f}s measured",
+          file=sys.stderr)
+    samples = run(make_client, corpus, args.mix, args.users, args.duration, args.warmup, args.think)
+    seconds = args.duration
+
+    rows = summarize(samples, seconds)
+    print_report(rows, seconds)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"target": target, "users": args.users, "seconds": seconds, "mix": args.mix,
+                       "routes": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
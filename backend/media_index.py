@@ -0,0 +1,232 @@
+import io
+import sqlite3
+import threading
+import numpy as np
+from PIL import Image
+
+# --- PERCEPTUAL HASHING ---
+# 64-bit dHash (gradient sign) and pHash (low-frequency DCT sign) survive
+# recompression, resizing and mild crops, so re-posts of the same synthetic image
+# land within a few bits of each other in Hamming space.
+
+_DCT_SIZE = 32
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    m = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    m[0, :] = np.sqrt(1.0 / n)
+    return m.astype(np.float32)
+
+
+_DCT = _dct_matrix(_DCT_SIZE)
+
+
+def _bits_to_int(bits):
+    value = 0
+    for bit in bits.ravel():
+        value = (value << 1) | int(bit)
+    return value
+
+
+def _thumbnail(img):
+    # draft() lets the JPEG decoder downscale by 1/2..1/8 while decoding
+    img.draft('L', (128, 128))
+    return img.convert('L')
+
+
+def _resized(gray, size):
+    return np.asarray(gray.resize(size, Image.BILINEAR), dtype=np.float32)
+
+
+def dhash(gray):
+    pixels = _resized(gray, (9, 8))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(gray):
+    pixels = _resized(gray, (_DCT_SIZE, _DCT_SIZE))
+    low = (_DCT @ pixels @ _DCT.T)[:8, :8]
+    return _bits_to_int(low > np.median(low.ravel()[1:]))  # median excludes DC
+
+
+def compute_image_hashes(image_bytes):
+    """Returns {"dhash": int, "phash": int} or None if the bytes aren't an image."""
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            gray = _thumbnail(img)
+        return {"dhash": dhash(gray), "phash": phash(gray)}
+    except Exception as e:
+        print(f"Perceptual hash failed: {e}")
+        return None
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def _to_signed(value):
+    # SQLite INTEGER is signed 64-bit
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+# --- BK-TREE ---
+
+class BKTree:
+    """Metric tree over Hamming distance; radius queries visit only a fraction of nodes."""
+
+    def __init__(self):
+        self._root = None  # [hash, [ids], {distance: child}]
+        self.size = 0
+
+    def add(self, value, item):
+        self.size += 1
+        if self._root is None:
+            self._root = [value, [item], {}]
+            return
+        node = self._root
+        while True:
+            d = hamming(value, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [value, [item], {}]
+                return
+            node = child
+
+    def query(self, value, radius):
+        """Returns [(distance, item)] for every stored hash within radius."""
+        if self._root is None:
+            return []
+        found = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            d = hamming(value, node[0])
+            if d <= radius:
+                found.extend((d, item) for item in node[1])
+            for edge, child in node[2].items():
+                if d - radius <= edge <= d + radius:
+                    stack.append(child)
+        return found
+
+
+# --- PERSISTENT INDEX ---
+
+class ImageHashIndex:
+    """
+    BK-tree over pHash kept in memory and persisted to the image_hashes table.
+    Each process catches up on rows written by other workers before every query.
+    Lookups are scoped to one owner: users only ever match their own uploads.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._tree = BKTree()
+        self._dhashes = {}
+        self._owners = {}  # analysis_id -> user_id
+        self._last_id = 0
+        self._removed = set()
+        self._lock = threading.Lock()
+        self._init_table()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path)
+
+    def _init_table(self):
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS image_hashes (
+                analysis_id INTEGER PRIMARY KEY,
+                user_id INTEGER,
+                dhash INTEGER,
+                phash INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _add_local(self, analysis_id, hashes, user_id):
+        self._tree.add(hashes["phash"], analysis_id)
+        self._dhashes[analysis_id] = hashes["dhash"]
+        self._owners[analysis_id] = user_id
+        self._last_id = max(self._last_id, analysis_id)
+
+    def _catch_up(self):
+        conn = self._connect()
+        rows = conn.execute(
+            'SELECT analysis_id, dhash, phash, user_id FROM image_hashes WHERE analysis_id > ? ORDER BY analysis_id',
+            (self._last_id,)
+        ).fetchall()
+        conn.close()
+        for analysis_id, d, p, user_id in rows:
+            self._add_local(analysis_id, {"dhash": _to_unsigned(d), "phash": _to_unsigned(p)}, user_id)
+
+    @staticmethod
+    def insert(conn, analysis_id, hashes, user_id):
+        """Persists hashes on an open connection (bulk loaders); the caller commits."""
+        conn.execute(
+            'INSERT OR REPLACE INTO image_hashes (analysis_id, dhash, phash, user_id) VALUES (?, ?, ?, ?)',
+            (analysis_id, _to_signed(hashes["dhash"]), _to_signed(hashes["phash"]), user_id)
+        )
+
+    def add(self, analysis_id, hashes, user_id):
+        conn = self._connect()
+        self.insert(conn, analysis_id, hashes, user_id)
+        conn.commit()
+        conn.close()
+        with self._lock:
+            self._catch_up()
+
+    def reload(self):
+        """Rebuilds the in-memory tree from the table (rows inserted below ids already loaded)."""
+        with self._lock:
+            self._tree = BKTree()
+            self._dhashes, self._owners = {}, {}
+            self._last_id = 0
+            self._removed = set()
+            self._catch_up()
+
+    def remove(self, analysis_id):
+        # BK-trees don't support deletion: ids are tombstoned here, and ids removed by
+        # other workers are dropped by callers resolving against analysis_results.
+        with self._lock:
+            self._removed.add(analysis_id)
+        conn = self._connect()
+        conn.execute('DELETE FROM image_hashes WHERE analysis_id = ?', (analysis_id,))
+        conn.commit()
+        conn.close()
+
+    def get(self, analysis_id):
+        conn = self._connect()
+        row = conn.execute('SELECT dhash, phash FROM image_hashes WHERE analysis_id = ?', (analysis_id,)).fetchone()
+        conn.close()
+        if not row:
+            return None
+        return {"dhash": _to_unsigned(row[0]), "phash": _to_unsigned(row[1])}
+
+    def neighbours(self, hashes, user_id, radius=10, limit=10, exclude=None):
+        """Nearest analyses of user_id by pHash distance: [{"analysis_id", "phash_distance", "dhash_distance"}]."""
+        with self._lock:
+            self._catch_up()
+            found = self._tree.query(hashes["phash"], radius)
+            results = [
+                {
+                    "analysis_id": analysis_id,
+                    "phash_distance": d,
+                    "dhash_distance": hamming(hashes["dhash"], self._dhashes.get(analysis_id, 0)),
+                }
+                for d, analysis_id in found
+                if analysis_id != exclude and analysis_id not in self._removed
+                and self._owners.get(analysis_id) == user_id
+            ]
+        results.sort(key=lambda r: (r["phash_distance"], r["dhash_distance"], -r["analysis_id"]))
+        return results[:limit]
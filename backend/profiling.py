@@ -0,0 +1,164 @@
+import os
+import re
+import hmac
+import json
+import time
+import random
+import marshal
+import secrets
+import cProfile
+import threading
+import tracemalloc
+
+# --- PROFILING ---
+# Opt-in profiles of individual analyses. An upload is profiled when it carries an
+# X-Profile-Token header equal to PROFILE_TOKEN, or at random for a PROFILE_SAMPLE_RATE
+# fraction of uploads. The analyzers then run under tracemalloc and cProfile wherever
+# they execute (request thread or analysis worker process), and the report lands in
+# PROFILE_DIR as <id>.json (wall / CPU time, tracemalloc peak, top allocation sites,
+# peak RSS) plus <id>.pstats (load with python -m pstats). The newest PROFILE_KEEP
+# profiles are kept. Unprofiled requests pay one header lookup.
+#
+# Configuration (environment):
+#   PROFILE_TOKEN         secret for the X-Profile-Token header and /api/admin/profiles (unset = header off)
+#   PROFILE_SAMPLE_RATE   fraction of uploads profiled without the header (0 = none)
+#   PROFILE_DIR           where profiles are written
+#   PROFILE_KEEP          profiles kept before the oldest are deleted
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 200))
+PROFILE_HEADER = "X-Profile-Token"
+TOP_ALLOCATIONS = 15
+
+_ID_RE = re.compile(r"^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$")
+# tracemalloc and the profiler hook are process-wide: one profiled analysis at a time
+_active = threading.Lock()
+
+
+def token_valid(token):
+    if not PROFILE_TOKEN or not isinstance(token, str) or not token:
+        return False
+    try:
+        # Compared as bytes: compare_digest refuses non-ASCII str
+        return hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+    except UnicodeError:
+        return False  # Lone surrogates from a mis-decoded header
+
+
+def should_profile(headers):
+    """True if this request asked for (or was sampled for) profiling."""
+    token = headers.get(PROFILE_HEADER)
+    if token is not None:
+        return token_valid(token)
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _max_rss_kb():
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # kB on Linux
+    except ImportError:
+        return None
+
+
+def run(func, *args, **kwargs):
+    """
+    (result, profile) of func(*args, **kwargs). profile is a dict with the summary
+    and the marshalled pstats under "pstats", or None when another analysis in this
+    process is already being profiled (func then runs unprofiled).
+    """
+    if not _active.acquire(blocking=False):
+        return func(*args, **kwargs), None
+    try:
+        rss_before = _max_rss_kb()
+        tracemalloc.start()
+        profiler = cProfile.Profile()
+        wall, cpu = time.perf_counter(), time.thread_time()
+        profiler.enable()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+        profiler.create_stats()
+        top = [{
+            "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "sizeKb": round(stat.size / 1024, 1),
+            "count": stat.count,
+        } for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]]
+        profile = {
+            "pid": os.getpid(),
+            "wallSeconds": round(wall, 4),
+            "cpuSeconds": round(cpu, 4),
+            "tracemallocPeakKb": round(peak / 1024, 1),
+            "maxRssKbBefore": rss_before,
+            "maxRssKbAfter": _max_rss_kb(),
+            "topAllocations": top,  # Still allocated when the analysis returned
+            "pstats": marshal.dumps(profiler.stats),
+        }
+        return result, profile
+    finally:
+        _active.release()
+
+
+class ProfileStore:
+    """Profiles on the local disk of this instance, newest first."""
+
+    def __init__(self, directory=PROFILE_DIR, keep=PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+
+    def save(self, profile, **context):
+        """Writes profile (from run) with request context; returns the profile id."""
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{secrets.token_hex(4)}"
+        summary = {k: v for k, v in profile.items() if k != "pstats"}
+        summary.update(context, id=profile_id, createdAt=time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime()))
+        with open(self.path(profile_id, "pstats"), "wb") as f:
+            f.write(profile["pstats"])
+        with open(self.path(profile_id, "json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f)
+        self._prune()
+        return profile_id
+
+    def path(self, profile_id, kind):
+        if not _ID_RE.match(profile_id or "") or kind not in ("json", "pstats"):
+            raise ValueError("Invalid profile id")
+        return os.path.join(self.directory, f"{profile_id}.{kind}")
+
+    def _ids(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        # Ids start with the UTC time, so name order is age order
+        return sorted((n[:-5] for n in names if n.endswith(".json") and _ID_RE.match(n[:-5])), reverse=True)
+
+    def load(self, profile_id):
+        try:
+            with open(self.path(profile_id, "json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def list(self, limit=50):
+        summaries = []
+        for profile_id in self._ids()[:limit]:
+            summary = self.load(profile_id)
+            if summary:
+                summary.pop("topAllocations", None)
+                summaries.append(summary)
+        return summaries
+
+    def _prune(self):
+        for profile_id in self._ids()[self.keep:]:
+            for kind in ("json", "pstats"):
+                try:
+                    os.remove(self.path(profile_id, kind))
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,114 @@
+import sys
+import json
+import argparse
+from collections import Counter
+
+import analysis_logic
+import check_registry
+import check_stats
+
+# --- OFFLINE RE-VERDICT ---
+# Re-judges stored check metrics under candidate thresholds and reports how
+# verdicts and per-check failure rates would move. Works purely from the
+# forensic_checks / forensic_check_metrics tables: no media is decoded. Those live in
+# the local SQLite file with either STORAGE_BACKEND, so --db is always that file.
+#
+#   python reverdict.py thresholds.json [--db database.db] [--file-type audio] [--changes out.jsonl]
+#
+# thresholds.json overrides registered thresholds per check id, e.g.
+#   {"image.ela": {"min_std": 2.0}, "audio.spectral_flatness": {"min_flatness": 0.001}}
+
+
+def rejudge(file_type, stored, overrides):
+    """
+    Returns (old_checks, new_checks) as ForensicCheck lists. Checks whose metrics
+    are missing (rows stored before metrics were captured) keep their stored status.
+    """
+    old_checks, new_checks = [], []
+    for name, status, metrics in stored:
+        old_checks.append(analysis_logic.ForensicCheck(name, "", status, metrics=metrics))
+        new_status = status
+        spec = check_registry.find_check(file_type, name)
+        if spec is not None and spec.judge is not None and metrics:
+            values = {k: float("nan") if v is None else v for k, v in metrics.items()}
+            try:
+                failed, _ = check_registry.judge_check(spec, values, overrides)
+                new_status = "FAIL" if failed else "PASS"
+            except (KeyError, TypeError):
+                pass
+        new_checks.append(analysis_logic.ForensicCheck(name, "", new_status, metrics=metrics))
+    return old_checks, new_checks
+
+
+def reverdict(conn, overrides, file_type=None, since=None, until=None, changes=None):
+    transitions = Counter()
+    check_totals = Counter()
+    old_fails = Counter()
+    new_fails = Counter()
+
+    for analysis_id, row_type, stored in check_stats.iter_stored_checks(conn, file_type, since, until):
+        old_checks, new_checks = rejudge(row_type, stored, overrides)
+        old_label = analysis_logic.calculate_verdict(old_checks)[0]
+        new_label = analysis_logic.calculate_verdict(new_checks)[0]
+        transitions[(old_label, new_label)] += 1
+        for old, new in zip(old_checks, new_checks):
+            key = (row_type, old.name)
+            check_totals[key] += 1
+            old_fails[key] += old.status == "FAIL"
+            new_fails[key] += new.status == "FAIL"
+        if changes is not None and old_label != new_label:
+            changes.write(json.dumps({
+                "analysisId": analysis_id, "fileType": row_type, "from": old_label, "to": new_label,
+                "flipped": [n.name for o, n in zip(old_checks, new_checks) if o.status != n.status],
+            }) + "\n")
+
+    return {
+        "analyses": sum(transitions.values()),
+        "changed": sum(n for (old, new), n in transitions.items() if old != new),
+        "transitions": [
+            {"from": old, "to": new, "count": n} for (old, new), n in sorted(transitions.items())
+        ],
+        "checks": [
+            {
+                "fileType": ft, "name": name, "total": total,
+                "failureRate": round(old_fails[(ft, name)] / total, 4),
+                "newFailureRate": round(new_fails[(ft, name)] / total, 4),
+            }
+            for (ft, name), total in sorted(check_totals.items())
+        ],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-apply check thresholds to stored metrics.")
+    parser.add_argument("thresholds", help="JSON file: {check_id: {threshold: value}}")
+    parser.add_argument("--db", default="database.db", help="local analytics database (SQLite)")
+    parser.add_argument("--file-type")
+    parser.add_argument("--since")
+    parser.add_argument("--until")
+    parser.add_argument("--changes", help="write changed verdicts as JSON lines to this file")
+    args = parser.parse_args(argv)
+
+    with open(args.thresholds) as f:
+        overrides = json.load(f)
+    unknown = [cid for cid in overrides if cid not in {s.id for s in check_registry.all_checks()}]
+    if unknown:
+        parser.error(f"unknown check ids: {', '.join(unknown)}")
+
+    try:
+        conn = check_stats.open_analytics(args.db)
+    except ValueError as e:
+        parser.error(str(e))
+    changes = open(args.changes, "w") if args.changes else None
+    try:
+        report = reverdict(conn, overrides, args.file_type, args.since, args.until, changes)
+    finally:
+        conn.close()
+        if changes:
+            changes.close()
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+
+# --- ROLLUP COUNTERS ---
+# Dashboard aggregates maintained incrementally on write (login/logout, register,
+# upload, delete) so the admin summary reads a handful of counter rows instead of
+# scanning user_activity / analysis_results. Counters are keyed by (name, bucket):
+#
+#   activity         login | logout            all-time activity entries
+#   activity_daily   YYYY-MM-DD:action         activity per UTC day
+#   users            total
+#   analyses         <file_type>               stored analyses per media type
+#   analyses_daily   YYYY-MM-DD                uploads per UTC day
+#   verdicts         <file_type>:<label>       verdict distribution per media type
+
+
+def init_tables(conn, history=None):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_counters (
+            name TEXT,
+            bucket TEXT,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (name, bucket)
+        ) WITHOUT ROWID
+    ''')
+    if conn.execute('SELECT 1 FROM rollup_counters LIMIT 1').fetchone() is None:
+        rebuild(conn, history)
+
+
+def _today():
+    # CURRENT_TIMESTAMP (used for the history tables) is UTC
+    return datetime.utcnow().strftime('%Y-%m-%d')
+
+
+def bump(conn, name, bucket, delta=1):
+    conn.execute('''
+        INSERT INTO rollup_counters (name, bucket, count) VALUES (?, ?, ?)
+        ON CONFLICT (name, bucket) DO UPDATE SET count = count + excluded.count
+    ''', (name, str(bucket), delta))
+
+
+def record_activity(conn, action, day=None):
+    """day (YYYY-MM-DD) of the event when it is recorded later than it happened."""
+    bump(conn, 'activity', action)
+    bump(conn, 'activity_daily', f"{day or _today()}:{action}")
+
+
+def record_user(conn):
+    bump(conn, 'users', 'total')
+
+
+def record_analysis(conn, file_type, label, delta=1):
+    """delta=-1 when an analysis is deleted (daily upload counts are kept)."""
+    file_type, label = file_type or 'unknown', label or 'unknown'
+    bump(conn, 'analyses', file_type, delta)
+    bump(conn, 'verdicts', f"{file_type}:{label}", delta)
+    if delta > 0:
+        bump(conn, 'analyses_daily', _today(), delta)
+
+
+def rebuild(conn, history=None):
+    """
+    Recomputes every counter from the history tables (first run / repair). history
+    is a callable returning (name, bucket, count) rows (storage.history_counts) for
+    history kept in another database; by default the tables next to the counters are read.
+    """
+    conn.execute('DELETE FROM rollup_counters')
+    if history is not None:
+        conn.executemany('INSERT INTO rollup_counters (name, bucket, count) VALUES (?, ?, ?)', history())
+        return
+    conn.execute('''
+        INSERT INTO rollup_counters (name, bucket, count)
+        SELECT 'activity', action, COUNT(*) FROM user_activity GROUP BY action
+        UNION ALL
+        SELECT 'activity_daily', date(timestamp) || ':' || action, COUNT(*)
+            FROM user_activity GROUP BY date(timestamp), action
+        UNION ALL
+        SELECT 'users', 'total', COUNT(*) FROM users
+        UNION ALL
+        SELECT 'analyses', COALESCE(file_type, 'unknown'), COUNT(*) FROM analysis_results GROUP BY 2
+        UNION ALL
+        SELECT 'analyses_daily', date(created_at), COUNT(*) FROM analysis_results GROUP BY date(created_at)
+        UNION ALL
+        SELECT 'verdicts', COALESCE(file_type, 'unknown') || ':' || COALESCE(authenticity_label, 'unknown'), COUNT(*)
+            FROM analysis_results GROUP BY 2
+    ''')
+
+
+def summary(conn, last_activity=None, days=30):
+    """
+    Aggregates for the admin dashboard; cost is independent of history size.
+    last_activity is the newest activity timestamp (storage.last_activity_time).
+    """
+    since = (datetime.utcnow() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    counters = {}
+    for name, bucket, count in conn.execute(
+        "SELECT name, bucket, count FROM rollup_counters WHERE name IN ('activity', 'users', 'analyses', 'verdicts')"
+    ):
+        counters.setdefault(name, {})[bucket] = count
+
+    logins_by_day, analyses_by_day = {}, {}
+    for name, bucket, count in conn.execute('''
+        SELECT name, bucket, count FROM rollup_counters
+        WHERE (name = 'activity_daily' OR name = 'analyses_daily') AND bucket >= ?
+    ''', (since,)):
+        if name == 'analyses_daily':
+            analyses_by_day[bucket] = count
+        elif bucket.endswith(':login'):
+            logins_by_day[bucket.split(':', 1)[0]] = count
+
+    verdicts = {}
+    for key, count in counters.get('verdicts', {}).items():
+        file_type, label = key.split(':', 1)
+        if count:
+            verdicts.setdefault(file_type, {})[label] = count
+
+    activity = counters.get('activity', {})
+    return {
+        "totalUsers": counters.get('users', {}).get('total', 0),
+        "totalActivity": sum(activity.values()),
+        "logins": activity.get('login', 0),
+        "logouts": activity.get('logout', 0),
+        "lastActivity": last_activity,
+        "loginsByDay": [{"day": day, "count": n} for day, n in sorted(logins_by_day.items())],
+        "analysesByDay": [{"day": day, "count": n} for day, n in sorted(analyses_by_day.items())],
+        "analysesByType": {k: v for k, v in counters.get('analyses', {}).items() if v},
+        "verdicts": verdicts,
+    }
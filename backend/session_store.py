@@ -0,0 +1,94 @@
+import os
+import time
+import secrets
+import threading
+from datetime import datetime, timedelta
+
+# --- SESSION STORE ---
+# Server-side expiry for session tokens. Sessions slide: an active token is pushed
+# SESSION_TTL_DAYS into the future, but at most once per SESSION_RENEW_SECONDS so
+# ordinary requests stay read-only. A daemon thread deletes expired rows in batches.
+#
+# Configuration (environment):
+#   SESSION_TTL_DAYS          lifetime of an idle session (also the cookie max_age)
+#   SESSION_RENEW_SECONDS     minimum time between sliding renewals of one session
+#   SESSION_SWEEP_SECONDS     interval of the expired-session sweeper (0 = disabled)
+
+SESSION_TTL_DAYS = int(os.getenv("SESSION_TTL_DAYS", 30))
+SESSION_RENEW_SECONDS = int(os.getenv("SESSION_RENEW_SECONDS", 3600))
+SESSION_SWEEP_SECONDS = int(os.getenv("SESSION_SWEEP_SECONDS", 900))
+SWEEP_BATCH_SIZE = 500
+
+TTL_SECONDS = SESSION_TTL_DAYS * 24 * 60 * 60
+_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'  # same text form as CURRENT_TIMESTAMP (UTC)
+
+
+def _now():
+    return datetime.utcnow()
+
+
+def _fmt(dt):
+    return dt.strftime(_TIME_FORMAT)
+
+
+def create(store, user_id):
+    """Stores a new session and returns its token."""
+    token = secrets.token_hex(32)
+    now = _now()
+    store.insert_session(token, user_id, _fmt(now + timedelta(seconds=TTL_SECONDS)), _fmt(now))
+    return token
+
+
+def lookup(store, token):
+    """Returns the user_id for a live token (renewing it if due) or None."""
+    now = _now()
+    row = store.live_session(token, _fmt(now))
+    if not row:
+        return None
+    user_id, last_seen = row['user_id'], row['last_seen']
+    if not last_seen or last_seen <= _fmt(now - timedelta(seconds=SESSION_RENEW_SECONDS)):
+        store.renew_session(token, _fmt(now + timedelta(seconds=TTL_SECONDS)), _fmt(now))
+    return user_id
+
+
+def revoke(store, token):
+    store.delete_session(token)
+
+
+def revoke_all(store, user_id):
+    """Deletes every session of user_id (uses the sessions(user_id) index); returns the count."""
+    return store.delete_user_sessions(user_id)
+
+
+def sweep(store, batch_size=SWEEP_BATCH_SIZE):
+    """Deletes expired sessions in short batches so writers are never blocked for long."""
+    deleted = 0
+    while True:
+        count = store.delete_expired_sessions(_fmt(_now()), batch_size)
+        deleted += count
+        if count < batch_size:
+            break
+    return deleted
+
+
+_sweeper = None
+
+
+def start_sweeper(store, interval=SESSION_SWEEP_SECONDS):
+    """Starts the background sweeper thread once per process."""
+    global _sweeper
+    if interval <= 0 or (_sweeper is not None and _sweeper.is_alive()):
+        return
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                deleted = sweep(store)
+                if deleted:
+                    print(f"Session sweeper removed {deleted} expired sessions.")
+            except Exception as e:  # Database errors of either storage backend
+                print(f"Session sweeper error: {e}")
+
+    _sweeper = threading.Thread(target=run, name="session-sweeper", daemon=True)
+    _sweeper.start()
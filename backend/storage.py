@@ -0,0 +1,533 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+
+# --- STORAGE BACKENDS ---
+# Primary records (users, sessions, analyses, activity) behind one interface, so the
+# app runs on the local SQLite file or on a MySQL server. Queries are written once
+# with "?" placeholders; the backends differ only in how connections are obtained,
+# in DDL and in the few statements that have no portable form.
+#
+# Derived data (forensic_checks, rollup counters, image_hashes, audio_landmarks)
+# stays in the local SQLite file with either backend. With MySQL that file may not
+# outlive a redeploy (Render's disk is ephemeral); the app rebuilds it from these
+# records after it starts on an empty one (see rebuild_local_indexes in app.py).
+#
+# Configuration (environment):
+#   STORAGE_BACKEND   sqlite (default) | mysql
+#   DB_HOST, DB_PORT, DB_USER, DB_PASSWORD, DB_NAME   MySQL server (STORAGE_BACKEND=mysql)
+#   DB_POOL_SIZE      pooled MySQL connections per process (at most 32)
+#   DB_POOL_TIMEOUT   seconds a request waits for a free pooled connection
+
+INSERT_BATCH_SIZE = 500
+ANALYSIS_COLUMNS = ('user_id', 'file_name', 'file_url', 'file_type',
+                    'sentiment_label', 'sentiment_score',
+                    'authenticity_label', 'authenticity_score',
+                    'details', 'schema_version', 'checks')
+_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'  # same text form as SQLite's CURRENT_TIMESTAMP
+
+
+class DuplicateUser(Exception):
+    """The username is already taken."""
+
+
+class StorageBusy(Exception):
+    """Every pooled connection stayed in use for DB_POOL_TIMEOUT seconds."""
+
+
+class Storage:
+    placeholder = '?'
+    integrity_errors = ()
+
+    @contextmanager
+    def connection(self):
+        """DB-API connection committed when the block exits normally, rolled back otherwise."""
+        raise NotImplementedError
+
+    def _cursor(self, conn):
+        return conn.cursor()
+
+    def _row(self, row):
+        return row
+
+    def _sql(self, sql):
+        return sql if self.placeholder == '?' else sql.replace('?', self.placeholder)
+
+    def _execute(self, sql, params=()):
+        """(rowcount, lastrowid) of one statement in its own transaction."""
+        with self.connection() as conn:
+            cursor = self._cursor(conn)
+            cursor.execute(self._sql(sql), params)
+            return cursor.rowcount, cursor.lastrowid
+
+    def _fetchall(self, sql, params=()):
+        with self.connection() as conn:
+            cursor = self._cursor(conn)
+            cursor.execute(self._sql(sql), params)
+            return [self._row(row) for row in cursor.fetchall()]
+
+    def _fetchone(self, sql, params=()):
+        rows = self._fetchall(sql, params)
+        return rows[0] if rows else None
+
+    def _executemany(self, sql, rows):
+        """Runs sql for every parameter tuple in INSERT_BATCH_SIZE chunks, one transaction."""
+        with self.connection() as conn:
+            cursor = self._cursor(conn)
+            for start in range(0, len(rows), INSERT_BATCH_SIZE):
+                cursor.executemany(self._sql(sql), rows[start:start + INSERT_BATCH_SIZE])
+
+    def init_schema(self):
+        raise NotImplementedError
+
+    # --- USERS ---
+
+    def create_user(self, username, password_hash, email='', first_name='', last_name='', profile_image_url=None):
+        """Returns the new user id; raises DuplicateUser."""
+        try:
+            return self._execute('''
+                INSERT INTO users (username, password, email, first_name, last_name, profile_image_url)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (username, password_hash, email, first_name, last_name, profile_image_url))[1]
+        except self.integrity_errors:
+            raise DuplicateUser(username)
+
+    def get_user(self, user_id):
+        return self._fetchone('SELECT * FROM users WHERE id = ?', (user_id,))
+
+    def get_user_by_username(self, username):
+        return self._fetchone('SELECT * FROM users WHERE username = ?', (username,))
+
+    def set_password(self, user_id, password_hash):
+        self._execute('UPDATE users SET password = ? WHERE id = ?', (password_hash, user_id))
+
+    def users_after(self, cursor, limit):
+        """Users with id > cursor in id order (admin pagination)."""
+        return self._fetchall(
+            'SELECT id, username, first_name, last_name, created_at FROM users WHERE id > ? ORDER BY id LIMIT ?',
+            (cursor or 0, limit)
+        )
+
+    # --- SESSIONS ---
+
+    def insert_session(self, token, user_id, expires_at, last_seen):
+        self._execute('INSERT INTO sessions (token, user_id, expires_at, last_seen) VALUES (?, ?, ?, ?)',
+                      (token, user_id, expires_at, last_seen))
+
+    def live_session(self, token, now):
+        """(user_id, last_seen) row of a session that has not expired at now, or None."""
+        return self._fetchone('SELECT user_id, last_seen FROM sessions WHERE token = ? AND expires_at > ?',
+                              (token, now))
+
+    def renew_session(self, token, expires_at, last_seen):
+        self._execute('UPDATE sessions SET expires_at = ?, last_seen = ? WHERE token = ?',
+                      (expires_at, last_seen, token))
+
+    def session_user(self, token):
+        """user_id of a stored session whether or not it has expired, or None."""
+        row = self._fetchone('SELECT user_id FROM sessions WHERE token = ?', (token,))
+        return row['user_id'] if row else None
+
+    def delete_session(self, token):
+        self._execute('DELETE FROM sessions WHERE token = ?', (token,))
+
+    def delete_user_sessions(self, user_id):
+        """Deletes every session of user_id; returns the count."""
+        return self._execute('DELETE FROM sessions WHERE user_id = ?', (user_id,))[0]
+
+    def delete_expired_sessions(self, now, limit):
+        """Deletes at most limit sessions that expired by now; returns the count."""
+        raise NotImplementedError
+
+    # --- ACTIVITY ---
+
+    def log_activity(self, user_id, action):
+        self._execute('INSERT INTO user_activity (user_id, action) VALUES (?, ?)', (user_id, action))
+
+    def log_activities(self, rows):
+        """Batched insert of (user_id, action, timestamp) rows; timestamp is UTC text."""
+        self._executemany('INSERT INTO user_activity (user_id, action, timestamp) VALUES (?, ?, ?)',
+                          [tuple(row) for row in rows])
+
+    def activity_before(self, cursor, limit):
+        """Activity with id < cursor, newest first, joined with the user's name."""
+        # Ids follow insertion order, so this walks the primary key
+        return self._fetchall('''
+            SELECT a.*, u.username, u.first_name, u.last_name
+            FROM user_activity a
+            JOIN users u ON a.user_id = u.id
+            WHERE a.id < ?
+            ORDER BY a.id DESC
+            LIMIT ?
+        ''', (cursor if cursor is not None else 2**63 - 1, limit))
+
+    def last_activity_time(self):
+        # MAX over the timestamp index is a single B-tree probe
+        row = self._fetchone('SELECT MAX(timestamp) AS last FROM user_activity')
+        return row['last'] if row else None
+
+    # --- ANALYSES ---
+
+    def insert_analysis(self, row):
+        """Stores one analysis (a dict keyed by ANALYSIS_COLUMNS); returns its id."""
+        return self.insert_analyses([row])[0]
+
+    def insert_analyses(self, rows):
+        """Stores analyses in one transaction; returns their ids in order."""
+        raise NotImplementedError
+
+    def _analysis_insert_sql(self):
+        return (f"INSERT INTO analysis_results ({', '.join(ANALYSIS_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(ANALYSIS_COLUMNS))})")
+
+    def get_analysis(self, analysis_id):
+        return self._fetchone('SELECT * FROM analysis_results WHERE id = ?', (analysis_id,))
+
+    def list_analyses(self, user_id):
+        return self._fetchall('SELECT * FROM analysis_results WHERE user_id = ? ORDER BY created_at DESC',
+                              (user_id,))
+
+    def analysis_header(self, analysis_id):
+        """(user_id, file_type, authenticity_label) without the media and details columns."""
+        return self._fetchone('SELECT user_id, file_type, authenticity_label FROM analysis_results WHERE id = ?',
+                              (analysis_id,))
+
+    def analysis_summaries(self, ids):
+        """Verdict columns of the analyses in ids that still exist."""
+        ids = list(ids)
+        if not ids:
+            return []
+        return self._fetchall(
+            'SELECT id, user_id, file_name, authenticity_label, authenticity_score, created_at FROM analysis_results '
+            f"WHERE id IN ({','.join('?' * len(ids))})",
+            ids
+        )
+
+    def analyses_after(self, after_id, limit):
+        """Check columns (no media) of up to limit analyses with id > after_id, in id order."""
+        return self._fetchall(
+            'SELECT id, file_type, details, schema_version, checks, created_at FROM analysis_results '
+            'WHERE id > ? ORDER BY id LIMIT ?',
+            (after_id, limit)
+        )
+
+    def media_after(self, after_id, limit, file_type):
+        """(id, user_id, file_url) of up to limit file_type analyses with stored media and id > after_id."""
+        return self._fetchall(
+            'SELECT id, user_id, file_url FROM analysis_results '
+            'WHERE id > ? AND file_type = ? AND file_url IS NOT NULL ORDER BY id LIMIT ?',
+            (after_id, file_type, limit)
+        )
+
+    def last_analysis(self, user_id):
+        return self._fetchone(
+            'SELECT file_name, authenticity_label, authenticity_score FROM analysis_results '
+            'WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT 1',
+            (user_id,)
+        )
+
+    def delete_analysis(self, analysis_id):
+        self._execute('DELETE FROM analysis_results WHERE id = ?', (analysis_id,))
+
+    # --- HISTORY ---
+
+    def history_counts(self):
+        """(name, bucket, count) rows for rollups.rebuild, computed from the history tables."""
+        counts = []
+        for row in self._fetchall('SELECT action, COUNT(*) AS n FROM user_activity GROUP BY action'):
+            counts.append(('activity', row['action'], row['n']))
+        for row in self._fetchall(
+                'SELECT DATE(timestamp) AS day, action, COUNT(*) AS n FROM user_activity GROUP BY DATE(timestamp), action'):
+            counts.append(('activity_daily', f"{row['day']}:{row['action']}", row['n']))
+        counts.append(('users', 'total', self._fetchone('SELECT COUNT(*) AS n FROM users')['n']))
+        for row in self._fetchall('''
+            SELECT COALESCE(file_type, 'unknown') AS file_type, COALESCE(authenticity_label, 'unknown') AS label,
+                   COUNT(*) AS n
+            FROM analysis_results GROUP BY COALESCE(file_type, 'unknown'), COALESCE(authenticity_label, 'unknown')
+        '''):
+            counts.append(('verdicts', f"{row['file_type']}:{row['label']}", row['n']))
+        per_type = {}
+        for _, bucket, n in [c for c in counts if c[0] == 'verdicts']:
+            file_type = bucket.split(':', 1)[0]
+            per_type[file_type] = per_type.get(file_type, 0) + n
+        counts.extend(('analyses', file_type, n) for file_type, n in per_type.items())
+        for row in self._fetchall(
+                'SELECT DATE(created_at) AS day, COUNT(*) AS n FROM analysis_results GROUP BY DATE(created_at)'):
+            counts.append(('analyses_daily', str(row['day']), row['n']))
+        return counts
+
+
+# --- SQLITE ---
+
+class SQLiteStorage(Storage):
+    """The local database file; one short-lived connection per operation."""
+
+    integrity_errors = (sqlite3.IntegrityError,)
+
+    def __init__(self, path):
+        self.path = path
+
+    @contextmanager
+    def connection(self):
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()  # Uncommitted work is rolled back
+
+    def init_schema(self, session_ttl_days=30):
+        with self.connection() as conn:
+            c = conn.cursor()
+            # Users Table
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT UNIQUE,
+                    password TEXT,
+                    email TEXT,
+                    first_name TEXT,
+                    last_name TEXT,
+                    profile_image_url TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # Analysis Results Table
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS analysis_results (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    file_name TEXT,
+                    file_url TEXT,
+                    file_type TEXT,
+                    sentiment_label TEXT,
+                    sentiment_score INTEGER,
+                    authenticity_label TEXT,
+                    authenticity_score INTEGER,
+                    details TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # User Activity Table
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS user_activity (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    action TEXT, -- 'login', 'logout'
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # Sessions Table (New for Persistence)
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS sessions (
+                    token TEXT PRIMARY KEY,
+                    user_id INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY(user_id) REFERENCES users(id)
+                )
+            ''')
+            # Columns added after the first release
+            ensure_column(c, 'analysis_results', 'schema_version', 'INTEGER DEFAULT 0')
+            ensure_column(c, 'analysis_results', 'checks', 'BLOB')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_user_activity_timestamp ON user_activity (timestamp)')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_user_activity_user ON user_activity (user_id)')
+            # Server-side session expiry (see session_store.py)
+            ensure_column(c, 'sessions', 'expires_at', 'TIMESTAMP')
+            ensure_column(c, 'sessions', 'last_seen', 'TIMESTAMP')
+            c.execute("UPDATE sessions SET expires_at = datetime(created_at, ?) WHERE expires_at IS NULL",
+                      (f'+{session_ttl_days} days',))
+            c.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id)')
+            c.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)')
+
+    def delete_expired_sessions(self, now, limit):
+        return self._execute(
+            'DELETE FROM sessions WHERE rowid IN (SELECT rowid FROM sessions WHERE expires_at <= ? LIMIT ?)',
+            (now, limit)
+        )[0]
+
+    def insert_analyses(self, rows):
+        sql = self._analysis_insert_sql()
+        with self.connection() as conn:
+            # lastrowid per statement; all rows still commit together
+            return [conn.execute(sql, tuple(row[col] for col in ANALYSIS_COLUMNS)).lastrowid for row in rows]
+
+
+def ensure_column(cursor, table, column, decl):
+    columns = [row[1] for row in cursor.execute(f'PRAGMA table_info({table})')]
+    if column not in columns:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {decl}')
+
+
+# --- MYSQL ---
+
+_MYSQL_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        username VARCHAR(150) UNIQUE,
+        password VARCHAR(255),
+        email VARCHAR(255),
+        first_name VARCHAR(150),
+        last_name VARCHAR(150),
+        profile_image_url TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS analysis_results (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT,
+        file_name VARCHAR(512),
+        file_url LONGTEXT,
+        file_type VARCHAR(16),
+        sentiment_label VARCHAR(64),
+        sentiment_score INT,
+        authenticity_label VARCHAR(64),
+        authenticity_score INT,
+        details MEDIUMTEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        schema_version INT DEFAULT 0,
+        checks BLOB,
+        INDEX idx_analysis_results_user (user_id, created_at)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS user_activity (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT,
+        action VARCHAR(32),
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_user_activity_timestamp (timestamp),
+        INDEX idx_user_activity_user (user_id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS sessions (
+        token CHAR(64) PRIMARY KEY,
+        user_id INT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        expires_at DATETIME,
+        last_seen DATETIME,
+        INDEX idx_sessions_user (user_id),
+        INDEX idx_sessions_expires (expires_at)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    ''',
+]
+
+
+class MySQLStorage(Storage):
+    """
+    MySQL through a per-process pool of persistent connections. The pool is created
+    on first use in each process, so gunicorn workers forked from a preloaded master
+    never share sockets. Sessions run in UTC so CURRENT_TIMESTAMP defaults match the
+    timestamps written by the application; every borrow ends in a commit or rollback,
+    so connections go back to the pool without a session reset round trip.
+    """
+
+    placeholder = '%s'
+
+    def __init__(self, host, user, password, database, port=3306, pool_size=5, pool_timeout=10):
+        import mysql.connector  # Optional dependency, only needed for this backend
+        from mysql.connector import pooling
+        self._pooling = pooling
+        self.integrity_errors = (mysql.connector.errors.IntegrityError,)
+        self.config = {"host": host, "port": port, "user": user, "password": password,
+                       "database": database, "charset": "utf8mb4", "time_zone": "+00:00",
+                       "autocommit": False, "pool_reset_session": False}
+        self.pool_size = max(1, min(pool_size, 32))
+        self.pool_timeout = pool_timeout
+        self._pool = None
+        self._pool_pid = None
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            host=os.getenv("DB_HOST", "localhost"),
+            port=int(os.getenv("DB_PORT", 3306)),
+            user=os.getenv("DB_USER", "root"),
+            password=os.getenv("DB_PASSWORD", ""),
+            database=os.getenv("DB_NAME", "verisight_db"),
+            pool_size=int(os.getenv("DB_POOL_SIZE", 5)),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", 10)),
+        )
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = self._pooling.MySQLConnectionPool(
+                    pool_name=f"storage-{os.getpid()}", pool_size=self.pool_size, **self.config)
+                self._pool_pid = os.getpid()
+                self._slots = threading.BoundedSemaphore(self.pool_size)
+            return self._pool, self._slots
+
+    @contextmanager
+    def connection(self):
+        pool, slots = self._get_pool()
+        # The connector's pool raises at once when exhausted; queue for a slot instead
+        if not slots.acquire(timeout=self.pool_timeout):
+            raise StorageBusy("Database is busy, please retry shortly.")
+        try:
+            conn = pool.get_connection()
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()  # Returns the connection to the pool
+        finally:
+            slots.release()
+
+    def _cursor(self, conn):
+        return conn.cursor(dictionary=True)
+
+    def _row(self, row):
+        # Same value types as the SQLite backend: timestamps as UTC text, blobs as bytes
+        for key, value in row.items():
+            if isinstance(value, datetime):
+                row[key] = value.strftime(_TIME_FORMAT)
+            elif isinstance(value, date):
+                row[key] = value.isoformat()
+            elif isinstance(value, bytearray):
+                row[key] = bytes(value)
+        return row
+
+    def init_schema(self, session_ttl_days=30):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            for statement in _MYSQL_SCHEMA:
+                cursor.execute(statement)
+
+    def delete_expired_sessions(self, now, limit):
+        return self._execute('DELETE FROM sessions WHERE expires_at <= ? LIMIT ?', (now, limit))[0]
+
+    def insert_analyses(self, rows):
+        sql = self._sql(self._analysis_insert_sql())
+        ids = []
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT @@auto_increment_increment')
+            step = cursor.fetchone()[0]
+            for start in range(0, len(rows), INSERT_BATCH_SIZE):
+                batch = [tuple(row[col] for col in ANALYSIS_COLUMNS) for row in rows[start:start + INSERT_BATCH_SIZE]]
+                # executemany sends one multi-row INSERT; InnoDB gives the rows of such a
+                # "simple insert" consecutive ids starting at lastrowid
+                cursor.executemany(sql, batch)
+                ids.extend(cursor.lastrowid + i * step for i in range(len(batch)))
+        return ids
+
+
+def get_storage(sqlite_path='database.db', backend=None):
+    """Storage selected by STORAGE_BACKEND (read at call time, after .env is loaded)."""
+    backend = (backend or os.getenv("STORAGE_BACKEND") or "sqlite").lower()
+    if backend == "sqlite":
+        return SQLiteStorage(sqlite_path)
+    if backend == "mysql":
+        return MySQLStorage.from_env()
+    raise ValueError(f"Unknown STORAGE_BACKEND {backend!r} (expected sqlite or mysql)")
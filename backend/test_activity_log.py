@@ -0,0 +1,159 @@
+import threading
+import time
+
+import pytest
+
+import activity_log
+
+# Login/logout write-behind: batching, flush triggers, the synchronous fallbacks and retries.
+
+
+class Recorder:
+    def __init__(self):
+        self.batches = []
+        self.fail = 0  # Calls left that raise
+        self.called = threading.Event()
+
+    def __call__(self, rows):
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("database is locked")
+        self.batches.append(list(rows))
+        self.called.set()
+
+    def rows(self):
+        return [row for batch in self.batches for row in batch]
+
+
+@pytest.fixture
+def write():
+    return Recorder()
+
+
+@pytest.fixture
+def buffer(write):
+    buffers = []
+
+    def make(**kwargs):
+        kwargs.setdefault("flush_ms", 60_000)
+        buffers.append(activity_log.ActivityBuffer(write, **kwargs))
+        return buffers[-1]
+
+    yield make
+    for b in buffers:
+        b.close()
+
+
+def test_events_are_batched_in_order(buffer, write):
+    b = buffer()
+    for user_id in range(5):
+        b.log(user_id, "login")
+    assert write.batches == [] and b.pending() == 5
+    assert b.flush() == 5
+    assert len(write.batches) == 1
+    assert [(u, a) for u, a, _ in write.batches[0]] == [(u, "login") for u in range(5)]
+    assert b.flush() == 0 and len(write.batches) == 1
+
+
+def test_flush_on_size(buffer, write):
+    b = buffer(flush_events=3)
+    b.log(1, "login")
+    b.log(2, "login")
+    assert not write.called.wait(0.2)
+    b.log(3, "login")
+    assert write.called.wait(5)
+    assert [u for u, _, _ in write.rows()] == [1, 2, 3]
+
+
+def test_flush_on_interval(buffer, write):
+    b = buffer(flush_ms=50)
+    b.log(1, "logout")
+    assert write.called.wait(5)
+    assert [(u, a) for u, a, _ in write.rows()] == [(1, "logout")]
+    assert b.pending() == 0
+
+
+def test_synchronous_when_queue_is_full(buffer, write):
+    b = buffer(max_events=2)
+    b.log(1, "login")
+    b.log(2, "login")
+    b.log(3, "login")  # Written on the caller's thread
+    assert [[u for u, _, _ in batch] for batch in write.batches] == [[3]]
+    assert b.pending() == 2
+
+
+def test_synchronous_when_disabled(buffer, write):
+    b = buffer(flush_ms=0)
+    b.log(1, "login")
+    assert len(write.batches) == 1 and b.pending() == 0
+
+
+def test_close_flushes_and_later_events_are_synchronous(buffer, write):
+    b = buffer()
+    b.log(1, "login")
+    b.log(2, "logout")
+    b.close()
+    assert [u for u, _, _ in write.rows()] == [1, 2] and b.pending() == 0
+    b.log(3, "login")
+    assert [u for u, _, _ in write.batches[-1]] == [3]
+
+
+def test_failed_write_is_retried(buffer, write):
+    b = buffer()
+    b.log(1, "login")
+    write.fail = 1
+    assert b.flush() == 0 and b.pending() == 1
+    b.log(2, "login")
+    assert b.flush() == 2
+    assert [u for u, _, _ in write.rows()] == [1, 2]
+
+
+def test_failed_after_write_does_not_store_rows_twice(write):
+    rollups = Recorder()
+    b = activity_log.ActivityBuffer(write, flush_ms=60_000, after_write=rollups)
+    try:
+        b.log(1, "login")
+        rollups.fail = 1
+        assert b.flush() == 1
+        assert rollups.batches == []
+        assert b.flush() == 0  # Nothing new to store; the rollups are retried on their own
+        assert [u for u, _, _ in write.rows()] == [1]
+        assert [u for u, _, _ in rollups.rows()] == [1]
+
+        b.log(2, "logout")
+        rollups.fail = 1
+        b.flush()
+        b.log(3, "login")
+        b.flush()
+        assert [u for u, _, _ in write.rows()] == [1, 2, 3]
+        assert [u for u, _, _ in rollups.rows()] == [1, 2, 3]
+    finally:
+        b.close()
+
+
+def test_app_stores_rows_once_when_rollups_fail(server, login, monkeypatch):
+    user_id, headers = login("activity-user")
+
+    def counts():
+        conn = server.get_analytics_connection()
+        stored = conn.execute("SELECT COUNT(*) FROM user_activity WHERE user_id = ?", (user_id,)).fetchone()[0]
+        rollup = conn.execute("SELECT count FROM rollup_counters WHERE name = 'activity' AND bucket = 'logout'").fetchone()
+        conn.close()
+        return stored, rollup[0] if rollup else 0
+
+    server.activity.flush()
+    stored, logouts = counts()
+    fails = iter([True])
+
+    def record_activity(conn, action, day=None):
+        if next(fails, False):
+            raise server.sqlite3.OperationalError("database is locked")
+        real(conn, action, day)
+
+    real = server.rollups.record_activity
+    monkeypatch.setattr(server.rollups, "record_activity", record_activity)
+    assert server.app.test_client().post("/api/logout", headers=headers).status_code == 200
+    server.activity.flush()
+    assert counts() == (stored + 1, logouts)
+    server.activity.flush()
+    assert counts() == (stored + 1, logouts + 1)
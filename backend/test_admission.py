@@ -0,0 +1,106 @@
+import io
+import os
+import sqlite3
+import time
+
+import pytest
+from PIL import Image
+
+import admission
+
+# Lease accounting and the Overloaded (HTTP 429) path of the admission controller.
+
+
+@pytest.fixture
+def controller(tmp_path):
+    def make(**kwargs):
+        kwargs.setdefault("budget", 10)
+        kwargs.setdefault("heavy_per_worker", 4)
+        return admission.AdmissionController(db_path=str(tmp_path / "admission.db"), seconds_per_unit=1.0,
+                                             lease_seconds=60, **kwargs)
+    return make
+
+
+def test_budget_is_shared_and_released(controller):
+    control = controller()
+    first = control.acquire(6)
+    assert control.in_flight() == (1, 6)
+
+    with pytest.raises(admission.Overloaded) as e:
+        control.acquire(5)
+    # Retry-After is when the running lease should finish (6 units at 1 s/unit)
+    assert 5 <= e.value.retry_after <= 6
+    assert control.in_flight() == (1, 6)  # The refused request holds nothing
+
+    with control.acquire(4):
+        assert control.in_flight() == (2, 10)
+    first.release()
+    first.release()  # Idempotent
+    assert control.in_flight() == (0, 0)
+
+
+def test_oversized_request_fits_an_idle_server(controller):
+    control = controller()
+    with control.acquire(100):
+        with pytest.raises(admission.Overloaded) as e:
+            control.acquire(1)
+        assert e.value.retry_after == admission.MAX_RETRY_AFTER
+
+
+def test_leases_are_shared_across_controllers(controller):
+    # Two controllers on one file stand in for two worker processes
+    worker_a, worker_b = controller(), controller()
+    with worker_a.acquire(8):
+        with pytest.raises(admission.Overloaded):
+            worker_b.acquire(3)
+        assert worker_b.in_flight() == (0, 8)
+
+
+def test_per_worker_limit_without_budget(controller):
+    control = controller(budget=0, heavy_per_worker=2)
+    leases = [control.acquire(100), control.acquire(100)]
+    with pytest.raises(admission.Overloaded) as e:
+        control.acquire(3)
+    assert e.value.retry_after == 3
+    leases[0].release()
+    control.acquire(1).release()
+    assert control.in_flight() == (1, 0)
+
+
+def test_dead_and_expired_leases_are_reclaimed(controller, tmp_path):
+    control = controller()
+    conn = sqlite3.connect(str(tmp_path / "admission.db"))
+    now = time.time()
+    dead_pid = 2 ** 22 + 12345  # Above the default pid_max
+    conn.execute("INSERT INTO admission_leases VALUES ('dead', ?, 9, ?, ?)", (dead_pid, now + 5, now + 60))
+    conn.execute("INSERT INTO admission_leases VALUES ('old', ?, 9, ?, ?)", (os.getpid(), now - 10, now - 1))
+    conn.commit()
+    conn.close()
+
+    with control.acquire(9):
+        assert control.in_flight() == (1, 9)
+
+
+def test_locked_ledger_is_overloaded(controller, tmp_path, monkeypatch):
+    control = controller()
+    path = str(tmp_path / "admission.db")
+    monkeypatch.setattr(control, "_connect", lambda: sqlite3.connect(path, timeout=0.05, isolation_level=None))
+    holder = sqlite3.connect(path, isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")  # Another worker holding the write lock past the busy timeout
+    with pytest.raises(admission.Overloaded) as e:
+        control.acquire(3)
+    assert e.value.retry_after == 3
+    holder.execute("ROLLBACK")
+    holder.close()
+    assert control.in_flight() == (0, 0)
+    control.acquire(3).release()
+
+
+def test_estimate_cost():
+    buffer = io.BytesIO()
+    Image.new("RGB", (2000, 1000)).save(buffer, "PNG")
+    assert admission.estimate_cost("image", buffer.getvalue()) == pytest.approx(3.0)
+    assert admission.estimate_cost("text", b"x" * 200000) == pytest.approx(3.0)
+    # Unreadable audio falls back to its size at a typical bitrate: 60 s -> 3 units
+    audio = b"\x00" * (admission.AUDIO_BYTES_PER_SECOND * 60)
+    assert admission.estimate_cost("audio", audio) == pytest.approx(4.0)
@@ -0,0 +1,112 @@
+import os
+import time
+import threading
+import multiprocessing
+
+import pytest
+
+import analysis_executor
+import analysis_logic
+from analysis_executor import AnalysisExecutor
+
+# Worker pool behaviour with a stand-in analysis: workers are forked, so they run
+# the patched module functions without importing or warming the real analyzers.
+
+pytestmark = pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(),
+                                reason="stand-in analysis reaches workers only through fork")
+
+
+def fake_analyze(file_type, payload, mode, progress, cancel, profile):
+    if payload == b"sleep":
+        time.sleep(30)
+    if payload == b"crash":
+        os._exit(1)
+    if payload == b"boom":
+        raise ValueError("bad input")
+    if payload == b"wait-cancel":
+        while not cancel.is_set():
+            time.sleep(0.01)
+        raise analysis_logic.check_registry.EvaluationCancelled()
+    progress("stage", {"mode": mode})
+    return os.getpid()
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(analysis_executor, "_analyze", fake_analyze)
+    monkeypatch.setattr(analysis_logic, "warm_up", lambda: None)
+    executors = []
+
+    def make(**kwargs):
+        kwargs.setdefault("workers", 1)
+        kwargs.setdefault("task_timeout", 5)
+        executor = AnalysisExecutor(start_timeout=10, **kwargs)
+        executors.append(executor)
+        return executor
+
+    yield make
+    for executor in executors:
+        executor.shutdown()
+
+
+def test_result_and_progress_events(pool):
+    executor = pool()
+    events = []
+    pid = executor.submit("image", b"x", mode="fast", on_event=lambda stage, data: events.append((stage, data)))
+    assert pid != os.getpid()
+    assert events == [("stage", {"mode": "fast"})]
+    assert executor.submit("image", b"") == pid  # Warm worker reused
+
+
+def test_worker_recycled_after_max_tasks(pool):
+    executor = pool(max_tasks_per_worker=2)
+    first = executor.submit("image", b"a")
+    assert executor.submit("image", b"b") == first
+    assert executor.submit("image", b"c") != first  # Waits for the refill thread's replacement
+
+
+def test_timeout_kills_and_replaces_worker(pool):
+    executor = pool(task_timeout=0.5)
+    pid = executor.submit("image", b"a")
+    with pytest.raises(analysis_executor.AnalysisTimeout):
+        executor.submit("image", b"sleep")
+    executor.task_timeout = 10
+    assert executor.submit("image", b"a") != pid
+
+
+def test_cancel_keeps_worker(pool):
+    executor = pool()
+    pid = executor.submit("image", b"a")
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+    with pytest.raises(analysis_executor.AnalysisCancelled):
+        executor.submit("image", b"wait-cancel", cancel=cancel)
+    assert executor.submit("image", b"a") == pid
+
+
+def test_crash_and_errors(pool):
+    executor = pool()
+    pid = executor.submit("image", b"a")
+    with pytest.raises(analysis_executor.ExecutorError, match="ValueError: bad input"):
+        executor.submit("image", b"boom")
+    assert executor.submit("image", b"a") == pid
+
+    with pytest.raises(analysis_executor.WorkerCrashed):
+        executor.submit("image", b"crash")
+    assert executor.submit("image", b"a") not in (pid, None)
+
+
+def test_all_workers_busy_and_shutdown(pool):
+    executor = pool(task_timeout=1)
+    holder = threading.Thread(target=lambda: pytest.raises(analysis_executor.AnalysisTimeout,
+                                                           executor.submit, "image", b"sleep"))
+    holder.start()
+    time.sleep(0.1)
+    executor.task_timeout = 0.2  # The held task keeps its 1 s deadline
+    with pytest.raises(analysis_executor.AnalysisTimeout, match="busy"):
+        executor.submit("image", b"a")
+    holder.join()
+
+    executor.shutdown()
+    with pytest.raises(analysis_executor.ExecutorError, match="shut down"):
+        executor.submit("image", b"a")
@@ -0,0 +1,166 @@
+import base64
+import io
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+# /api/analysis/stream with the inline executor: event order, keepalives and cancellation.
+
+
+def upload(seed):
+    pixels = np.random.default_rng(seed).integers(0, 256, (64, 64, 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, "JPEG")
+    return {"fileName": f"{seed}.jpg", "fileType": "image",
+            "fileData": "data:image/jpeg;base64," + base64.b64encode(buf.getvalue()).decode()}
+
+
+def parse(chunk):
+    """(event, data) of one SSE chunk; ("keepalive", None) for comments."""
+    if chunk.startswith(":"):
+        return "keepalive", None
+    event, data = chunk.strip().split("\n", 1)
+    return event[len("event: "):], json.loads(data[len("data: "):])
+
+
+class Stream:
+    def __init__(self, response):
+        self.response = response
+        self._chunks = iter(response.response)
+
+    def next(self):
+        chunk = next(self._chunks)
+        return parse(chunk.decode() if isinstance(chunk, bytes) else chunk)
+
+    def rest(self):
+        return [parse(c.decode() if isinstance(c, bytes) else c) for c in self._chunks]
+
+
+@pytest.fixture
+def gate(server, monkeypatch):
+    """Holds the inline analysis after its first completed check until released."""
+    gate = type("Gate", (), {})()
+    gate.held, gate.release = threading.Event(), threading.Event()
+    run_analysis = server.analysis_executor.run_analysis
+    assert server.analysis_executor.get_executor() is None
+
+    def held_run_analysis(*args, on_event=None, **kwargs):
+        def forward(stage, payload):
+            on_event(stage, payload)
+            if stage == "check" and not gate.held.is_set():
+                gate.held.set()
+                gate.release.wait(10)
+        return run_analysis(*args, on_event=forward, **kwargs)
+
+    monkeypatch.setattr(server.analysis_executor, "run_analysis", held_run_analysis)
+    yield gate
+    gate.release.set()
+
+
+def wait_for_job_end(server, job_id):
+    deadline = time.monotonic() + 10
+    while job_id in server.analysis_jobs and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert job_id not in server.analysis_jobs
+
+
+def test_events_arrive_in_order(server, login):
+    user_id, headers = login("stream-order")
+    client = server.app.test_client()
+    response = client.post("/api/analysis/stream", json=upload(1), headers=headers)
+    assert response.status_code == 200 and response.mimetype == "text/event-stream"
+    assert response.headers["Cache-Control"] == "no-cache"
+
+    events = [parse(chunk + "\n\n") for chunk in response.get_data(as_text=True).strip().split("\n\n")]
+    names = [name for name, _ in events]
+    assert names[0] == "job" and names[1] == "decoded" and names[-1] == "result"
+    assert "check" in names and names.index("verdict") > max(i for i, n in enumerate(names) if n == "check")
+    assert set(names) <= {"job", "decoded", "check", "verdict", "regions", "result"}
+
+    result = events[-1][1]
+    assert result["authenticityLabel"] == dict(events)["verdict"]["label"]
+    assert [a["id"] for a in client.get("/api/analysis", headers=headers).get_json()] == [result["id"]]
+    assert events[0][1]["jobId"] not in server.analysis_jobs
+
+
+def test_keepalives_while_the_analysis_is_busy(server, login, gate, monkeypatch):
+    monkeypatch.setattr(server, "STREAM_KEEPALIVE_SECONDS", 0.05)
+    _, headers = login("stream-keepalive")
+    stream = Stream(server.app.test_client().post("/api/analysis/stream", json=upload(2), headers=headers,
+                                                  buffered=False))
+    assert stream.next()[0] == "job"
+    assert gate.held.wait(10)
+    while stream.next()[0] != "check":
+        pass
+    assert stream.next() == ("keepalive", None)
+    assert stream.next() == ("keepalive", None)
+    gate.release.set()
+    assert [name for name, _ in stream.rest() if name != "keepalive"][-1] == "result"
+
+
+def test_cancel_route_stops_the_remaining_checks(server, login, gate):
+    user_id, headers = login("stream-cancel")
+    _, other = login("stream-cancel-other")
+    client = server.app.test_client()
+    stream = Stream(client.post("/api/analysis/stream", json=upload(3), headers=headers, buffered=False))
+    job_id = stream.next()[1]["jobId"]
+    assert gate.held.wait(10)
+
+    assert client.post(f"/api/analysis/jobs/{job_id}/cancel", headers=other).status_code == 404
+    assert client.post(f"/api/analysis/jobs/{job_id}/cancel").status_code == 401
+    response = client.post(f"/api/analysis/jobs/{job_id}/cancel", headers=headers)
+    assert response.status_code == 202 and response.get_json()["jobId"] == job_id
+    gate.release.set()
+
+    names = [name for name, _ in stream.rest()]
+    assert names[-1] == "cancelled" and "result" not in names and "verdict" not in names
+    assert server.store.list_analyses(user_id) == []
+    wait_for_job_end(server, job_id)
+    assert client.post(f"/api/analysis/jobs/{job_id}/cancel", headers=headers).status_code == 404
+
+
+def test_disconnect_cancels_the_analysis(server, login, gate):
+    user_id, headers = login("stream-disconnect")
+    response = server.app.test_client().post("/api/analysis/stream", json=upload(4), headers=headers,
+                                             buffered=False)
+    stream = Stream(response)
+    job_id = stream.next()[1]["jobId"]
+    assert gate.held.wait(10)
+    cancel = server.analysis_jobs[job_id]["cancel"]
+
+    response.close()  # The generator's finally runs as the client goes away
+    assert cancel.is_set()
+    gate.release.set()
+    wait_for_job_end(server, job_id)
+    assert server.store.list_analyses(user_id) == []
+
+
+def test_non_ascii_profile_token_does_not_leak_the_lease(server, login, monkeypatch):
+    _, headers = login("stream-token")
+    monkeypatch.setattr(server.profiling, "PROFILE_TOKEN", "s3cret")
+    headers = {**headers, server.profiling.PROFILE_HEADER: "sécret"}
+    client = server.app.test_client()
+    for route in ("/api/analysis/stream", "/api/analysis/upload"):
+        response = client.post(route, json=upload(5), headers=headers)
+        assert response.status_code == 200
+        response.get_data()
+        assert server.admission_control.in_flight()[0] == 0
+
+
+def test_lease_is_released_when_the_job_cannot_start(server, login, monkeypatch):
+    _, headers = login("stream-no-thread")
+
+    class Thread:
+        def __init__(self, *args, **kwargs):
+            raise RuntimeError("can't start new thread")
+
+    monkeypatch.setattr(server.threading, "Thread", Thread)
+    jobs = dict(server.analysis_jobs)
+    response = server.app.test_client().post("/api/analysis/stream", json=upload(6), headers=headers)
+    assert response.status_code == 500
+    assert server.admission_control.in_flight()[0] == 0
+    assert server.analysis_jobs == jobs
@@ -0,0 +1,86 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+import audio_fingerprint as af
+
+librosa = pytest.importorskip("librosa")
+
+# Landmark hashing and the owner-scoped inverted index.
+
+
+def voice(seed, seconds=8.0, sr=22050):
+    # Syllable-like bursts: a random pitch per 120 ms with a few harmonics
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sr)
+    seg = int(0.12 * sr)
+    f0 = np.repeat(rng.uniform(110, 260, n // seg + 1), seg)[:n]
+    envelope = np.repeat(rng.uniform(0.2, 1.0, n // seg + 1), seg)[:n]
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    y = sum(rng.uniform(0.2, 1) * np.sin(k * phase) for k in range(1, 8)) * envelope
+    return (y / np.abs(y).max()).astype(np.float32), sr
+
+
+def fingerprint(y, sr):
+    return af.fingerprint_from_stft(np.abs(librosa.stft(y)), sr)
+
+
+@pytest.fixture(scope="module")
+def clip():
+    return voice(1)
+
+
+def test_landmark_hash_layout(clip):
+    landmarks = fingerprint(*clip)
+    assert 0 < len(landmarks) <= af.MAX_HASHES_PER_CLIP + af.FAN_OUT * (af.FAN_OUT - 1) // 2
+    min_band, max_band = int(af.MIN_FREQ_HZ / af.FREQ_STEP_HZ), int(af.MAX_FREQ_HZ / af.FREQ_STEP_HZ)
+    times = [t for _, t in landmarks]
+    assert times == sorted(times)  # Anchors are visited in time order
+    for h, t in landmarks:
+        assert 0 <= h < 1 << 36
+        f1, f2, f3 = h >> 28, (h >> 20) & 0xFF, (h >> 12) & 0xFF
+        dt2, dt3 = (h >> 6) & 0x3F, h & 0x3F
+        assert all(min_band <= f < max_band for f in (f1, f2, f3))
+        assert 0 < dt2 <= dt3 <= af.MAX_DT
+    assert fingerprint(*clip) == landmarks
+
+
+def test_trimmed_reencoded_clip_matches_with_offset(clip, tmp_path):
+    y, sr = clip
+    index = af.AudioFingerprintIndex(str(tmp_path / "fp.db"))
+    index.add(1, fingerprint(y, sr), user_id=10)
+    index.add(2, fingerprint(*voice(2)), user_id=10)
+
+    # Seconds 2-6 of the first clip, resampled to 16 kHz
+    excerpt = librosa.resample(y[2 * sr:6 * sr], orig_sr=sr, target_sr=16000)
+    matches = index.match(fingerprint(excerpt, 16000), user_id=10)
+    assert [m["analysis_id"] for m in matches] == [1]
+    assert matches[0]["score"] >= af.MIN_MATCH_SCORE
+    assert matches[0]["offset_seconds"] == pytest.approx(2.0, abs=0.1)
+    assert 0 < matches[0]["coverage"] <= 1
+
+    assert index.match(fingerprint(*voice(3)), user_id=10) == []
+    assert index.match([], user_id=10) == []
+
+
+def test_matches_are_scoped_to_the_uploader_and_purged_on_remove(clip, tmp_path):
+    db = str(tmp_path / "fp.db")
+    index = af.AudioFingerprintIndex(db)
+    landmarks = fingerprint(*clip)
+    index.add(1, landmarks, user_id=10)
+    index.add(2, landmarks, user_id=20)
+    index.add(3, [], user_id=10)  # Nothing to index
+
+    assert [m["analysis_id"] for m in index.match(landmarks, user_id=10)] == [1]
+    assert [m["analysis_id"] for m in index.match(landmarks, user_id=20)] == [2]
+    assert index.match(landmarks, user_id=30) == []
+
+    index.remove(1)
+    index.remove(99)
+    assert index.match(landmarks, user_id=10) == []
+    assert [m["analysis_id"] for m in index.match(landmarks, user_id=20)] == [2]
+    conn = sqlite3.connect(db)
+    assert conn.execute("SELECT COUNT(*) FROM audio_landmarks WHERE analysis_id = 1").fetchone()[0] == 0
+    assert conn.execute("SELECT analysis_id FROM audio_fingerprint_clips").fetchall() == [(2,)]
+    conn.close()
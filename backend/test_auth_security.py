@@ -0,0 +1,86 @@
+import threading
+
+import pytest
+
+import auth_security
+from auth_security import AttemptLimiter
+
+# Sliding-window attempt limits and the bounded password-hashing pool.
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(auth_security.time, "monotonic", clock)
+    return clock
+
+
+def test_limit_within_window(clock):
+    limiter = AttemptLimiter(limit=3, window=60)
+    for _ in range(3):
+        assert limiter.retry_after("1.2.3.4") == 0
+        limiter.hit("1.2.3.4")
+        clock.now += 10
+    # Oldest hit (t=1000) leaves the window at t=1060; now is 1030
+    assert limiter.retry_after("1.2.3.4") == 31
+    assert limiter.retry_after("5.6.7.8") == 0
+
+    clock.now = 1060
+    assert limiter.retry_after("1.2.3.4") == 0  # Sliding: one hit has expired
+    limiter.hit("1.2.3.4")
+    assert limiter.retry_after("1.2.3.4") == 11
+
+
+def test_reset_clears_a_key(clock):
+    limiter = AttemptLimiter(limit=1, window=60)
+    limiter.hit("alice")
+    assert limiter.retry_after("alice") > 0
+    limiter.reset("alice")
+    limiter.reset("nobody")
+    assert limiter.retry_after("alice") == 0
+
+
+def test_expired_keys_are_dropped_at_capacity(clock):
+    limiter = AttemptLimiter(limit=5, window=60, max_keys=3)
+    for key in ("a", "b", "c"):
+        limiter.hit(key)
+    clock.now += 30
+    limiter.hit("c")
+    clock.now += 40  # a and b expired, c was hit 40 s ago
+    limiter.hit("d")
+    assert set(limiter._hits) == {"c", "d"}
+
+
+def test_hash_verify_and_rehash(monkeypatch):
+    monkeypatch.setattr(auth_security, "PASSWORD_HASH_METHOD", "pbkdf2:sha256:1000")
+    monkeypatch.setattr(auth_security, "_method_prefix", None)
+    stored = auth_security.hash_password("secret")
+    assert stored.startswith("pbkdf2:sha256:1000$")
+    assert auth_security.verify_password(stored, "secret")
+    assert not auth_security.verify_password(stored, "wrong")
+    assert not auth_security.needs_rehash(stored)
+    assert auth_security.needs_rehash(stored.replace(":1000$", ":2000$", 1))
+
+
+def test_hashing_busy_when_queue_is_full(monkeypatch):
+    monkeypatch.setattr(auth_security, "_slots", threading.BoundedSemaphore(1))
+    monkeypatch.setattr(auth_security, "HASH_WAIT_SECONDS", 0.05)
+    started, release = threading.Event(), threading.Event()
+    holder = threading.Thread(target=auth_security._run, args=(lambda: started.set() or release.wait(),))
+    holder.start()
+    started.wait(5)  # The holder's hash is running and owns the only slot
+    try:
+        with pytest.raises(auth_security.HashingBusy):
+            auth_security._run(lambda: None)
+    finally:
+        release.set()
+        holder.join()
+    assert auth_security._run(lambda: 42) == 42  # The slot is released when the hash completes
@@ -0,0 +1,125 @@
+import io
+import json
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import batch_scan
+import storage
+from batch_scan import JsonlSink, SqliteSink, detect_type
+
+# The offline scanner over a small tree with one worker: type sniffing, resume and de-duplication.
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def png(seed):
+    buf = io.BytesIO()
+    Image.fromarray(np.random.default_rng(seed).integers(0, 256, (64, 64, 3), dtype=np.uint8)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("data, expected", [
+    (b"\xff\xd8\xff\xe0rest", ("image", "image/jpeg")),
+    (b"\x89PNG\r\n\x1a\nrest", ("image", "image/png")),
+    (b"GIF89a", ("image", "image/gif")),
+    (b"RIFF\x00\x00\x00\x00WEBPVP8 ", ("image", "image/webp")),
+    (b"RIFF\x00\x00\x00\x00WAVEfmt ", ("audio", "audio/wav")),
+    (b"fLaC\x00", ("audio", "audio/flac")),
+    (b"ID3\x04", ("audio", "audio/mpeg")),
+    (b"\xff\xfb\x90\x00", ("audio", "audio/mpeg")),  # Bare MPEG frame
+    (b"\x00\x00\x00\x20ftypM4A ", ("audio", "audio/mp4")),
+    (b"PK\x03\x04", (None, None)),
+])
+def test_detect_type_by_magic_bytes(tmp_path, data, expected):
+    assert detect_type(write(tmp_path / "file.bin", data)) == expected
+
+
+def test_detect_type_sniffs_text(tmp_path):
+    assert detect_type(write(tmp_path / "a.txt", "plain words".encode())) == ("text", "text/plain")
+    # A multi-byte character cut by the 512-byte sniff window is still UTF-8
+    assert detect_type(write(tmp_path / "b.md", ("a" * 511 + "é").encode())) == ("text", "text/plain")
+    assert detect_type(write(tmp_path / "c.txt", b"latin-1 caf\xe9 au lait")) == (None, None)
+    assert detect_type(write(tmp_path / "d.txt", b"nul\x00byte")) == (None, None)
+    assert detect_type(write(tmp_path / "e.csv", b"plain,words")) == (None, None)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "archive"
+    write(root / "a" / "1.png", png(1))
+    write(root / "a" / "2.png", png(2))
+    write(root / "b" / "3.png", png(3))
+    write(root / "b" / "notes.bin", b"PK\x03\x04")   # Unsupported: checkpointed, never retried
+    write(root / "broken.jpg", b"\xff\xd8\xff\xe0" + b"\x00" * 64)  # Fails: retried on every run
+    return str(root)
+
+
+def lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_jsonl_scan_resumes_from_the_checkpoint(tree, tmp_path):
+    output, checkpoint = str(tmp_path / "out.jsonl"), str(tmp_path / "out.checkpoint")
+    write(checkpoint, b"a/1.png\n")  # Completed by an earlier run
+    errors = io.StringIO()
+
+    progress = batch_scan.scan(tree, JsonlSink(output), checkpoint, workers=1, batch_size=1, errors=errors)
+    assert (progress.done, progress.skipped, progress.errors) == (2, 1, 1)
+    assert sorted(r["path"] for r in lines(output)) == ["a/2.png", "b/3.png"]
+    assert lines(output)[0]["details"]["checks"] and lines(output)[0]["fileType"] == "image"
+    assert json.loads(errors.getvalue())["path"] == "broken.jpg"
+    assert sorted(batch_scan.load_checkpoint(checkpoint)) == ["a/1.png", "a/2.png", "b/3.png", "b/notes.bin"]
+
+    write(os.path.join(tree, "c", "4.png"), png(4))
+    progress = batch_scan.scan(tree, JsonlSink(output), checkpoint, workers=1)
+    assert (progress.done, progress.skipped, progress.errors) == (1, 0, 1)
+    assert [r["path"] for r in lines(output)] == ["a/2.png", "b/3.png", "c/4.png"]
+
+
+def test_jsonl_sink_drops_a_torn_line(tmp_path):
+    output = str(tmp_path / "out.jsonl")
+    write(output, b'{"path": "a.png"}\n{"path": "b.png"}\nnot json\n{"path": "c.p')
+    sink = JsonlSink(output)
+    assert sink.completed("root") == {"a.png", "b.png"}
+    with open(output, "rb") as f:
+        assert f.read() == b'{"path": "a.png"}\n{"path": "b.png"}\nnot json\n'
+    sink._lines.append('{"path": "d.png"}\n')
+    sink.flush()
+    sink.close()
+    assert JsonlSink(output).completed("root") == {"a.png", "b.png", "d.png"}
+
+
+def test_sqlite_sink_never_inserts_a_file_twice(tree, tmp_path):
+    db, checkpoint = str(tmp_path / "database.db"), str(tmp_path / "db.checkpoint")
+    store = storage.SQLiteStorage(db)
+    store.init_schema()
+    user_id = store.create_user("scanner", "h")
+
+    progress = batch_scan.scan(tree, SqliteSink(db, user_id, store_media=False), checkpoint, workers=1)
+    assert progress.done == 3
+    # A crash between the commit and the checkpoint write: the sink still knows its files
+    os.remove(checkpoint)
+    progress = batch_scan.scan(tree, SqliteSink(db, user_id, store_media=False), checkpoint, workers=1)
+    assert (progress.done, progress.skipped, progress.errors) == (0, 1, 1)
+
+    conn = sqlite3.connect(db)
+    rows = conn.execute("SELECT id, user_id, file_name, file_url FROM analysis_results ORDER BY file_name").fetchall()
+    assert [(r[1], r[2], r[3]) for r in rows] == [(user_id, "1.png", None), (user_id, "2.png", None),
+                                                  (user_id, "3.png", None)]
+    ids = sorted(r[0] for r in rows)
+    assert sorted(conn.execute("SELECT path FROM batch_scan_files WHERE root = ?", (os.path.abspath(tree),))) == [
+        ("a/1.png",), ("a/2.png",), ("b/3.png",)]
+    assert sorted(conn.execute("SELECT analysis_id, user_id FROM image_hashes")) == [(i, user_id) for i in ids]
+    assert conn.execute("SELECT COUNT(DISTINCT analysis_id) FROM forensic_checks").fetchone() == (3,)
+    assert conn.execute("SELECT count FROM rollup_counters WHERE name = 'analyses' AND bucket = 'image'").fetchone() == (3,)
+    conn.close()
@@ -0,0 +1,136 @@
+import json
+import random
+
+import pytest
+
+import analysis_logic  # Registers the checks
+import calibration
+from calibration import NEGATIVE, POSITIVE, QuantileSketch
+
+# Quantile sketches, ROC fitting and profile evaluation on synthetic samples.
+
+
+def ela_sample(value):
+    return [("ELA Uniformity", "FAIL" if value < 1.5 else "PASS", {"ela_std": value})]
+
+
+def calibrator_with(synthetic, organic):
+    calibrator = calibration.Calibrator()
+    for value in synthetic:
+        calibrator.add("image", POSITIVE, ela_sample(value))
+    for value in organic:
+        calibrator.add("image", NEGATIVE, ela_sample(value))
+    return calibrator
+
+
+def test_sketch_quantiles_are_within_relative_accuracy():
+    rng = random.Random(1)
+    values = [rng.lognormvariate(0, 2) for _ in range(20000)]
+    sketch = QuantileSketch(accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+    ordered = sorted(values)
+    for q in (0.01, 0.25, 0.5, 0.9, 0.999):
+        exact = ordered[int(q * (len(values) - 1))]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.021)
+    assert len(sketch.positive) < 2000
+    assert (sketch.min, sketch.max) == (min(values), max(values))
+
+
+def test_sketch_handles_signs_zero_and_merge():
+    left, right = QuantileSketch(), QuantileSketch()
+    for value in (-3.0, -1.0, 0.0):
+        left.add(value)
+    for value in (1.0, 3.0):
+        right.add(value)
+    left.merge(right)
+    assert left.count == 5
+    assert [round(v, 1) for v, _ in left.items()] == [-3.0, -1.0, 0.0, 1.0, 3.0]
+    assert left.quantile(0.5) == 0.0
+    assert left.count_below(0.5) == 3
+    with pytest.raises(ValueError):
+        left.merge(QuantileSketch(accuracy=0.05))
+
+
+def test_sketch_collapses_smallest_buckets():
+    sketch = QuantileSketch(accuracy=0.01, max_buckets=50)
+    for i in range(1, 1000):
+        sketch.add(i / 10)
+    assert len(sketch.positive) == 50
+    assert sketch.count == 999
+    assert sketch.quantile(0.99) == pytest.approx(98.9, rel=0.02)  # Large values keep their precision
+
+
+def test_roc_curve_and_auc():
+    calibrator = calibrator_with([0.5, 1.0, 2.0], [3.0, 4.0, 6.0])
+    sketches = calibrator.sketches[("image.ela", "min_std")]
+    points = calibration.roc_curve(sketches[POSITIVE], sketches[NEGATIVE], "below")
+    assert all(a[0] < b[0] for a, b in zip(points, points[1:]))
+    assert calibration.auc(points) == pytest.approx(1.0)
+    assert calibration.choose(points)[1:] == (1.0, 0.0)
+
+    above = calibration.roc_curve(sketches[POSITIVE], sketches[NEGATIVE], "above")
+    assert calibration.auc(above) == pytest.approx(0.0)
+
+
+def test_choose_respects_max_fpr():
+    points = [(1.0, 0.5, 0.0), (2.0, 0.8, 0.05), (3.0, 0.95, 0.15)]
+    assert calibration.choose(points)[0] == 3.0  # Best TPR - FPR
+    assert calibration.choose(points, max_fpr=0.1)[0] == 2.0
+    assert calibration.choose(points, max_fpr=-1) is None
+
+
+def test_fit_moves_threshold_between_classes(tmp_path):
+    rng = random.Random(7)
+    calibrator = calibrator_with([rng.uniform(0.5, 2.5) for _ in range(200)],
+                                 [rng.uniform(3.0, 8.0) for _ in range(200)])
+    thresholds, report = calibration.fit(calibrator)
+
+    fitted = thresholds["image.ela"]["min_std"]
+    assert 2.4 < fitted < 3.1
+    entry = report["image.ela.min_std"]
+    assert entry["previous"] == 1.5 and entry["previousTpr"] < 0.6
+    assert (entry["tpr"], entry["fpr"]) == (1.0, 0.0)
+
+    first = calibration.write_profile(str(tmp_path), thresholds, report, calibrator.samples, "youden")
+    second = calibration.write_profile(str(tmp_path), thresholds, report, calibrator.samples, "youden")
+    assert [p.rsplit("/", 1)[-1] for p in (first, second)] == ["v1.json", "v2.json"]
+    with open(second) as f:
+        profile = json.load(f)
+    assert profile["version"] == 2 and profile["thresholds"] == thresholds
+    assert profile["samples"] == {"image:organic": 200, "image:synthetic": 200}
+
+
+def test_fit_keeps_thresholds_without_enough_samples_or_gain():
+    thresholds, report = calibration.fit(calibrator_with([0.5] * 5, [4.0] * 5))
+    assert thresholds == {} and "fewer than" in report["image.ela.min_std"]["skipped"]
+
+    # The registered 1.5 already separates these perfectly
+    thresholds, report = calibration.fit(calibrator_with([0.5] * 30, [4.0] * 30))
+    assert thresholds == {} and report["image.ela.min_std"]["skipped"] == "registered threshold is as good"
+
+
+def test_evaluate_compares_profiles():
+    samples = [("image", POSITIVE, ela_sample(2.0)), ("image", NEGATIVE, ela_sample(4.0))]
+    results = calibration.evaluate(samples, {"registered": {}, "strict": {"image.ela": {"min_std": 3.0}}})
+    registered = calibration.summarize(results["registered"])
+    strict = calibration.summarize(results["strict"])
+    assert registered["checks"] == [{"fileType": "image", "name": "ELA Uniformity", "tpr": 0.0, "fpr": 0.0}]
+    assert strict["checks"] == [{"fileType": "image", "name": "ELA Uniformity", "tpr": 1.0, "fpr": 0.0}]
+
+
+def test_labels_and_scan_samples(tmp_path):
+    labels = tmp_path / "labels.csv"
+    labels.write_text("key,label\n12,fake\nmisc/a.png,Real\n13,unknown\n")
+    assert calibration.read_labels(str(labels)) == {"12": POSITIVE, "misc/a.png": NEGATIVE}
+
+    scan = tmp_path / "scan.jsonl"
+    rows = [{"path": "synthetic/x.png", "fileType": "image", "details": {"checks": [
+                {"name": "ELA Uniformity", "status": "FAIL", "metrics": {"ela_std": 1.0}}]}},
+            {"path": "misc/a.png", "fileType": "image", "details": {"checks": []}},
+            {"path": "misc/b.png", "fileType": "image", "details": {"checks": []}},
+            {"path": "organic/t.txt", "fileType": "text", "details": {"checks": []}}]
+    scan.write_text("".join(json.dumps(r) + "\n" for r in rows))
+    samples = list(calibration.scan_samples(str(scan), {"misc/a.png": NEGATIVE}, "image"))
+    assert samples == [("image", POSITIVE, [("ELA Uniformity", "FAIL", {"ela_std": 1.0})]),
+                       ("image", NEGATIVE, [])]
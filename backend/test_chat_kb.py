@@ -0,0 +1,102 @@
+import pytest
+
+import chat_kb
+from chat_kb import KnowledgeBase, LastAnalysisCache
+
+# Knowledge-base ranking and the per-user latest-analysis cache.
+
+ENTRIES = [
+    {"id": "ela", "keywords": ["error level", "ela", "compression"], "reply": "ela"},
+    {"id": "noise", "keywords": ["sensor noise", "noise"], "reply": "noise"},
+    {"id": "level", "keywords": ["level"], "reply": "level"},
+    {"id": "pinned", "keywords": ["verdict"], "reply": "verdict", "boost": 3.0},
+    {"id": "verdict", "keywords": ["verdict"], "reply": "plain verdict"},
+]
+
+
+def ids(ranked):
+    return [entry["id"] for _, entry in ranked]
+
+
+def test_terms_drop_stopwords_but_keep_bigrams():
+    assert chat_kb.tokenize("What is the E.L.A. level?") == ["what", "is", "the", "e", "l", "a", "level"]
+    assert chat_kb.terms(["what", "is", "the", "verdict"]) == ["verdict", "what is", "is the", "the verdict"]
+
+
+def test_rank_prefers_bigrams_rare_terms_and_boosts():
+    kb = KnowledgeBase(ENTRIES, "fallback")
+    # "error level" matches a bigram of the ela entry; "level" alone is shared by two entries
+    assert ids(kb.rank("how does error level analysis work")) == ["ela", "level"]
+    assert ids(kb.rank("is there sensor noise")) == ["noise"]
+    assert ids(kb.rank("why this verdict")) == ["pinned", "verdict"]
+    assert kb.match("Compression compression COMPRESSION")["id"] == "ela"
+    scores = [score for score, _ in kb.rank("compression compression")]
+    assert scores == [score for score, _ in kb.rank("compression")]  # Repeats count once
+    assert kb.rank("the of and") == [] and kb.match("hello there") is None
+    assert len(kb.rank("error level noise verdict", limit=2)) == 2
+
+
+def test_min_score_filters_weak_matches(monkeypatch):
+    kb = KnowledgeBase(ENTRIES, "fallback")
+    monkeypatch.setattr(chat_kb, "MIN_SCORE", 100)
+    assert kb.rank("error level") == []
+
+
+def test_shipped_knowledge_base_loads():
+    kb = KnowledgeBase.load()
+    assert kb.fallback and all(entry.get("reply") or entry.get("intent") for entry in kb.entries)
+    assert kb.match("was this image a near duplicate of an earlier upload?")["id"] == "near_duplicate"
+    assert kb.match("show my last analysis results")["intent"] == "history"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(chat_kb.time, "monotonic", clock)
+    return clock
+
+
+def test_cache_loads_once_per_ttl(clock):
+    loads = []
+    cache = LastAnalysisCache(lambda user_id: loads.append(user_id) or {"fileName": f"{user_id}.png"}, ttl=60)
+    assert cache.get(1) == {"fileName": "1.png"}
+    clock.now += 59
+    assert cache.get(1) == {"fileName": "1.png"}
+    assert loads == [1]
+    clock.now += 1  # Expired: uploads through other workers show up
+    cache.get(1)
+    assert loads == [1, 1]
+
+
+def test_cache_put_refreshes_and_invalidate_reloads(clock):
+    loads = []
+    cache = LastAnalysisCache(lambda user_id: loads.append(user_id), ttl=60)
+    assert cache.get(1) is None  # Users without analyses are cached too
+    cache.get(1)
+    assert loads == [1]
+
+    clock.now += 50
+    cache.put(1, {"fileName": "new.png"})
+    clock.now += 50  # 100 s after the load, 50 s after the put
+    assert cache.get(1) == {"fileName": "new.png"} and loads == [1]
+
+    cache.invalidate(1)
+    cache.invalidate(2)
+    assert cache.get(1) is None and loads == [1, 1]
+
+
+def test_cache_evicts_oldest_user_at_capacity(clock):
+    cache = LastAnalysisCache(lambda user_id: None, ttl=60, max_users=2)
+    cache.put(1, "a")
+    cache.put(2, "b")
+    cache.put(2, "b2")  # Updating a cached user evicts nobody
+    cache.put(3, "c")
+    assert set(cache._entries) == {2, 3}
@@ -0,0 +1,49 @@
+import json
+import struct
+
+import pytest
+
+import analysis_logic
+from analysis_logic import ForensicCheck, pack_checks, unpack_checks
+
+# Round trips of the binary check codec stored in analysis_results.checks.
+
+
+def test_round_trip_keeps_every_field():
+    checks = [
+        ForensicCheck("ELA Uniformity", "Error level analysis.", "PASS", "Std 4.2 (min 2.0)",
+                      metrics={"ela_std": 4.2, "tile": 1}),
+        ForensicCheck("Breath Gaps", "Pauses between phrases.", "FAIL", {"gaps": [0.2, 0.4], "note": "ünïcode"},
+                      metrics={"mean_gap": 0.3, "duration": float("nan")}),
+        ForensicCheck("Legacy", "", "SKIPPED", ""),
+    ]
+    decoded = unpack_checks(pack_checks(checks))
+
+    assert [c.to_dict() for c in decoded] == [c.to_dict() for c in checks]
+    assert decoded[1].metrics["duration"] is None  # NaN is stored as null
+    assert decoded[2].status == "SKIPPED" and decoded[2].metrics == {}
+
+
+def test_empty_blobs():
+    assert unpack_checks(None) == []
+    assert unpack_checks(b"") == []
+    assert unpack_checks(pack_checks([])) == []
+
+
+def test_reads_version_1_blobs_without_metrics():
+    # Version 1: header, then status, name, description, details flag and details
+    name, description, details = b"Entropy", b"Character entropy.", json.dumps({"entropy": 4.1}).encode()
+    blob = (struct.pack("<BH", 1, 1) + b"\x01"
+            + struct.pack("<H", len(name)) + name
+            + struct.pack("<H", len(description)) + description
+            + b"\x01" + struct.pack("<I", len(details)) + details)
+
+    (check,) = unpack_checks(blob)
+    assert (check.name, check.status, check.details, check.metrics) == ("Entropy", "FAIL", {"entropy": 4.1}, {})
+
+
+def test_unknown_version_is_rejected():
+    blob = bytearray(pack_checks([ForensicCheck("A", "", "PASS")]))
+    blob[0] = analysis_logic._CHECK_CODEC_VERSION + 1
+    with pytest.raises(ValueError):
+        unpack_checks(bytes(blob))
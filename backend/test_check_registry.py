@@ -0,0 +1,138 @@
+import json
+
+import pytest
+
+import check_registry
+from check_registry import CheckContext, register_check, register_input, register_judge
+
+# Cost-ordered scheduling, lazy inputs and fast/full evaluation on a throwaway media type.
+
+MEDIA = "registry-test"
+CONFIG = {"disabled": set(), "enabled": set(), "mode": "full"}
+
+
+@pytest.fixture
+def calls():
+    calls = []
+
+    @register_input(MEDIA, "decoded", cost=5)
+    def _decoded(ctx):
+        calls.append("decoded")
+        return ctx["raw"] * 2
+
+    @register_input(MEDIA, "spectrum", cost=20, requires=("decoded",))
+    def _spectrum(ctx):
+        calls.append("spectrum")
+        return ctx["decoded"] + 1
+
+    def add(key, cost, inputs, value, decisive=False):
+        @register_check(MEDIA, key, key.title(), "", cost=cost, inputs=inputs, thresholds={"limit": 10})
+        def _measure(ctx):
+            calls.append(key)
+            for name in inputs:
+                ctx[name]
+            return {"value": value, "decisive": int(decisive)}
+
+        @register_judge(MEDIA, key)
+        def _judge(m, t):
+            return m["value"] > t["limit"], f"{key} {m['value']}"
+
+    add("spectral", 1, ("spectrum",), 50)       # 1 + 20 + 5
+    add("header", 0, (), 0)
+    add("pixels", 3, ("decoded",), 20)          # 3 + 5, then 3 once decoded
+    add("container", 2, (), 99, decisive=True)
+    add("texture", 4, ("decoded",), 30)
+
+    yield calls
+    check_registry._CHECKS.pop(MEDIA, None)
+    check_registry._INPUTS.pop(MEDIA, None)
+
+
+def run(mode, decided=None, **kwargs):
+    ctx = CheckContext(MEDIA, raw=1)
+    return check_registry.run_checks(ctx, mode=mode, is_decided=decided, config=CONFIG, **kwargs)
+
+
+def test_full_mode_runs_cheapest_pending_cost_first(calls):
+    outcomes, skipped = run("full")
+    assert calls == ["header", "container", "pixels", "decoded", "texture", "spectral", "spectrum"]
+    assert skipped == []
+    # Outcomes come back in registration order
+    assert [spec.key for spec, *_ in outcomes] == ["spectral", "header", "pixels", "container", "texture"]
+    assert [failed for _, failed, *_ in outcomes] == [True, False, True, True, True]
+
+
+def test_fast_mode_stops_once_decided(calls):
+    outcomes, skipped = run("fast", lambda failed, remaining, decisive: failed >= 2)
+    assert [spec.key for spec, *_ in outcomes] == ["header", "pixels", "container"]
+    assert [spec.key for spec in skipped] == ["spectral", "texture"]
+    assert "spectrum" not in calls  # Inputs of skipped checks are never computed
+
+
+def test_decisive_failure_is_reported_to_is_decided(calls):
+    seen = []
+
+    def decided(failed, remaining, decisive):
+        seen.append((failed, remaining, decisive))
+        return decisive
+
+    outcomes, skipped = run("fast", decided)
+    assert seen == [(0, 4, False), (1, 3, True)]
+    assert len(outcomes) == 2 and len(skipped) == 3
+
+
+def test_full_mode_ignores_is_decided(calls):
+    outcomes, skipped = run("full", lambda *args: True)
+    assert len(outcomes) == 5 and skipped == []
+
+
+def test_threshold_overrides(calls):
+    outcomes, _ = run("full", thresholds={f"{MEDIA}.texture": {"limit": 40}})
+    failed = {spec.key: failed for spec, failed, _, _ in outcomes}
+    assert failed["texture"] is False
+    assert failed["pixels"] is True  # Other checks keep the registered limit
+    assert outcomes[0][2:] == ("spectral 50", {"value": 50, "decisive": 0})
+
+
+def test_results_are_reported_as_checks_complete(calls):
+    results = []
+    run("full", on_result=lambda spec, failed, details, metrics: results.append((spec.key, failed)))
+    assert results == [("header", False), ("container", True), ("pixels", True), ("texture", True),
+                       ("spectral", True)]
+
+
+def test_cancel_stops_before_the_next_check(calls):
+    class CancelAfter:
+        def __init__(self, n):
+            self.n = n
+
+        def is_set(self):
+            self.n -= 1
+            return self.n < 0
+
+    with pytest.raises(check_registry.EvaluationCancelled):
+        run("full", cancel=CancelAfter(2))
+    assert calls == ["header", "container"]
+
+
+def test_enabled_and_disabled_checks(calls):
+    config = {"disabled": {f"{MEDIA}.pixels"}, "enabled": set(), "mode": "full"}
+    assert [s.key for s in check_registry.enabled_checks(MEDIA, config)] == ["spectral", "header", "container",
+                                                                             "texture"]
+    config = {"disabled": set(), "enabled": {f"{MEDIA}.header"}, "mode": "fast"}
+    assert [s.key for s in check_registry.enabled_checks(MEDIA, config)] == ["header"]
+
+
+def test_threshold_profiles(calls, tmp_path):
+    for version, limit in ((1, 5), (2, 7), (10, 9)):
+        (tmp_path / f"v{version}.json").write_text(json.dumps({
+            "version": version,
+            "thresholds": {f"{MEDIA}.pixels": {"limit": limit, "unknown": 1}, "image.nope": {"x": 1}},
+        }))
+    (tmp_path / "notes.txt").write_text("ignored")
+
+    profile = check_registry.load_threshold_profile(str(tmp_path))
+    assert profile["version"] == 10 and profile["path"].endswith("v10.json")
+    assert profile["thresholds"] == {f"{MEDIA}.pixels": {"limit": 9}}
+    assert check_registry.load_threshold_profile(str(tmp_path / "missing.json")) is None
+    assert check_registry.load_threshold_profile(str(tmp_path / "empty")) is None
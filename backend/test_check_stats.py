@@ -0,0 +1,136 @@
+import json
+import sqlite3
+
+import pytest
+
+import analysis_logic
+import check_stats
+import storage
+from analysis_logic import ForensicCheck
+
+# Per-check analytics rows, their backfill from stored analyses and the aggregates.
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    check_stats.init_table(conn)
+    yield conn
+    conn.close()
+
+
+def check(name, status, metric=None, **metrics):
+    return ForensicCheck(name, "", status, "", metrics=metrics, metric=metric)
+
+
+def rows(conn):
+    return conn.execute("SELECT analysis_id, file_type, name, status, metric FROM forensic_checks "
+                        "ORDER BY analysis_id, name").fetchall()
+
+
+def test_record_replace_and_remove(conn):
+    check_stats.record(conn, 1, "image", [check("ELA Uniformity", "FAIL", 0.8, ela_std=0.8),
+                                          check("Metadata", "PASS", float("nan"))])
+    check_stats.record(conn, 2, "audio", [check("Spectral Flatness", "PASS", None, mean_flatness=0.01)],
+                       created_at="2026-01-02 03:04:05")
+    assert rows(conn) == [(1, "image", "ELA Uniformity", "FAIL", 0.8), (1, "image", "Metadata", "PASS", None),
+                          (2, "audio", "Spectral Flatness", "PASS", None)]
+    assert conn.execute("SELECT created_at FROM forensic_checks WHERE analysis_id = 2").fetchone() == ("2026-01-02 03:04:05",)
+
+    # Re-recording an analysis replaces its rows
+    check_stats.record(conn, 1, "image", [check("ELA Uniformity", "PASS", 2.0, ela_std=2.0)])
+    assert list(check_stats.iter_stored_checks(conn, file_type="image")) == [
+        (1, "image", [("ELA Uniformity", "PASS", {"ela_std": 2.0}), ("Metadata", "PASS", {})])]
+
+    check_stats.remove(conn, 1)
+    assert [r[0] for r in rows(conn)] == [2]
+    assert conn.execute("SELECT analysis_id FROM forensic_check_metrics").fetchall() == [(2,)]
+
+
+def test_metric_from_legacy_messages():
+    assert check_stats.metric_from_message("ELA Variance exceptionally low (Calculated: 1.23).") == 1.23
+    assert check_stats.metric_from_message("Avg Correlation: 0.9912") == 0.9912
+    assert check_stats.metric_from_message("Avg Correlation: nan") is None
+    assert check_stats.metric_from_message("Entropy: 4.10 bits") == 4.1
+    assert check_stats.metric_from_message("Spectral flatness near zero (0.000100). Lacks noise.") == 0.0001
+    assert check_stats.metric_from_message("Natural frequency rolloff detected (Cutoff ~11025Hz).") == 11025
+    assert check_stats.metric_from_message("Hard frequency cutoff detected at 16000Hz. Upsampled.") == 16000
+    assert check_stats.metric_from_message("Valid") is None
+    assert check_stats.metric_from_message(None) is None
+
+
+def analysis(file_type, schema_version, checks=b"", details=None):
+    return {"user_id": 1, "file_name": "f", "file_url": None, "file_type": file_type,
+            "sentiment_label": "N/A", "sentiment_score": 0, "authenticity_label": "Likely Organic",
+            "authenticity_score": 85, "details": json.dumps(details or {}),
+            "schema_version": schema_version, "checks": checks}
+
+
+def test_backfill_current_and_legacy_analyses(conn, tmp_path):
+    store = storage.SQLiteStorage(str(tmp_path / "store.db"))
+    store.init_schema()
+    packed = analysis_logic.pack_checks([check("ELA Uniformity", "FAIL", ela_std=0.8)])
+    legacy_checks = [
+        {"name": "ELA Uniformity", "status": "FAIL", "details": "ELA Variance exceptionally low (Calculated: 1.25)."},
+        {"name": "Color Channel Correlation", "status": "PASS", "details": "Avg Correlation: nan"},
+        {"name": "Retired Check", "status": "PASS", "details": "Calculated: 3.0"},
+    ]
+    current = store.insert_analysis(analysis("image", analysis_logic.RESULT_SCHEMA_VERSION, packed))
+    legacy = store.insert_analysis(analysis("image", None, details={"checks": legacy_checks}))
+    audio = store.insert_analysis(analysis("audio", None, details={"checks": [
+        {"name": "High-Frequency Cutoff", "status": "FAIL", "details": "Hard frequency cutoff detected at 16000Hz."}]}))
+    corrupt = store.insert_analysis(analysis("image", analysis_logic.RESULT_SCHEMA_VERSION, b"\x63\x00\x00"))  # Unknown codec version
+    done = store.insert_analysis(analysis("image", analysis_logic.RESULT_SCHEMA_VERSION, packed))
+    check_stats.record(conn, done, "image", [check("Kept", "PASS")])
+
+    assert check_stats.backfill(conn, store, batch_size=2) == 3
+    assert rows(conn) == [
+        (current, "image", "ELA Uniformity", "FAIL", 0.8),
+        (legacy, "image", "Color Channel Correlation", "PASS", None),
+        (legacy, "image", "ELA Uniformity", "FAIL", 1.25),
+        (legacy, "image", "Retired Check", "PASS", None),  # Unregistered: no metric key to fill
+        (audio, "audio", "High-Frequency Cutoff", "FAIL", 16000.0),
+        (done, "image", "Kept", "PASS", None),
+    ]
+    assert corrupt not in {r[0] for r in rows(conn)}
+    assert dict(((r[0], r[1]), r[2]) for r in conn.execute(
+        "SELECT analysis_id, metric_key, value FROM forensic_check_metrics")) == {
+        (current, "ela_std"): 0.8, (legacy, "ela_std"): 1.25, (audio, "cutoff_hz"): 16000.0}
+    assert check_stats.backfill(conn, store) == 0
+
+
+def test_failure_rates_and_metric_distribution(conn):
+    for i in range(1, 11):
+        check_stats.record(conn, i, "image", [check("ELA", "FAIL" if i <= 3 else "PASS", float(i)),
+                                              check("Metadata", "FAIL" if i <= 8 else "PASS")],
+                           created_at=f"2026-01-{i:02d} 00:00:00")
+    check_stats.record(conn, 11, "audio", [check("ELA", "PASS", 100.0)], created_at="2026-01-11 00:00:00")
+
+    rates = check_stats.failure_rates(conn, file_type="image")
+    assert [(r["name"], r["total"], r["failed"], r["failureRate"]) for r in rates] == [
+        ("Metadata", 10, 8, 0.8), ("ELA", 10, 3, 0.3)]
+    assert (rates[1]["avgMetric"], rates[1]["minMetric"], rates[1]["maxMetric"]) == (5.5, 1.0, 10.0)
+    assert rates[0]["avgMetric"] is None
+    assert len(check_stats.failure_rates(conn)) == 3
+    since = check_stats.failure_rates(conn, file_type="image", since="2026-01-06", until="2026-01-10")
+    assert [(r["name"], r["total"], r["failed"]) for r in since] == [("Metadata", 4, 3), ("ELA", 4, 0)]
+
+    dist = check_stats.metric_distribution(conn, "ELA", file_type="image", buckets=3)
+    assert (dist["count"], dist["min"], dist["max"]) == (10, 1.0, 10.0)
+    assert [(b["from"], b["to"], b["count"], b["failed"]) for b in dist["histogram"]] == [
+        (1.0, 4.0, 3, 3), (4.0, 7.0, 3, 0), (7.0, 10.0, 4, 0)]  # The maximum falls in the last bucket
+    assert dist["quantiles"] == {"p25": 3.0, "p50": 5.0, "p75": 7.0}
+    assert check_stats.metric_distribution(conn, "Metadata") == {
+        "name": "Metadata", "count": 0, "histogram": [], "quantiles": {}}
+
+
+def test_open_analytics_refuses_a_database_without_the_table(tmp_path):
+    with pytest.raises(ValueError):
+        check_stats.open_analytics(str(tmp_path / "missing.db"))
+    sqlite3.connect(str(tmp_path / "empty.db")).close()
+    with pytest.raises(ValueError):
+        check_stats.open_analytics(str(tmp_path / "empty.db"))
+    conn = sqlite3.connect(str(tmp_path / "ready.db"))
+    check_stats.init_table(conn)
+    conn.close()
+    check_stats.open_analytics(str(tmp_path / "ready.db")).close()
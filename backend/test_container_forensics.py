@@ -0,0 +1,108 @@
+import io
+import struct
+import zlib
+
+from PIL import Image
+
+import container_forensics
+
+# Header-only parsing of crafted JPEG / PNG / MP4 containers.
+
+DST = b"http://cv.iptc.org/newscodes/digitalsourcetype/"
+
+
+def jpeg(*segments, quality=75):
+    """A PIL-encoded JPEG with extra (marker, payload) segments inserted after SOI."""
+    buffer = io.BytesIO()
+    Image.new("RGB", (16, 16), (120, 80, 40)).save(buffer, "JPEG", quality=quality)
+    data = buffer.getvalue()
+    extra = b"".join(b"\xff" + bytes([marker]) + struct.pack(">H", len(payload) + 2) + payload
+                     for marker, payload in segments)
+    return data[:2] + extra + data[2:]
+
+
+def xmp(body):
+    return 0xE1, container_forensics.XMP_NAMESPACE + body
+
+
+def png(*chunks):
+    out = b"\x89PNG\r\n\x1a\n"
+    for chunk_type, body in chunks + ((b"IEND", b""),):
+        out += struct.pack(">I", len(body)) + chunk_type + body + struct.pack(">I", zlib.crc32(chunk_type + body))
+    return out
+
+
+def test_jpeg_quality_and_encoder():
+    info = container_forensics.parse(jpeg(quality=75))
+    assert info["format"] == "JPEG"
+    assert (info["quality"], info["encoder"]) == (75, "ijg")
+    assert info["markers"][:2] == ["APP0", "DQT"]
+    assert info["ai_source"] is None and not info["ai_declared"]
+
+
+def test_jpeg_declared_source_type_is_decisive():
+    for code in (b"trainedAlgorithmicMedia", b"compositeWithTrainedAlgorithmicMedia"):
+        info = container_forensics.parse(jpeg(xmp(b'<rdf Iptc4xmpExt:DigitalSourceType="' + DST + code + b'"/>')))
+        assert info["xmp"] and info["ai_declared"]
+        assert info["ai_source"] == f"IPTC digital source type {code.decode()}"
+
+
+def test_jpeg_camera_source_type_is_not_flagged():
+    info = container_forensics.parse(jpeg(xmp(b'<rdf DigitalSourceType="' + DST + b'digitalCapture"/>')))
+    assert info["xmp"] and info["ai_source"] is None
+
+
+def test_jpeg_c2pa_manifest():
+    manifest = b"JP\x00\x01jumb\x00\x00c2pa\x00c2pa.actions digitalSourceType" + DST + b"trainedAlgorithmicMedia"
+    info = container_forensics.parse(jpeg((0xEB, manifest)))
+    assert info["c2pa"] and info["ai_declared"]
+
+
+def test_generator_names_count_only_in_software_fields():
+    info = container_forensics.parse(jpeg(xmp(b"<xmp:CreatorTool>Adobe Firefly 3</xmp:CreatorTool>")))
+    assert info["ai_source"] == "software field names Adobe Firefly" and not info["ai_declared"]
+
+    description = xmp(b"<dc:description>Not made with Midjourney</dc:description>")
+    assert container_forensics.parse(jpeg(description))["ai_source"] is None
+    assert container_forensics.parse(jpeg((0xFE, b"Stable Diffusion look-alike")))["ai_source"] is None
+
+
+def test_truncated_jpeg_header():
+    data = jpeg()
+    info = container_forensics.parse(data[:40])
+    assert info["format"] == "JPEG"
+
+
+def test_png_generation_parameters_are_not_decisive():
+    info = container_forensics.parse(png((b"tEXt", b"parameters\x00a cat, Steps: 20, Sampler: Euler")))
+    assert info["format"] == "PNG"
+    assert info["ai_source"] == "generation parameters (parameters)" and not info["ai_declared"]
+    assert info["text_chunks"]["parameters"].startswith("a cat")
+
+
+def test_png_chunks():
+    compressed = zlib.compress(b"hello")
+    info = container_forensics.parse(png(
+        (b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0)),
+        (b"iCCP", b"icc\x00\x00" + zlib.compress(b"\x00" * 64)),
+        (b"IDAT", zlib.compress(b"\x00\x00\x00\x00")),
+        (b"IDAT", b""),
+        (b"zTXt", b"Comment\x00\x00" + compressed),
+        (b"tEXt", b"Software\x00Stable Diffusion web UI"),
+        (b"caBX", b"c2pa" + DST + b"trainedAlgorithmicMedia"),
+    ))
+    assert info["markers"] == ["IHDR", "iCCP", "IDAT", "zTXt", "tEXt", "caBX", "IEND"]
+    assert info["icc_bytes"] > 0 and info["text_chunks"]["Comment"] == "hello"
+    assert info["c2pa"] and info["ai_declared"]
+    assert info["ai_source"] == "IPTC digital source type trainedAlgorithmicMedia"
+
+
+def test_unsupported_containers():
+    mp4 = struct.pack(">I", 24) + b"ftypisom" + b"\x00\x00\x02\x00isomiso2" + struct.pack(">I", 8) + b"mdat"
+    for data in (mp4, b"", b"GIF89a"):
+        info = container_forensics.parse(data)
+        assert info["format"] is None and info["quality"] is None and info["ai_source"] is None
+
+
+def test_describe_source_is_printable_and_bounded():
+    assert container_forensics.describe_source("a\x00b\nc" + "x" * 200) == "a b c" + "x" * 75
@@ -16,10 +16,10 @@ print("Running analysis...")
 result = analyze_image_native(img_bytes)
 
 print("\n--- RESULTS ---")
-print("Authenticity Label:", result.get("authenticity_label"))
-print("Details:", result.get("details"))
+print("Authenticity Label:", result.label)
+print("Details:", result.details)
 
-if "hair_detail" in result.get("details", {}):
+if "hair_detail" in result.details:
     print("SUCCESS: Found detail fields in result.")
 else:
     print("FAIL: Did not find detail fields.")
@@ -0,0 +1,108 @@
+import gzip
+import os
+import time
+
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header, parse_etags
+
+import analysis_logic
+import http_cache
+
+# ETag matching, gzip encoding and the rendered-body LRU.
+
+
+def test_etags_match_plain_and_gzip_variants():
+    tag = http_cache.etag("c", 12, 3)
+    assert tag == "c12-3"
+    assert http_cache.matched_tag(parse_etags('"c12-3"'), tag) == tag
+    assert http_cache.matched_tag(parse_etags('"x", "c12-3-gzip"'), tag) == "c12-3-gzip"
+    assert http_cache.matched_tag(parse_etags('W/"c12-3"'), tag) == tag  # If-None-Match compares weakly
+    assert http_cache.matched_tag(parse_etags('"c12-2"'), tag) is None
+    assert http_cache.matched_tag(parse_etags(None), tag) is None
+
+
+def test_accepts_gzip():
+    assert http_cache.accepts_gzip(parse_accept_header("gzip, deflate", Accept))
+    assert not http_cache.accepts_gzip(parse_accept_header("gzip;q=0, br", Accept))
+    assert not http_cache.accepts_gzip(parse_accept_header(None, Accept))
+
+
+def test_compress_is_byte_identical():
+    body = b'{"id": 1}' * 500
+    first = http_cache.compress(body)
+    time.sleep(1.1)  # gzip would otherwise stamp the current time
+    assert http_cache.compress(body) == first
+    assert gzip.decompress(first) == body
+
+
+def test_certificate_is_byte_identical():
+    row = {"id": 7, "authenticity_label": "Likely Organic", "authenticity_score": 85, "file_name": "a.png",
+           "file_type": "image", "created_at": "2026-01-02 03:04:05",
+           "details": {"checks": [{"name": "ELA Uniformity", "status": "PASS", "details": "ok"}]}}
+    logo = os.path.join(os.path.dirname(__file__), "logo.png")
+    first = analysis_logic.generate_certificate(row, logo_path=logo)
+    time.sleep(1.1)
+    assert analysis_logic.generate_certificate(row, logo_path=logo) == first
+    assert first.startswith(b"%PDF")
+
+
+def test_body_cache_evicts_least_recently_used():
+    cache = http_cache.BodyCache(max_bytes=400)
+    cache.put(("a", 1, "identity"), b"x" * 100)
+    cache.put(("a", 2, "identity"), b"x" * 100)
+    cache.put(("a", 3, "identity"), b"x" * 100)
+    assert cache.get(("a", 1, "identity"))  # Now most recently used
+    cache.put(("a", 4, "identity"), b"x" * 100)
+    cache.put(("a", 4, "identity"), b"y" * 100)  # Replacing an entry doesn't count twice
+    cache.put(("a", 5, "identity"), b"x" * 100)
+    assert cache.get(("a", 2, "identity")) is None
+    assert cache.get(("a", 1, "identity")) and cache.get(("a", 3, "identity"))
+    assert cache.get(("a", 4, "identity")) == b"y" * 100
+    assert cache._size <= 400
+
+
+def test_body_cache_skips_huge_bodies_and_invalidates_by_id():
+    cache = http_cache.BodyCache(max_bytes=400)
+    cache.put(("c", 1, "identity"), b"x" * 101)
+    assert cache.get(("c", 1, "identity")) is None
+
+    cache.put(("c", 1, "identity"), b"pdf")
+    cache.put(("c", 1, "gzip"), b"gz")
+    cache.put(("a", 1, "identity"), b"json")
+    cache.invalidate("c", 1)
+    assert cache.get(("c", 1, "identity")) is None and cache.get(("c", 1, "gzip")) is None
+    assert cache.get(("a", 1, "identity")) == b"json"
+    assert cache._size == 4
+
+
+def test_stored_responses_revalidate_and_compress(server):
+    user_id = server.store.create_user("etag", "h")
+    analysis_id = server.store.insert_analysis({
+        "user_id": user_id, "file_name": "a.txt", "file_url": None, "file_type": "text",
+        "sentiment_label": "N/A", "sentiment_score": 0,
+        "authenticity_label": "Likely Organic", "authenticity_score": 85,
+        "details": '{"reasoning":"' + "ok " * 600 + '"}',
+        "schema_version": analysis_logic.RESULT_SCHEMA_VERSION, "checks": analysis_logic.pack_checks([]),
+    })
+    client = server.app.test_client()
+    tag = http_cache.etag("a", analysis_id, analysis_logic.ENGINE_VERSION)
+
+    plain = client.get(f"/api/analysis/{analysis_id}", headers={"Accept-Encoding": "identity"})
+    assert plain.status_code == 200 and plain.headers["ETag"] == f'"{tag}"'
+    assert plain.headers["Cache-Control"] == http_cache.IMMUTABLE
+
+    zipped = client.get(f"/api/analysis/{analysis_id}", headers={"Accept-Encoding": "gzip"})
+    assert zipped.headers["Content-Encoding"] == "gzip" and zipped.headers["ETag"] == f'"{tag}-gzip"'
+    assert gzip.decompress(zipped.data) == plain.data
+
+    for etag in (tag, tag + "-gzip"):
+        revalidated = client.get(f"/api/analysis/{analysis_id}", headers={"If-None-Match": f'"{etag}"'})
+        assert revalidated.status_code == 304 and revalidated.headers["ETag"] == f'"{etag}"'
+
+    certificate = client.get(f"/api/analysis/certificate/{analysis_id}")
+    assert certificate.status_code == 200 and certificate.data.startswith(b"%PDF")
+    server.response_cache.invalidate("c", analysis_id)
+    assert client.get(f"/api/analysis/certificate/{analysis_id}").data == certificate.data
+
+    server.store.delete_analysis(analysis_id)
+    assert client.get(f"/api/analysis/{analysis_id}").status_code == 404
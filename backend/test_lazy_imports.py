@@ -0,0 +1,42 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+from analysis_logic import LazyModule
+
+# Heavy analyzer dependencies stay unloaded until an analyzer touches them.
+
+HEAVY = ["librosa", "cv2", "textblob", "reportlab", "numba"]
+
+
+def test_importing_the_app_modules_skips_heavy_dependencies():
+    code = ("import sys, analysis_logic, check_stats, media_index, container_forensics; "
+            f"print(sorted(m for m in {HEAVY!r} if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                         capture_output=True, text=True, check=True).stdout
+    assert out.strip().splitlines()[-1] == "[]"
+
+
+def test_module_loads_on_first_attribute_access():
+    lazy = LazyModule("json.decoder")
+    assert lazy._lazy_module is None
+    assert lazy.JSONDecodeError.__name__ == "JSONDecodeError"
+    module = lazy._lazy_module
+    assert module is sys.modules["json.decoder"]
+    lazy.scanstring
+    assert lazy._lazy_module is module
+
+
+def test_module_attributes_are_not_shadowed():
+    # "name" and "load" are common module attributes; the proxy's own state is _lazy_ prefixed
+    lazy = LazyModule("pickle")
+    assert lazy.load is __import__("pickle").load
+    assert lazy.__name__ == "pickle"
+
+
+def test_missing_module_fails_on_use():
+    lazy = LazyModule("no_such_module_for_tests")
+    with pytest.raises(ImportError):
+        lazy.anything
@@ -0,0 +1,95 @@
+import base64
+import io
+import sqlite3
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import analysis_logic
+import audio_fingerprint
+import check_stats
+import media_index
+import storage
+
+# Refilling the local derived tables from Storage (a redeploy on STORAGE_BACKEND=mysql).
+
+
+def data_url(mime, data):
+    return f"data:{mime};base64," + base64.b64encode(data).decode()
+
+
+def png(seed):
+    buf = io.BytesIO()
+    Image.fromarray(np.random.default_rng(seed).integers(0, 256, (64, 64, 3), dtype=np.uint8)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def wav(seed, seconds=4.0, sr=22050):
+    from scipy.io import wavfile
+
+    # Syllable-like bursts: a random pitch per 120 ms with a few harmonics
+    rng = np.random.default_rng(seed)
+    n, seg = int(seconds * sr), int(0.12 * sr)
+    f0 = np.repeat(rng.uniform(110, 260, n // seg + 1), seg)[:n]
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    y = sum(rng.uniform(0.2, 1) * np.sin(k * phase) for k in range(1, 8))
+    buf = io.BytesIO()
+    wavfile.write(buf, sr, (y / np.abs(y).max() * 20000).astype(np.int16))
+    return buf.getvalue()
+
+
+def analysis(user_id, file_type, file_url):
+    return {"user_id": user_id, "file_name": "f", "file_url": file_url, "file_type": file_type,
+            "sentiment_label": "N/A", "sentiment_score": 0, "authenticity_label": "Likely Organic",
+            "authenticity_score": 85, "details": "{}", "schema_version": analysis_logic.RESULT_SCHEMA_VERSION,
+            "checks": analysis_logic.pack_checks([analysis_logic.ForensicCheck("ELA Uniformity", "", "PASS")])}
+
+
+def test_rebuild_from_storage(server, tmp_path):
+    pytest.importorskip("librosa")
+    store = storage.SQLiteStorage(str(tmp_path / "primary.db"))
+    store.init_schema()
+    image_id, no_media, broken, audio_id = store.insert_analyses([
+        analysis(7, "image", data_url("image/png", png(1))),
+        analysis(7, "image", None),  # Scanned with --no-media
+        analysis(7, "image", "data:image/png;base64"),
+        analysis(8, "audio", data_url("audio/wav", wav(1))),
+    ])
+
+    local = str(tmp_path / "database.db")
+    conn = sqlite3.connect(local)
+    check_stats.init_table(conn)
+    images, clips = media_index.ImageHashIndex(local), audio_fingerprint.AudioFingerprintIndex(local)
+    assert server.claim_local_rebuild(conn)
+    assert not server.claim_local_rebuild(conn)  # Once per database file
+
+    assert server.rebuild_local_indexes(conn, store, batch_size=2) == (4, 1, 1)
+    assert conn.execute("SELECT finished_at FROM local_rebuild").fetchone()[0] is not None
+    assert conn.execute("SELECT COUNT(*) FROM forensic_checks").fetchone() == (4,)
+
+    hashes = media_index.compute_image_hashes(png(1))
+    assert [n["analysis_id"] for n in images.neighbours(hashes, 7)] == [image_id]
+    landmarks = analysis_logic.audio_fingerprint_of(wav(1))
+    assert [m["analysis_id"] for m in clips.match(landmarks, 8)] == [audio_id]
+    assert clips.match(landmarks, 7) == []
+
+    # Tables that already hold rows are left alone
+    assert server.rebuild_local_indexes(conn, store) == (0, 0, 0)
+    conn.close()
+
+
+def test_reload_picks_up_rows_below_loaded_ids(tmp_path):
+    db = str(tmp_path / "index.db")
+    index = media_index.ImageHashIndex(db)
+    hashes = {"dhash": 1, "phash": 1}
+    index.add(10, hashes, 1)
+    assert [n["analysis_id"] for n in index.neighbours(hashes, 1)] == [10]
+
+    conn = sqlite3.connect(db)
+    media_index.ImageHashIndex.insert(conn, 5, hashes, 1)  # Written by a rebuild in another process
+    conn.commit()
+    conn.close()
+    assert [n["analysis_id"] for n in index.neighbours(hashes, 1)] == [10]
+    index.reload()
+    assert [n["analysis_id"] for n in index.neighbours(hashes, 1)] == [10, 5]
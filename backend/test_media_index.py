@@ -0,0 +1,117 @@
+import io
+import json
+import random
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+import analysis_logic
+import media_index
+from media_index import BKTree, ImageHashIndex, hamming
+
+# Perceptual hashes, the BK-tree radius search and the owner-scoped persistent index.
+
+
+def picture(seed):
+    noise = np.random.default_rng(seed).integers(0, 256, (24, 32), dtype=np.uint8)
+    return Image.fromarray(noise).resize((640, 480), Image.BICUBIC).filter(ImageFilter.GaussianBlur(6))
+
+
+def encoded(img, **save):
+    buf = io.BytesIO()
+    img.convert("RGB").save(buf, **save)
+    return buf.getvalue()
+
+
+def test_hashes_survive_recompression_and_resizing():
+    original = media_index.compute_image_hashes(encoded(picture(1), format="PNG"))
+    repost = media_index.compute_image_hashes(encoded(picture(1).resize((320, 240)), format="JPEG", quality=60))
+    other = media_index.compute_image_hashes(encoded(picture(2), format="PNG"))
+    for kind in ("dhash", "phash"):
+        assert 0 <= original[kind] < 1 << 64
+        assert hamming(original[kind], repost[kind]) <= 4
+        assert hamming(original[kind], other[kind]) >= 16
+    assert media_index.compute_image_hashes(b"not an image") is None
+
+
+def test_signed_storage_round_trip():
+    for value in (0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1):
+        signed = media_index._to_signed(value)
+        assert -(1 << 63) <= signed < 1 << 63
+        assert media_index._to_unsigned(signed) == value
+
+
+def test_bk_tree_radius_query_matches_a_linear_scan():
+    rng = random.Random(7)
+    values = [rng.getrandbits(64) for _ in range(400)]
+    values += [v ^ (1 << rng.randrange(64)) for v in values[:50]]  # Near neighbours
+    tree = BKTree()
+    for item, value in enumerate(values):
+        tree.add(value, item)
+    tree.add(values[0], "same")
+    assert tree.size == len(values) + 1
+    assert BKTree().query(values[0], 10) == []
+
+    for probe in values[:20] + [rng.getrandbits(64)]:
+        for radius in (0, 3, 12):
+            expected = {(hamming(probe, v), item) for item, v in enumerate(values) if hamming(probe, v) <= radius}
+            if hamming(probe, values[0]) <= radius:
+                expected.add((hamming(probe, values[0]), "same"))
+            assert set(tree.query(probe, radius)) == expected
+
+
+def test_index_is_scoped_to_the_owner_and_tombstones_removals(tmp_path):
+    db = str(tmp_path / "index.db")
+    index = ImageHashIndex(db)
+    base = {"dhash": 0xF0F0F0F0F0F0F0F0, "phash": (1 << 63) | 0x0F}
+    index.add(1, base, user_id=10)
+    index.add(2, {"dhash": base["dhash"] ^ 0b11, "phash": base["phash"] ^ 0b1}, user_id=10)
+    index.add(3, base, user_id=20)
+    index.add(4, {"dhash": base["dhash"], "phash": base["phash"] ^ (1 << 40) - 1}, user_id=10)  # 40 bits away
+
+    found = index.neighbours(base, 10, radius=10)
+    assert [(r["analysis_id"], r["phash_distance"], r["dhash_distance"]) for r in found] == [(1, 0, 0), (2, 1, 2)]
+    assert [r["analysis_id"] for r in index.neighbours(base, 20)] == [3]
+    assert index.neighbours(base, 30) == []
+    assert [r["analysis_id"] for r in index.neighbours(base, 10, exclude=1)] == [2]
+    assert index.get(1) == base
+
+    # Another worker's index catches up on rows it did not write
+    other = ImageHashIndex(db)
+    assert [r["analysis_id"] for r in other.neighbours(base, 10)] == [1, 2]
+
+    index.remove(1)
+    assert [r["analysis_id"] for r in index.neighbours(base, 10)] == [2]
+    assert index.get(1) is None
+    assert [r["analysis_id"] for r in ImageHashIndex(db).neighbours(base, 10)] == [2]
+
+
+def stored_analysis(server, user_id, label="Likely AI", **details):
+    return server.store.insert_analysis({
+        "user_id": user_id, "file_name": "a.png", "file_url": None, "file_type": "image",
+        "sentiment_label": "N/A", "sentiment_score": 0,
+        "authenticity_label": label, "authenticity_score": 20,
+        "details": json.dumps({"reasoning": "r", **details}),
+        "schema_version": analysis_logic.RESULT_SCHEMA_VERSION, "checks": analysis_logic.pack_checks([]),
+    })
+
+
+def test_reuse_guard(server, monkeypatch):
+    monkeypatch.setattr(server, "NEAR_DUPLICATE_REUSE_DISTANCE", 4)
+    user_id = server.store.create_user("reuse", "h")
+    current = stored_analysis(server, user_id, **analysis_logic.result_provenance())
+    stale = stored_analysis(server, user_id, **{**analysis_logic.result_provenance(), "engine_version": -1})
+    unstamped = stored_analysis(server, user_id)
+
+    def near(id, distance=2, label="Likely AI"):
+        return {"id": id, "distance": distance, "authenticityLabel": label}
+
+    reused = server.reusable_result(near(current))
+    assert reused.label == "Likely AI" and reused.score == 20
+    assert server.reusable_result(near(current, distance=5)) is None
+    assert server.reusable_result(near(current, label="Error")) is None
+    assert server.reusable_result(near(stale)) is None
+    assert server.reusable_result(near(unstamped)) is None
+
+    server.store.delete_analysis(current)
+    assert server.reusable_result(near(current)) is None
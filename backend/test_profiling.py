@@ -0,0 +1,24 @@
+import pytest
+
+import profiling
+
+# X-Profile-Token checks: the header is attacker-controlled text.
+
+
+@pytest.mark.parametrize("token, valid", [
+    ("s3cret", True),
+    ("s3cre", False),
+    ("", False),
+    (None, False),
+    ("sécret", False),  # compare_digest raises TypeError on non-ASCII str
+    ("s3cret\udcff", False),  # Not encodable at all
+])
+def test_token_valid(monkeypatch, token, valid):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "s3cret")
+    assert profiling.token_valid(token) is valid
+
+
+def test_token_valid_when_profiling_is_off(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "")
+    assert profiling.token_valid("") is False
+    assert profiling.should_profile({profiling.PROFILE_HEADER: "anything"}) is False
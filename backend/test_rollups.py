@@ -0,0 +1,135 @@
+import sqlite3
+
+import pytest
+
+import rollups
+import storage
+
+# Dashboard counters: rebuild from history, incremental bumps, and the admin pages.
+
+
+def analysis(user_id, file_type, label):
+    return {"user_id": user_id, "file_name": "f", "file_url": None, "file_type": file_type,
+            "sentiment_label": "N/A", "sentiment_score": 0, "authenticity_label": label,
+            "authenticity_score": 50, "details": "{}", "schema_version": 2, "checks": b""}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "store.db")
+
+
+@pytest.fixture
+def store(path):
+    store = storage.SQLiteStorage(path)
+    store.init_schema()
+    alice = store.create_user("alice", "h")
+    bob = store.create_user("bob", "h")
+    store.log_activities([(alice, "login", "2026-01-01 10:00:00"), (bob, "login", "2026-01-01 11:00:00"),
+                          (alice, "logout", "2026-01-02 09:00:00")])
+    store.insert_analyses([analysis(alice, "image", "Likely AI"), analysis(bob, "image", "Likely AI"),
+                           analysis(bob, None, None)])
+    return store
+
+
+def counters(conn):
+    return {(name, bucket): count for name, bucket, count in conn.execute(
+        "SELECT name, bucket, count FROM rollup_counters WHERE name != 'analyses_daily'")}
+
+
+EXPECTED = {
+    ("activity", "login"): 2, ("activity", "logout"): 1,
+    ("activity_daily", "2026-01-01:login"): 2, ("activity_daily", "2026-01-02:logout"): 1,
+    ("users", "total"): 2,
+    ("analyses", "image"): 2, ("analyses", "unknown"): 1,
+    ("verdicts", "image:Likely AI"): 2, ("verdicts", "unknown:unknown"): 1,
+}
+
+
+def test_empty_table_is_rebuilt_from_history(store, path, tmp_path):
+    # History in the same database (SQLite backend)
+    local = sqlite3.connect(path)
+    rollups.init_tables(local)
+    assert counters(local) == EXPECTED
+
+    # History in another database (MySQL backend): read through Storage
+    remote = sqlite3.connect(str(tmp_path / "analytics.db"))
+    rollups.init_tables(remote, history=store.history_counts)
+    assert counters(remote) == EXPECTED
+    assert sum(n for _, n in remote.execute(
+        "SELECT bucket, count FROM rollup_counters WHERE name = 'analyses_daily'")) == 3
+
+    # A table with counters is left alone
+    rollups.bump(remote, "users", "total", 5)
+    rollups.init_tables(remote, history=store.history_counts)
+    assert counters(remote)[("users", "total")] == 7
+
+
+def test_increments_and_summary(monkeypatch):
+    conn = sqlite3.connect(":memory:")
+    rollups.init_tables(conn, history=lambda: [])
+    monkeypatch.setattr(rollups, "_today", lambda: "2026-01-05")
+
+    rollups.record_user(conn)
+    rollups.record_activity(conn, "login")
+    rollups.record_activity(conn, "login", day="2026-01-04")
+    rollups.record_activity(conn, "logout")
+    rollups.record_analysis(conn, "audio", "Likely Synthetic")
+    rollups.record_analysis(conn, "audio", "Likely Synthetic")
+    rollups.record_analysis(conn, "audio", "Likely Synthetic", delta=-1)
+    rollups.record_analysis(conn, "image", "Likely Organic")
+    rollups.record_analysis(conn, "image", "Likely Organic", delta=-1)
+
+    assert counters(conn) == {
+        ("users", "total"): 1,
+        ("activity", "login"): 2, ("activity", "logout"): 1,
+        ("activity_daily", "2026-01-05:login"): 1, ("activity_daily", "2026-01-04:login"): 1,
+        ("activity_daily", "2026-01-05:logout"): 1,
+        ("analyses", "audio"): 1, ("analyses", "image"): 0,
+        ("verdicts", "audio:Likely Synthetic"): 1, ("verdicts", "image:Likely Organic"): 0,
+    }
+    # Deletions keep the daily upload counts
+    assert conn.execute("SELECT count FROM rollup_counters WHERE name = 'analyses_daily'").fetchone() == (3,)
+
+    summary = rollups.summary(conn, last_activity="2026-01-05 12:00:00", days=100000)
+    assert (summary["totalUsers"], summary["totalActivity"], summary["logins"], summary["logouts"]) == (1, 3, 2, 1)
+    assert summary["loginsByDay"] == [{"day": "2026-01-04", "count": 1}, {"day": "2026-01-05", "count": 1}]
+    assert summary["analysesByDay"] == [{"day": "2026-01-05", "count": 3}]
+    assert summary["analysesByType"] == {"audio": 1}  # Zero counters are left out
+    assert summary["verdicts"] == {"audio": {"Likely Synthetic": 1}}
+    assert summary["lastActivity"] == "2026-01-05 12:00:00"
+
+
+def walk(client, path, key, limit):
+    ids, cursor = [], None
+    while True:
+        url = f"{path}?limit={limit}" + (f"&cursor={cursor}" if cursor is not None else "")
+        page = client.get(url).get_json()
+        assert len(page[key]) <= limit
+        ids += [row["id"] for row in page[key]]
+        cursor = page["nextCursor"]
+        if cursor is None:
+            return ids
+        assert cursor == ids[-1]
+
+
+def test_admin_pages_follow_cursors(server):
+    user_ids = [server.store.create_user(f"page{i}", "h") for i in range(5)]
+    server.store.log_activities([(user_id, "login", "2026-01-01 00:00:00") for user_id in user_ids])
+    server.activity.flush()  # Events other tests queued land before the walk
+    client = server.app.test_client()
+
+    users = walk(client, "/api/admin/users", "users", 2)
+    assert users == sorted(users) and len(set(users)) == len(users)
+    assert set(user_ids) <= set(users)
+
+    activity = walk(client, "/api/admin/activity", "activities", 3)
+    assert activity == sorted(activity, reverse=True) and len(set(activity)) == len(activity)
+    assert len(activity) == len(server.store.activity_before(None, 10 ** 6))
+
+    page = client.get("/api/admin/users?limit=0").get_json()
+    assert len(page["users"]) == 1  # Clamped to at least one row
+
+    summary = client.get("/api/admin/summary?limit=2").get_json()
+    assert [u["id"] for u in summary["users"]] == users[:2] and summary["usersCursor"] == users[1]
+    assert summary["activities"][0]["id"] == activity[0]
@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import session_store
+import storage
+
+# Sliding expiry, the sweeper thread, and sessions through the app's auth helper.
+
+
+class Clock:
+    def __init__(self):
+        self.now = datetime(2026, 1, 1, 12, 0, 0)
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, **delta):
+        self.now += timedelta(**delta)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(session_store, "_now", clock)
+    return clock
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = storage.SQLiteStorage(str(tmp_path / "sessions.db"))
+    store.init_schema()
+    renewals = []
+    renew = store.renew_session
+    monkeypatch.setattr(store, "renew_session", lambda *args: renewals.append(args) or renew(*args))
+    store.renewals = renewals
+    return store
+
+
+def test_sliding_renewal_writes_at_most_once_per_interval(store, clock, monkeypatch):
+    monkeypatch.setattr(session_store, "TTL_SECONDS", 24 * 3600)
+    monkeypatch.setattr(session_store, "SESSION_RENEW_SECONDS", 3600)
+    token = session_store.create(store, 7)
+
+    for _ in range(3):
+        clock.advance(minutes=15)
+        assert session_store.lookup(store, token) == 7
+    assert store.renewals == []  # Read-only within the renewal interval
+
+    clock.advance(minutes=16)  # 61 minutes since the session was created
+    assert session_store.lookup(store, token) == 7
+    assert store.renewals == [(token, "2026-01-02 13:01:00", "2026-01-01 13:01:00")]
+    clock.advance(minutes=59)
+    assert session_store.lookup(store, token) == 7
+    assert len(store.renewals) == 1
+
+    # Idle for longer than the TTL after the last renewal
+    clock.now = datetime(2026, 1, 2, 13, 0, 59)
+    assert session_store.lookup(store, token) == 7
+    clock.now = datetime(2026, 1, 3, 14, 0, 0)
+    assert session_store.lookup(store, token) is None
+    assert session_store.lookup(store, "unknown") is None
+
+
+def test_revoke_and_sweep(store, clock, monkeypatch):
+    monkeypatch.setattr(session_store, "TTL_SECONDS", 3600)
+    tokens = [session_store.create(store, user_id) for user_id in (1, 1, 1, 2)]
+    clock.advance(minutes=30)
+    fresh = session_store.create(store, 1)
+
+    session_store.revoke(store, tokens[0])
+    assert session_store.lookup(store, tokens[0]) is None
+    clock.advance(minutes=45)  # The first four have expired
+    assert session_store.sweep(store, batch_size=2) == 3
+    assert store.session_user(tokens[3]) is None
+    assert session_store.lookup(store, fresh) == 1
+
+    assert session_store.revoke_all(store, 1) == 1
+    assert session_store.lookup(store, fresh) is None
+
+
+class SweeperStore:
+    def __init__(self):
+        self.results = [RuntimeError("database is locked"), 3]
+
+    def delete_expired_sessions(self, now, limit):
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_sweeper_survives_errors(monkeypatch, capsys):
+    sleeps = []
+
+    class Time:
+        @staticmethod
+        def sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) > 2:
+                raise SystemExit  # Ends the thread quietly after two sweeps
+
+    monkeypatch.setattr(session_store, "time", Time)
+    monkeypatch.setattr(session_store, "_sweeper", None)
+    store = SweeperStore()
+    session_store.start_sweeper(store, interval=0)
+    assert session_store._sweeper is None  # Disabled
+
+    session_store.start_sweeper(store, interval=5)
+    thread = session_store._sweeper
+    session_store.start_sweeper(store, interval=5)
+    assert session_store._sweeper is thread  # One per process
+    thread.join(5)
+    assert sleeps == [5, 5, 5] and store.results == []
+    out = capsys.readouterr().out
+    assert "Session sweeper error: database is locked" in out
+    assert "Session sweeper removed 3 expired sessions." in out
+
+
+def test_expired_sessions_are_refused_by_the_app(server, login, clock):
+    user_id, headers = login("expiring")
+    client = server.app.test_client()
+    assert client.get("/api/auth/user", headers=headers).get_json()["id"] == user_id
+
+    clock.advance(seconds=session_store.TTL_SECONDS - 60)
+    assert client.get("/api/auth/user", headers=headers).status_code == 200  # Renewed
+    clock.advance(seconds=session_store.TTL_SECONDS - 60)
+    assert client.get("/api/auth/user", headers=headers).status_code == 200
+    clock.advance(seconds=session_store.TTL_SECONDS + 1)
+    assert client.get("/api/auth/user", headers=headers).status_code == 401
+
+
+def test_logout_everywhere(server, login):
+    user_id, first = login("everywhere")
+    second = {"Authorization": f"Bearer {server.session_store.create(server.store, user_id)}"}
+    _, other = login("bystander")
+    client = server.app.test_client()
+
+    assert client.post("/api/logout/all").status_code == 401
+    response = client.post("/api/logout/all", headers=first)
+    assert response.status_code == 200 and response.get_json()["sessionsRevoked"] == 2
+    for headers in (first, second):
+        assert client.get("/api/auth/user", headers=headers).status_code == 401
+    assert client.get("/api/auth/user", headers=other).status_code == 200
@@ -0,0 +1,60 @@
+import io
+import time
+
+import numpy as np
+import scipy.ndimage
+from PIL import Image
+
+import analysis_logic
+import check_registry
+
+# The frequency-spectrum peak check: periodic upsampling artifacts fail, noise passes.
+
+THRESHOLDS = check_registry.thresholds_for(check_registry.find_check("image", "Frequency Spectrum Peaks"))
+
+
+def judged(pixels, jpeg=False):
+    metrics = analysis_logic.spectral_peaks(analysis_logic.tile_power_spectrum(pixels), jpeg=jpeg)
+    failed, _ = analysis_logic.judge_image_spectral_peaks(metrics, THRESHOLDS)
+    return failed, metrics
+
+
+def rgb(gray):
+    return np.repeat(np.clip(gray, 0, 255).astype(np.uint8)[..., None], 3, axis=2)
+
+
+def test_transposed_convolution_upsampling_fails():
+    # Zero insertion followed by a 3x3 kernel: the checkerboard of a stride-2 transposed convolution
+    low = np.random.default_rng(1).integers(0, 256, (256, 256)).astype(np.float64)
+    upsampled = np.zeros((512, 512))
+    upsampled[::2, ::2] = low * 4
+    failed, metrics = judged(rgb(scipy.ndimage.uniform_filter(upsampled, 3)))
+    assert failed
+    assert metrics["peak_frequency"] == 0.5 and metrics["peak_count"] > 0 and metrics["tile"] == 256
+
+
+def test_noise_passes():
+    noise = np.random.default_rng(2).integers(0, 256, (512, 512, 3), dtype=np.uint8)
+    failed, metrics = judged(noise)
+    assert not failed and metrics["peak_count"] == 0
+
+    # The JPEG block grid is discounted for JPEG sources
+    buf = io.BytesIO()
+    Image.fromarray(noise).save(buf, "JPEG", quality=75)
+    decoded = np.asarray(Image.open(buf).convert("RGB"))
+    assert not judged(decoded, jpeg=True)[0]
+
+
+def test_small_images_are_skipped():
+    assert analysis_logic.tile_power_spectrum(np.zeros((48, 400, 3), dtype=np.uint8)) is None
+    assert analysis_logic.tile_power_spectrum(np.zeros((100, 400, 3), dtype=np.uint8)).shape == (64, 64)
+
+
+def test_cost_is_bounded_by_the_tile_count():
+    # A fixed number of tiles is sampled, so a 12 MP photo costs about as much as a small one
+    photo = np.random.default_rng(3).integers(0, 256, (3000, 4000, 3), dtype=np.uint8)
+    judged(photo)
+    start = time.perf_counter()
+    for _ in range(3):
+        judged(photo)
+    assert (time.perf_counter() - start) / 3 < 0.25
@@ -0,0 +1,181 @@
+import os
+import pytest
+
+import storage
+
+# Runs the same cases against every storage backend. SQLite uses a temporary file;
+# MySQL runs only when a throwaway test database is configured, e.g.
+#
+#   TEST_MYSQL_HOST=127.0.0.1 TEST_MYSQL_USER=root TEST_MYSQL_PASSWORD= \
+#   TEST_MYSQL_DATABASE=verisight_test python -m pytest test_storage.py
+#
+# The MySQL tables are dropped before each test, so never point this at real data.
+
+BACKENDS = ["sqlite", "mysql"]
+
+
+def _mysql_storage():
+    if not os.getenv("TEST_MYSQL_HOST"):
+        pytest.skip("TEST_MYSQL_HOST not set")
+    pytest.importorskip("mysql.connector")
+    store = storage.MySQLStorage(
+        host=os.environ["TEST_MYSQL_HOST"],
+        port=int(os.getenv("TEST_MYSQL_PORT", 3306)),
+        user=os.getenv("TEST_MYSQL_USER", "root"),
+        password=os.getenv("TEST_MYSQL_PASSWORD", ""),
+        database=os.getenv("TEST_MYSQL_DATABASE", "verisight_test"),
+        pool_size=2,
+    )
+    with store.connection() as conn:
+        cursor = conn.cursor()
+        for table in ("users", "analysis_results", "user_activity", "sessions"):
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    return store
+
+
+@pytest.fixture(params=BACKENDS)
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        store = storage.SQLiteStorage(str(tmp_path / "test.db"))
+    else:
+        store = _mysql_storage()
+    store.init_schema()
+    return store
+
+
+def analysis(user_id, name="a.png", file_type="image", label="Likely Organic"):
+    return {
+        "user_id": user_id, "file_name": name, "file_url": "data:image/png;base64,AAAA", "file_type": file_type,
+        "sentiment_label": None, "sentiment_score": None,
+        "authenticity_label": label, "authenticity_score": 80,
+        "details": '{"reasoning":"ok"}', "schema_version": 2, "checks": b"\x02\x00\xffpacked",
+    }
+
+
+def test_schema_is_idempotent(store):
+    store.init_schema()
+    assert store.get_user(1) is None
+
+
+def test_users(store):
+    user_id = store.create_user("alice", "hash1", "a@example.com", "Alice", "Smith", "avatar")
+    user = store.get_user(user_id)
+    assert user["username"] == "alice"
+    assert user["first_name"] == "Alice"
+    assert len(user["created_at"]) == 19
+    with pytest.raises(storage.DuplicateUser):
+        store.create_user("alice", "hash2")
+
+    store.set_password(user_id, "hash3")
+    assert store.get_user_by_username("alice")["password"] == "hash3"
+    assert store.get_user_by_username("nobody") is None
+
+
+def test_users_pagination(store):
+    ids = [store.create_user(f"user{i}", "h") for i in range(5)]
+    first = store.users_after(None, 2)
+    assert [u["id"] for u in first] == ids[:2]
+    assert [u["id"] for u in store.users_after(first[-1]["id"], 10)] == ids[2:]
+
+
+def test_sessions(store):
+    user_id = store.create_user("bob", "h")
+    store.insert_session("t1", user_id, "2030-01-01 00:00:00", "2026-01-01 00:00:00")
+    store.insert_session("t2", user_id, "2020-01-01 00:00:00", "2019-12-01 00:00:00")
+
+    live = store.live_session("t1", "2026-06-01 00:00:00")
+    assert live["user_id"] == user_id and live["last_seen"] == "2026-01-01 00:00:00"
+    assert store.live_session("t2", "2026-06-01 00:00:00") is None
+    assert store.session_user("t2") == user_id
+
+    store.renew_session("t1", "2031-01-01 00:00:00", "2026-06-01 00:00:00")
+    assert store.live_session("t1", "2030-06-01 00:00:00")["last_seen"] == "2026-06-01 00:00:00"
+
+    assert store.delete_expired_sessions("2026-06-01 00:00:00", 10) == 1
+    assert store.session_user("t2") is None
+    store.delete_session("t1")
+    assert store.session_user("t1") is None
+
+
+def test_expired_sessions_are_deleted_in_batches(store):
+    for i in range(5):
+        store.insert_session(f"old{i}", 1, "2020-01-01 00:00:00", None)
+    assert store.delete_expired_sessions("2026-01-01 00:00:00", 2) == 2
+    assert store.delete_expired_sessions("2026-01-01 00:00:00", 10) == 3
+
+
+def test_user_sessions_revoked_together(store):
+    store.insert_session("a", 1, "2030-01-01 00:00:00", None)
+    store.insert_session("b", 1, "2030-01-01 00:00:00", None)
+    store.insert_session("c", 2, "2030-01-01 00:00:00", None)
+    assert store.delete_user_sessions(1) == 2
+    assert store.session_user("c") == 2
+
+
+def test_analyses(store):
+    user_id = store.create_user("carol", "h")
+    first = store.insert_analysis(analysis(user_id, "first.png"))
+    second = store.insert_analysis(analysis(user_id, "second.wav", "audio", "Likely Synthetic"))
+
+    row = store.get_analysis(first)
+    assert row["file_name"] == "first.png"
+    assert row["checks"] == b"\x02\x00\xffpacked"
+    assert row["schema_version"] == 2
+    assert {r["id"] for r in store.list_analyses(user_id)} == {first, second}
+    assert store.last_analysis(user_id)["file_name"] == "second.wav"
+    assert store.analysis_header(second)["authenticity_label"] == "Likely Synthetic"
+    assert {r["id"] for r in store.analysis_summaries([first, second, 999])} == {first, second}
+    assert store.analysis_summaries([]) == []
+    page = store.analyses_after(first, 10)
+    assert [r["id"] for r in page] == [second]
+    assert page[0]["checks"] == b"\x02\x00\xffpacked" and "file_url" not in page[0].keys()
+    assert [(r["id"], r["user_id"]) for r in store.media_after(0, 10, "image")] == [(first, user_id)]
+    assert store.media_after(first, 10, "image") == [] and store.media_after(0, 10, "text") == []
+
+    store.delete_analysis(first)
+    assert store.get_analysis(first) is None
+    assert store.list_analyses(999) == []
+
+
+def test_batched_analysis_insert_returns_ids_in_order(store, monkeypatch):
+    monkeypatch.setattr(storage, "INSERT_BATCH_SIZE", 3)
+    rows = [analysis(1, f"file{i}.png") for i in range(7)]
+    ids = store.insert_analyses(rows)
+    assert len(set(ids)) == 7
+    assert [store.get_analysis(i)["file_name"] for i in ids] == [r["file_name"] for r in rows]
+
+
+def test_activity(store):
+    user_id = store.create_user("dave", "h", first_name="Dave", last_name="Jones")
+    store.log_activity(user_id, "login")
+    store.log_activities([(user_id, "logout", "2026-10-01 12:00:00"), (user_id, "login", "2026-10-02 08:30:00")])
+
+    page = store.activity_before(None, 2)
+    assert [a["action"] for a in page] == ["login", "logout"]
+    assert page[0]["username"] == "dave" and page[0]["first_name"] == "Dave"
+    assert [a["action"] for a in store.activity_before(page[-1]["id"], 10)] == ["login"]
+    assert store.last_activity_time() >= "2026-10-02 08:30:00"
+
+
+def test_history_counts(store):
+    user_id = store.create_user("erin", "h")
+    store.log_activities([(user_id, "login", "2026-10-01 12:00:00"), (user_id, "login", "2026-10-01 13:00:00"),
+                          (user_id, "logout", "2026-10-02 08:00:00")])
+    store.insert_analyses([analysis(user_id), analysis(user_id, label="Inconclusive"),
+                           analysis(user_id, file_type=None, label=None)])
+    counts = {(name, bucket): n for name, bucket, n in store.history_counts()}
+    assert counts[("activity", "login")] == 2
+    assert counts[("activity_daily", "2026-10-01:login")] == 2
+    assert counts[("activity_daily", "2026-10-02:logout")] == 1
+    assert counts[("users", "total")] == 1
+    assert counts[("analyses", "image")] == 2
+    assert counts[("analyses", "unknown")] == 1
+    assert counts[("verdicts", "image:Inconclusive")] == 1
+    assert counts[("verdicts", "unknown:unknown")] == 1
+    assert sum(n for (name, _), n in counts.items() if name == "analyses_daily") == 3
+
+
+def test_get_storage_selects_backend(tmp_path):
+    assert isinstance(storage.get_storage(str(tmp_path / "x.db"), backend="sqlite"), storage.SQLiteStorage)
+    with pytest.raises(ValueError):
+        storage.get_storage(backend="postgres")
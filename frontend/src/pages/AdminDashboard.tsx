@@ -32,9 +32,20 @@ interface User {
     createdAt: string;
 }
 
+interface SummaryStats {
+    totalUsers: number;
+    totalActivity: number;
+    logins: number;
+    logouts: number;
+    lastActivity: string | null;
+}
+
 export default function AdminDashboard() {
     const [activities, setActivities] = useState<UserActivity[]>([]);
     const [users, setUsers] = useState<User[]>([]);
+    const [stats, setStats] = useState<SummaryStats | null>(null);
+    const [activitiesCursor, setActivitiesCursor] = useState<number | null>(null);
+    const [usersCursor, setUsersCursor] = useState<number | null>(null);
     const [isLoading, setIsLoading] = useState(true);
     const [activeTab, setActiveTab] = useState<'activity' | 'directory'>('activity');
     const [, setLocation] = useLocation();
@@ -55,6 +66,9 @@ export default function AdminDashboard() {
             const data = await res.json();
             setActivities(data.activities || []);
             setUsers(data.users || []);
+            setStats(data.stats || null);
+            setActivitiesCursor(data.activitiesCursor ?? null);
+            setUsersCursor(data.usersCursor ?? null);
         } catch (error) {
             console.error("Failed to fetch summary", error);
         } finally {
@@ -62,6 +76,26 @@ export default function AdminDashboard() {
         }
     };
 
+    const fetchMore = async () => {
+        try {
+            if (activeTab === 'activity' && activitiesCursor !== null) {
+                const res = await fetch(`/api/admin/activity?cursor=${activitiesCursor}`);
+                const data = await res.json();
+                setActivities(prev => [...prev, ...(data.activities || [])]);
+                setActivitiesCursor(data.nextCursor ?? null);
+            } else if (activeTab === 'directory' && usersCursor !== null) {
+                const res = await fetch(`/api/admin/users?cursor=${usersCursor}`);
+                const data = await res.json();
+                setUsers(prev => [...prev, ...(data.users || [])]);
+                setUsersCursor(data.nextCursor ?? null);
+            }
+        } catch (error) {
+            console.error("Failed to fetch more entries", error);
+        }
+    };
+
+    const hasMore = activeTab === 'activity' ? activitiesCursor !== null : usersCursor !== null;
+
     const handleLogout = () => {
         sessionStorage.removeItem("isAdminAuthenticated");
         setLocation("/auth");
@@ -121,7 +155,7 @@ export default function AdminDashboard() {
                         </CardHeader>
                         <CardContent>
                             <div className="text-3xl font-black text-white">
-                                {users.length} Users
+                                {stats?.totalUsers ?? users.length} Users
                             </div>
                         </CardContent>
                     </Card>
@@ -134,7 +168,7 @@ export default function AdminDashboard() {
                         </CardHeader>
                         <CardContent>
                             <div className="text-3xl font-black text-primary">
-                                {activities.filter(a => a.action === 'login').length} Logins
+                                {stats?.logins ?? 0} Logins
                             </div>
                         </CardContent>
                     </Card>
@@ -147,7 +181,7 @@ export default function AdminDashboard() {
                         </CardHeader>
                         <CardContent>
                             <div className="text-3xl font-black text-white">
-                                {activities[0] ? new Date(activities[0].timestamp).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }) : "---"}
+                                {stats?.lastActivity ? new Date(stats.lastActivity).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' }) : "---"}
                             </div>
                         </CardContent>
                     </Card>
@@ -160,7 +194,7 @@ export default function AdminDashboard() {
                         </CardHeader>
                         <CardContent>
                             <div className="text-3xl font-black text-white">
-                                {activities.length} Entries
+                                {stats?.totalActivity ?? 0} Entries
                             </div>
                         </CardContent>
                     </Card>
@@ -316,6 +350,17 @@ export default function AdminDashboard() {
                                 </tbody>
                             </table>
                         </div>
+                        {!isLoading && hasMore && (
+                            <div className="p-6 text-center border-t border-white/5">
+                                <Button
+                                    variant="ghost"
+                                    onClick={fetchMore}
+                                    className="text-slate-400 hover:text-white hover:bg-white/5 rounded-xl border border-white/5 text-xs font-bold uppercase tracking-widest"
+                                >
+                                    Load More
+                                </Button>
+                            </div>
+                        )}
                     </CardContent>
                 </Card>
 